@@ -0,0 +1,337 @@
+"""Record, replay and synthesize faucet event streams for offline load testing.
+
+Recordings are gzipped text: a json header line, then one line per event of
+the form '<offset_ms> <event json>', with the offset from the start of recording.
+
+  record FILE [SECONDS]     record the FAUCET_EVENT_SOCK stream to FILE
+  generate FILE [options]   synthesize a scaled workload into FILE
+  replay FILE SOCKET        serve FILE on a unix socket, as faucet would
+  bench FILE                replay FILE through a FaucetEventClient and report
+                            throughput and delivery latency
+"""
+
+import argparse
+import collections
+import functools
+import gzip
+import heapq
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+from python_lib.faucet_event_client import FaucetEventClient
+from wrappers import DisconnectedException
+
+FORMAT_NAME = 'faucet_events'
+FORMAT_VERSION = 1
+_RECV_SIZE = 65536
+_SEND_BATCH = 1024
+_LEARN_VID = 1001
+
+Workload = collections.namedtuple(
+    'Workload', ['switches', 'ports', 'learn_rate', 'duration', 'flap_rate', 'hosts'],
+    defaults=[0, 1])
+
+
+def write_recording(filename, events, source):
+    """Write (offset_sec, event_bytes) tuples to a recording file"""
+    header = {'format': FORMAT_NAME, 'version': FORMAT_VERSION,
+              'source': source, 'start': time.time()}
+    count = 0
+    with gzip.open(filename, 'wb') as out:
+        out.write(json.dumps(header).encode() + b'\n')
+        for offset, event in events:
+            out.write(b'%d %s\n' % (round(offset * 1e3), event.rstrip(b'\n')))
+            count += 1
+    return count
+
+
+def read_recording(filename):
+    """Return the header and a generator of (offset_sec, event_bytes) from a recording"""
+    recording = gzip.open(filename, 'rb')
+    header = json.loads(recording.readline())
+    assert header.get('format') == FORMAT_NAME, '%s is not a faucet event recording' % filename
+    assert header.get('version') == FORMAT_VERSION, 'unknown version %s' % header.get('version')
+
+    def events():
+        with recording:
+            for line in recording:
+                offset, event = line.rstrip(b'\n').split(b' ', 1)
+                yield int(offset) / 1e3, event
+    return header, events()
+
+
+def _socket_events(sock_path, duration):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(sock_path)
+    start = time.monotonic()
+    buffer = bytearray()
+    try:
+        while duration is None or time.monotonic() - start < duration:
+            if duration is not None:
+                sock.settimeout(max(duration - (time.monotonic() - start), 0.001))
+            try:
+                data = sock.recv(_RECV_SIZE)
+            except socket.timeout:
+                break
+            if not data:
+                break
+            offset = time.monotonic() - start
+            buffer += data
+            end = buffer.rfind(b'\n')
+            if end < 0:
+                continue
+            for event in buffer[:end].split(b'\n'):
+                if event.strip():
+                    yield offset, bytes(event)
+            del buffer[:end + 1]
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+
+
+def record(filename, duration=None):
+    """Record the live faucet event stream"""
+    sock_path = os.getenv('FAUCET_EVENT_SOCK')
+    assert sock_path, 'Environment FAUCET_EVENT_SOCK not defined'
+    print('Recording %s to %s, ^C to stop' % (sock_path, filename))
+    count = write_recording(filename, _socket_events(sock_path, duration), sock_path)
+    print('Recorded %d events' % count)
+
+
+def _mac(switch, port, host=0):
+    return '0e:%02x:%02x:%02x:%02x:%02x' % (host % 256, switch // 256, switch % 256,
+                                            port // 256, port % 256)
+
+
+def _learn_events(switch, port, hosts, count):
+    return [_learn_event(switch, port, count % hosts)]
+
+
+def _flap_events(switch, port, _):
+    return [_port_event(switch, port, False), _port_event(switch, port, True)]
+
+
+def _learn_event(switch, port, host):
+    return {
+        'dp_id': switch,
+        'L2_LEARN': {
+            'port_no': port,
+            'previous_port_no': None,
+            'vid': _LEARN_VID,
+            'eth_src': _mac(switch, port, host),
+            'eth_dst': 'ff:ff:ff:ff:ff:ff',
+            'eth_type': 0x800,
+            'l3_src_ip': '0.0.0.0',
+            'l3_dst_ip': '255.255.255.255'
+        }
+    }
+
+
+def _port_event(switch, port, status):
+    return {
+        'dp_id': switch,
+        'PORT_CHANGE': {
+            'port_no': port,
+            'reason': 'MODIFY',
+            'status': status
+        }
+    }
+
+
+def synthesize(workload):
+    """Generate a scaled Workload as (offset_sec, event_bytes) tuples in time order.
+
+    Each switch starts with a PORTS_STATUS of all ports up, then every port emits
+    L2_LEARN events for its hosts at learn_rate per second, and goes down and back
+    up again flap_rate times per second."""
+    switches, ports, learn_rate, duration, flap_rate, hosts = workload
+    streams = []
+    for switch in range(1, switches + 1):
+        status = {port: True for port in range(1, ports + 1)}
+        streams.append(iter([(0, {'dp_id': switch, 'PORTS_STATUS': status})]))
+        for port in range(1, ports + 1):
+            # Stagger ports so that events spread evenly over time.
+            phase = ((switch - 1) * ports + port - 1) / (switches * ports)
+            if learn_rate:
+                make_events = functools.partial(_learn_events, switch, port, hosts)
+                streams.append(_periodic(learn_rate, phase, duration, make_events))
+            if flap_rate:
+                make_events = functools.partial(_flap_events, switch, port)
+                streams.append(_periodic(flap_rate, phase, duration, make_events))
+    for offset, event in heapq.merge(*streams, key=lambda item: item[0]):
+        yield offset, json.dumps(event).encode()
+
+
+def _periodic(rate, phase, duration, make_events):
+    interval = 1 / rate
+    count = 0
+    offset = interval * phase
+    while offset < duration:
+        for event in make_events(count):
+            yield offset, event
+        count += 1
+        offset = interval * (count + phase)
+
+
+def generate(filename, workload):
+    """Write a synthesized Workload to a recording file"""
+    source = 'synthetic %dx%d learn %s/s flap %s/s hosts %d for %ss' % (
+        workload.switches, workload.ports, workload.learn_rate, workload.flap_rate,
+        workload.hosts, workload.duration)
+    count = write_recording(filename, synthesize(workload), source)
+    print('Generated %d events (%s) in %s' % (count, source, filename))
+
+
+def _send_events(conn, events, speed):
+    start = time.monotonic()
+    sent = 0
+    batch = []
+    for offset, event in events:
+        if speed:
+            delay = start + offset / speed - time.monotonic()
+            if delay > 0:
+                if batch:
+                    conn.sendall(b''.join(batch))
+                    batch = []
+                time.sleep(delay)
+        batch.append(event + b'\n')
+        sent += 1
+        if len(batch) >= _SEND_BATCH:
+            conn.sendall(b''.join(batch))
+            batch = []
+    if batch:
+        conn.sendall(b''.join(batch))
+    return sent
+
+
+def replay(filename, sock_path, speed=1.0, ready=None, close=False):
+    """Serve a recording on a unix socket to the first client that connects.
+    A speed of 0 sends everything as fast as possible. The connection is held open
+    until the client disconnects, like a live faucet, unless close is set."""
+    if os.path.exists(sock_path):
+        os.unlink(sock_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(sock_path)
+    server.listen(1)
+    if ready:
+        ready.set()
+    try:
+        conn, _ = server.accept()
+        with conn:
+            header, events = read_recording(filename)
+            sent = _send_events(conn, events, speed)
+            if close:
+                conn.shutdown(socket.SHUT_WR)
+            while conn.recv(_RECV_SIZE):
+                pass
+    finally:
+        server.close()
+        os.unlink(sock_path)
+    return header, sent
+
+
+def _consume(client, start, learn_offsets, speed):
+    returned = 0
+    latencies = []
+    try:
+        while True:
+            event = client.next_event(blocking=True)
+            returned += 1
+            if speed and 'L2_LEARN' in event:
+                expected = start + learn_offsets[len(latencies)] / speed
+                latencies.append(time.monotonic() - expected)
+    except DisconnectedException:
+        # The replay server closing the socket marks the end of the recording.
+        pass
+    return returned, latencies
+
+
+def bench(filename, speed=0.0):
+    """Replay a recording through FaucetEventClient, returning throughput and latency"""
+    _, events = read_recording(filename)
+    learn_offsets = [offset for offset, event in events if b'"L2_LEARN"' in event]
+    tmpdir = tempfile.mkdtemp()
+    sock_path = os.path.join(tmpdir, 'faucet_event.sock')
+    os.environ['FAUCET_EVENT_SOCK'] = sock_path
+    ready = threading.Event()
+    server = threading.Thread(target=replay, args=(filename, sock_path, speed, ready, True),
+                              daemon=True)
+    server.start()
+    ready.wait()
+    client = FaucetEventClient({'port_debounce_sec': 0})
+    client.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.sock.connect(sock_path)
+    start = time.monotonic()
+    returned, latencies = _consume(client, start, learn_offsets, speed)
+    elapsed = time.monotonic() - start
+    client.sock.close()
+    server.join()
+    os.rmdir(tmpdir)
+    results = {
+        'events': returned,
+        'elapsed_sec': elapsed,
+        'events_per_sec': returned / elapsed if elapsed else 0
+    }
+    if latencies:
+        latencies.sort()
+        results['latency_ms'] = {
+            'median': statistics.median(latencies) * 1e3,
+            'p99': latencies[int(len(latencies) * 0.99)] * 1e3,
+            'max': latencies[-1] * 1e3
+        }
+    return results
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+    record_parser = commands.add_parser('record', help='record the live event stream')
+    record_parser.add_argument('file')
+    record_parser.add_argument('duration', nargs='?', type=float)
+    generate_parser = commands.add_parser('generate', help='synthesize a workload')
+    generate_parser.add_argument('file')
+    generate_parser.add_argument('--switches', type=int, default=1)
+    generate_parser.add_argument('--ports', type=int, default=48)
+    generate_parser.add_argument('--learn-rate', type=float, default=1.0,
+                                 help='L2_LEARN events per port per second')
+    generate_parser.add_argument('--flap-rate', type=float, default=0.0,
+                                 help='port down/up cycles per port per second')
+    generate_parser.add_argument('--hosts', type=int, default=1, help='hosts per port')
+    generate_parser.add_argument('--duration', type=float, default=60.0)
+    replay_parser = commands.add_parser('replay', help='serve a recording on a socket')
+    replay_parser.add_argument('file')
+    replay_parser.add_argument('socket')
+    replay_parser.add_argument('--speed', type=float, default=1.0,
+                               help='time scale factor, 0 for as fast as possible')
+    bench_parser = commands.add_parser('bench', help='benchmark event client consumption')
+    bench_parser.add_argument('file')
+    bench_parser.add_argument('--speed', type=float, default=0.0,
+                              help='time scale factor, 0 for as fast as possible')
+    return parser.parse_args(argv)
+
+
+def main(argv):
+    """Run a faucet events command"""
+    args = _parse_args(argv)
+    if args.command == 'record':
+        record(args.file, args.duration)
+    elif args.command == 'generate':
+        generate(args.file, Workload(args.switches, args.ports, args.learn_rate, args.duration,
+                                     flap_rate=args.flap_rate, hosts=args.hosts))
+    elif args.command == 'replay':
+        print('Replaying %s on %s' % (args.file, args.socket))
+        header, sent = replay(args.file, args.socket, args.speed)
+        print('Replayed %d events from %s' % (sent, header.get('source')))
+    elif args.command == 'bench':
+        print(json.dumps(bench(args.file, args.speed), indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+"""Microbenchmark for YAML emit and parse of a generated ACL set"""
+
+import functools
+import sys
+import timeit
+
+import yaml
+
+import yaml_util
+from topology import FaucetTopology
+
+NUM_PORTS = 48
+NUM_DEVICES = 100
+
+
+# pylint: disable=protected-access
+def make_acl_set(num_ports=NUM_PORTS, num_devices=NUM_DEVICES):
+    """Generate port acls shaped like the ones FaucetTopology writes"""
+    topology = FaucetTopology({'switch_setup': {'uplink_port': num_ports + 1}})
+    macs = ['9a:02:57:1e:%02x:%02x' % divmod(device, 256) for device in range(num_devices)]
+    acls = {}
+    for port in range(1, num_ports + 1):
+        rules = []
+        topology._add_dot1x_allow_rule(rules, [num_ports + 1], out_vid=1000 + port)
+        for mac in macs:
+            topology._add_acl_rule(rules, dl_src=mac, dl_dst=FaucetTopology.BROADCAST_MAC,
+                                   vlan_vid='0x0000/0x1000', ports=[port, 1000 + port])
+            topology._add_acl_rule(rules, dl_type='0x800', dl_dst=mac, nw_proto=17,
+                                   udp_src=67, udp_dst=68, allow=True)
+        topology._add_acl_rule(rules, allow=1)
+        acls[FaucetTopology.PORT_ACL_NAME_FORMAT % ('sec', port)] = rules
+    return topology._serialize_acls({'acls': acls})
+
+
+def _time(func, repeat):
+    return min(timeit.repeat(func, number=1, repeat=repeat))
+
+
+def main(repeat=3):
+    """Run the benchmark and print a comparison table"""
+    acl_set = make_acl_set()
+    text = yaml.safe_dump(acl_set)
+    print('ACL set: %d ports, %d devices, %d bytes of YAML' % (NUM_PORTS, NUM_DEVICES, len(text)))
+    print('libyaml available: %s' % yaml_util.LIBYAML)
+    cases = [('python', yaml.SafeLoader, yaml.SafeDumper),
+             ('yaml_util', yaml_util.SafeLoader, yaml_util.SafeDumper)]
+    for name, loader, dumper in cases:
+        emitted = yaml_util.safe_dump(acl_set, dumper=dumper)
+        assert emitted == text, '%s output differs from yaml.safe_dump' % name
+        assert yaml_util.safe_load(text, loader=loader) == acl_set, '%s parse differs' % name
+        emit_sec = _time(functools.partial(yaml_util.safe_dump, acl_set, dumper=dumper), repeat)
+        parse_sec = _time(functools.partial(yaml_util.safe_load, text, loader=loader), repeat)
+        print('%-10s emit %7.1fms  parse %7.1fms' % (name, emit_sec * 1e3, parse_sec * 1e3))
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,112 @@
+"""Immutable faucet acl rule representation"""
+
+import weakref
+
+
+class _FrozenMap(tuple):
+    """Sorted (key, value) pairs standing in for a dict inside a frozen rule"""
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        # Never equal to a plain tuple, which is how frozen lists are represented.
+        return isinstance(other, _FrozenMap) and tuple.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = tuple.__hash__
+
+
+class _FrozenBool:
+    """Stand-in for True/False, which would otherwise intern together with 1/0"""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return repr(self.value)
+
+
+_BOOLS = {True: _FrozenBool(True), False: _FrozenBool(False)}
+
+
+def _freeze(value):
+    if isinstance(value, bool):
+        return _BOOLS[value]
+    if isinstance(value, dict):
+        return _FrozenMap(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, _FrozenBool):
+        return value.value
+    if isinstance(value, _FrozenMap):
+        return {key: _thaw(item) for key, item in value}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class AclRule:
+    """A single faucet acl rule, immutable and interned so that identical rules
+    (e.g. the baseline template rules on every port) share one instance.
+
+    Rules are only expanded back into plain dicts when written out as yaml."""
+
+    __slots__ = ('_fields', '_hash', '__weakref__')
+
+    _interned = weakref.WeakValueDictionary()
+
+    def __new__(cls, fields):
+        frozen = _freeze(fields)
+        rule = cls._interned.get(frozen)
+        if rule is None:
+            rule = super().__new__(cls)
+            rule._fields = frozen
+            rule._hash = hash(frozen)
+            cls._interned[frozen] = rule
+        return rule
+
+    @classmethod
+    def from_dict(cls, acl):
+        """Build a rule from its yaml form, {'rule': {...}}"""
+        return cls(acl['rule'])
+
+    def get(self, field, default=None):
+        """Return the thawed value of a top-level rule field"""
+        for key, value in self._fields:
+            if key == field:
+                return _thaw(value)
+        return default
+
+    @property
+    def actions(self):
+        """The rule actions as a dict"""
+        return self.get('actions', {})
+
+    def replace(self, **changes):
+        """Return a rule with the given fields replaced"""
+        fields = _thaw(self._fields)
+        fields.update(changes)
+        return AclRule(fields)
+
+    def to_dict(self):
+        """Return the yaml form of this rule, {'rule': {...}}"""
+        return {'rule': _thaw(self._fields)}
+
+    def __eq__(self, other):
+        if not isinstance(other, AclRule):
+            return NotImplemented
+        return self is other or self._fields == other._fields
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return 'AclRule(%r)' % (self.to_dict()['rule'],)
@@ -0,0 +1,113 @@
+"""Asyncio driven variant of the stream monitor"""
+
+import asyncio
+
+import logger
+from stream_monitor import StreamMonitor
+
+LOGGER = logger.get_logger('stream')
+
+
+async def run_command(*args, timeout=None):
+    """Run a command without blocking the event loop, returning (code, stdout, stderr)"""
+    process = await asyncio.create_subprocess_exec(*args, stdin=asyncio.subprocess.DEVNULL,
+                                                   stdout=asyncio.subprocess.PIPE,
+                                                   stderr=asyncio.subprocess.PIPE)
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise
+    return process.returncode, stdout.decode('utf-8'), stderr.decode('utf-8')
+
+
+class AsyncStreamMonitor(StreamMonitor):
+    """Stream monitor that dispatches fd callbacks, hooks and timers from an asyncio loop"""
+
+    def __init__(self, timeout_sec=None, idle_handler=None, loop_hook=None, loop=None):
+        super().__init__(timeout_sec=timeout_sec, idle_handler=idle_handler,
+                         loop_hook=loop_hook)
+        self.loop = loop or asyncio.new_event_loop()
+        self._timers = []
+        self._tasks = set()
+        self._idle_handle = None
+        self._done = None
+
+    def add_timer(self, name, interval_sec, handler):
+        """Call handler (plain function or coroutine function) every interval_sec"""
+        self._timers.append((name, interval_sec, handler))
+        if self._done:
+            self.spawn(self._timer(name, interval_sec, handler), name)
+
+    def spawn(self, coro, name=None):
+        """Schedule a coroutine on the monitor loop, logging any failure"""
+        task = self.loop.create_task(coro)
+        self._tasks.add(task)
+
+        def task_done(task):
+            self._tasks.discard(task)
+            if not task.cancelled() and task.exception():
+                LOGGER.error('Monitoring task %s exception: %s', name, task.exception())
+                LOGGER.exception(task.exception())
+        task.add_done_callback(task_done)
+        return task
+
+    async def _timer(self, name, interval_sec, handler):
+        while True:
+            await asyncio.sleep(interval_sec)
+            try:
+                result = handler()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                LOGGER.error('Monitoring timer %s exception: %s', name, e)
+                LOGGER.exception(e)
+
+    def request_wakeup(self, delay_sec):
+        """Make sure the loop hook runs again within delay_sec, even with no fd activity"""
+        self.loop.call_later(delay_sec, self._kick_idle)
+
+    def _kick_idle(self):
+        if not self._idle_handle:
+            self._idle_handle = self.loop.call_soon(self._idle_pass)
+
+    def _idle_pass(self):
+        self._idle_handle = None
+        self._loop_count += 1
+        if not self.run_hooks(self.poller.poll(0)) or not self.callbacks:
+            self._finish()
+
+    def _dispatch_ready(self):
+        self.dispatch(self.poller.poll(0))
+        self._kick_idle()
+
+    async def _idle_timer(self):
+        while True:
+            await asyncio.sleep(self.timeout_sec or 1)
+            self._kick_idle()
+
+    def _finish(self):
+        if self._done and not self._done.done():
+            self._done.set_result(True)
+
+    async def _run(self):
+        self._done = self.loop.create_future()
+        self.loop.add_reader(self.poller.fileno(), self._dispatch_ready)
+        self.spawn(self._idle_timer(), 'idle')
+        for name, interval_sec, handler in self._timers:
+            self.spawn(self._timer(name, interval_sec, handler), name)
+        self._kick_idle()
+        try:
+            await self._done
+        finally:
+            self.loop.remove_reader(self.poller.fileno())
+            for task in list(self._tasks):
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            self._done = None
+
+    def run(self):
+        """Run the loop until there are no more streams to monitor"""
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._run())
@@ -13,6 +13,7 @@ from clib.mininet_test_util import DEVNULL
 
 import logger
 from env import DAQ_RUN_DIR
+import ping_helper
 
 LOGGER = logger.get_logger('gateway')
 
@@ -54,6 +55,11 @@ class BaseGateway(ABC):
 
     def initialize(self):
         """Initialize the gateway host"""
+        self.initialize_hosts()
+        self.start_monitors()
+
+    def initialize_hosts(self):
+        """Create and warm up the gateway hosts, which can run on a background thread"""
         try:
             self._initialize()
         except Exception as e:
@@ -62,6 +68,19 @@ class BaseGateway(ABC):
             self.terminate()
             raise
 
+    def start_monitors(self):
+        """Start gateway stream monitors, which must run on the main thread"""
+        try:
+            self._start_monitors()
+        except Exception as e:
+            LOGGER.error(
+                'Gateway monitor start failed, terminating: %s', str(e))
+            self.terminate()
+            raise
+
+    def _start_monitors(self):
+        pass
+
     def _initialize(self):
         host_name = 'gw%02d' % self.port_set
         host_port = 1 if self._is_native else self._switch_port(self.GATEWAY_OFFSET)
@@ -105,11 +124,13 @@ class BaseGateway(ABC):
                         host_name, datetime.datetime.now(), ping_retry)
             assert ping_retry, 'warmup ping failure'
 
-        assert self._ping_test(self.host, fake_host), 'fake ping failed'
-        assert self._ping_test(fake_host, host), 'host ping failed'
-        assert self._ping_test(fake_host, self.fake_target), 'fake ping failed'
-        assert self._ping_test(
-            self.host, fake_host, src_addr=self.fake_target), 'reverse ping failed'
+        checks = (((host, fake_host, None), 'fake ping failed'),
+                  ((fake_host, host, None), 'host ping failed'),
+                  ((fake_host, self.fake_target, None), 'fake ping failed'),
+                  ((host, fake_host, self.fake_target), 'reverse ping failed'))
+        results = ping_helper.ping_test_parallel([check for check, _ in checks])
+        for (_, message), result in zip(checks, results):
+            assert result, message
 
     def _get_env_vars(self):
         env_vars = []
@@ -130,6 +151,27 @@ class BaseGateway(ABC):
         """Mark this gateway as activated once all hosts are present"""
         self.activated = True
 
+    def flush_commands(self):
+        """Send any queued configuration changes to the gateway"""
+
+    def recyclable(self):
+        """Check if this gateway can be reset and reused by another device group"""
+        return False
+
+    def recycle(self, name):
+        """Reset a retired gateway to its initialized state, for use by another group"""
+        assert not self.targets, 'gw %s has targets %s' % (self.name, self.targets)
+        LOGGER.info('Recycling gateway %d/%s as %s', self.port_set, self.name, name)
+        self.name = name
+        self.test_ports = set()
+        self.ready = set()
+        self.activated = False
+        self.result_linger = False
+        self._recycle()
+
+    def _recycle(self):
+        pass
+
     def get_base_dir(self):
         """Return the gateways base directory for instance files"""
         return os.path.abspath(self.tmpdir)
@@ -144,6 +186,10 @@ class BaseGateway(ABC):
         self.test_ports.add(test_port)
         return test_port
 
+    def free_test_ports(self):
+        """Return the number of test ports still available on this gateway"""
+        return self._gw_set_size - self.TEST_OFFSET_START - len(self.test_ports)
+
     def release_test_port(self, test_port):
         """Release the given port from the gateway"""
         assert test_port in self.test_ports, 'test port not allocated'
@@ -8,8 +8,8 @@ import json
 import os
 import re
 import sys
-import yaml
 import logger
+import yaml_util
 
 LOGGER = logger.get_logger('config')
 
@@ -123,10 +123,10 @@ class Configurator:
             env_var = match.group()[2:-1]
             return os.getenv(env_var) + node.value[match.end():]
 
-        yaml.add_implicit_resolver('!env', env_regex, None, yaml.SafeLoader)
-        yaml.add_constructor('!env', env_constructor, yaml.SafeLoader)
+        yaml_util.SafeLoader.add_implicit_resolver('!env', env_regex, None)
+        yaml_util.SafeLoader.add_constructor('!env', env_constructor)
         with open(config_file) as data_file:
-            loaded_config = yaml.safe_load(data_file)
+            loaded_config = yaml_util.safe_load(data_file)
         return loaded_config
 
     def _parse_flat_item(self, config, parts):
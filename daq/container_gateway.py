@@ -4,8 +4,10 @@ import os
 
 from clib import docker_host
 
+import dhcp_control
 import dhcp_monitor
 import logger
+import packet_capture
 import tcpdump_helper
 from base_gateway import BaseGateway
 
@@ -15,15 +17,25 @@ LOGGER = logger.get_logger('gateway')
 class ContainerGateway(BaseGateway):
     """Gateway collection class for managing testing services"""
 
+    _DHCP_CONTROL_SOCKET = 'dhcp_control.sock'
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._scan_monitor = None
         self.dhcp_monitor = None
+        self._dhcp_range_changed = False
+        self._dhcp_control = None
+        self._dhcp_commands = []
 
     def _initialize(self, **kwargs):
         super()._initialize(**kwargs)
-        self._change_lease_time(
-            self.runner.config.get('initial_dhcp_lease_time'))
+        socket_file = os.path.join(self.tmpdir, self._DHCP_CONTROL_SOCKET)
+        self._dhcp_control = dhcp_control.DhcpControl(self.port_set, socket_file)
+        self._dhcp_control.connect()
+        self._change_lease_time(self.runner.config.get('initial_dhcp_lease_time'))
+        self.flush_commands()
+
+    def _start_monitors(self):
         self._startup_scan(self.host)
         log_file = os.path.join(self.tmpdir, 'dhcp_monitor.txt')
         self.dhcp_monitor = dhcp_monitor.DhcpMonitor(self.runner, self.host,
@@ -44,9 +56,20 @@ class ContainerGateway(BaseGateway):
         self._change_lease_time(self.runner.config.get("dhcp_lease_time"))
         self._scan_finalize()
 
+    def recyclable(self):
+        """Check if this gateway can be reset and reused by another device group"""
+        # A changed dhcp range also rewrites the gateway addressing, so can't be undone.
+        return bool(self.host) and not self._is_native and not self._dhcp_range_changed
+
+    def _recycle(self):
+        self._scan_finalize()
+        self._change_lease_time(self.runner.config.get('initial_dhcp_lease_time'))
+        self.flush_commands()
+        self._startup_scan(self.host)
+
     def _change_lease_time(self, lease_time):
         LOGGER.info('Gateway %s change lease time to %s', self.port_set, lease_time)
-        self.execute_script('change_lease_time', lease_time)
+        self._queue_script('change_lease_time', lease_time)
 
     def _scan_finalize(self, forget=True):
         if self._scan_monitor:
@@ -58,16 +81,33 @@ class ContainerGateway(BaseGateway):
             self._scan_monitor = None
 
     def execute_script(self, action, *args):
-        """Generic function for executing scripts on gateway"""
-        self.host.cmd(('./%s' + len(args) * ' %s') % (action, *args))
+        """Generic function for executing scripts on gateway, along with any queued"""
+        self._queue_script(action, *args)
+        self.flush_commands()
+
+    def _queue_script(self, action, *args):
+        self._dhcp_commands.append((action, *args))
+
+    def flush_commands(self):
+        """Send all queued dhcp changes to the gateway in one batch"""
+        if not self._dhcp_commands:
+            return
+        commands, self._dhcp_commands = self._dhcp_commands, []
+        LOGGER.info('Gateway %s sending %d dhcp changes', self.port_set, len(commands))
+        try:
+            self._dhcp_control.send(commands)
+        except Exception:
+            # Keep the changes, in order, for the next flush.
+            self._dhcp_commands[:0] = commands
+            raise
 
     def request_new_ip(self, mac):
         """Requests a new ip for the device"""
-        self.execute_script('new_ip', mac)
+        self._queue_script('new_ip', mac)
 
     def change_dhcp_response_time(self, mac, time):
         """Change dhcp response time for device mac"""
-        self.execute_script('change_dhcp_response_time', mac, time)
+        self._queue_script('change_dhcp_response_time', mac, time)
 
     def stop_dhcp_response(self, mac):
         """Stops DHCP response for the device"""
@@ -75,7 +115,8 @@ class ContainerGateway(BaseGateway):
 
     def change_dhcp_range(self, start, end, prefix_length):
         """Change dhcp range for devices"""
-        self.execute_script('change_dhcp_range', start, end, prefix_length)
+        self._dhcp_range_changed = True
+        self._queue_script('change_dhcp_range', start, end, prefix_length)
 
     def _startup_scan(self, host):
         assert not self._scan_monitor, 'startup_scan already active'
@@ -83,12 +124,20 @@ class ContainerGateway(BaseGateway):
         LOGGER.info('Gateway %s startup capture %s in container\'s %s', self.port_set,
                     self.host_intf, startup_file)
         tcp_filter = ''
-        helper = tcpdump_helper.TcpdumpHelper(host, tcp_filter, packets=None,
-                                              intf_name=self.host_intf, timeout=None,
-                                              pcap_out=startup_file, blocking=False)
+        if self.runner.config.get('native_capture'):
+            # The gateway tmpdir is the container's /tmp, so write the same file from outside.
+            host_file = os.path.join(self.tmpdir, os.path.basename(startup_file))
+            helper = packet_capture.PacketCapture(self.host_intf, tcp_filter, pcap_out=host_file,
+                                                  netns_pid=host.pid)
+            callback = helper.process
+        else:
+            helper = tcpdump_helper.TcpdumpHelper(host, tcp_filter, packets=None,
+                                                  intf_name=self.host_intf, timeout=None,
+                                                  pcap_out=startup_file, blocking=False)
+            callback = helper.next_lines
         self._scan_monitor = helper
         self.runner.monitor_stream('start%d' % self.port_set, helper.stream(),
-                                   helper.next_line, hangup=self._scan_complete,
+                                   callback, hangup=self._scan_complete,
                                    error=self._scan_error)
 
     def _scan_complete(self):
@@ -103,3 +152,6 @@ class ContainerGateway(BaseGateway):
         """Terminate this instance"""
         super().terminate()
         self._scan_finalize()
+        self._dhcp_commands = []
+        if self._dhcp_control:
+            self._dhcp_control.close()
@@ -0,0 +1,88 @@
+"""Client for the dhcp control channel of a networking container"""
+
+import json
+import os
+import socket
+import time
+
+import logger
+from wrappers import DaqException
+
+LOGGER = logger.get_logger('dhcpctl')
+
+
+class DhcpControl:
+    """Persistent connection to the container's dhcp_control socket, which applies
+    each batch of commands to the dnsmasq config with a single restart."""
+
+    _CONNECT_TIMEOUT_SEC = 60
+    _CONNECT_RETRY_SEC = 0.5
+    _RESPONSE_TIMEOUT_SEC = 30
+
+    def __init__(self, name, socket_file):
+        self._name = name
+        self._socket_file = socket_file
+        self._sock = None
+        self._reader = None
+
+    def connect(self, timeout_sec=_CONNECT_TIMEOUT_SEC):
+        """Wait for the container to create the control socket, then connect to it.
+        Blocks, so is meant for gateway initialization rather than the main loop."""
+        start = time.monotonic()
+        while not os.path.exists(self._socket_file):
+            if time.monotonic() - start > timeout_sec:
+                raise DaqException('dhcp control socket %s not found' % self._socket_file)
+            time.sleep(self._CONNECT_RETRY_SEC)
+        self._open()
+
+    def _open(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self._RESPONSE_TIMEOUT_SEC)
+        try:
+            sock.connect(self._socket_file)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._reader = sock.makefile('rb')
+
+    def _exchange(self, request):
+        if not self._sock:
+            # Fails right away if the socket is gone, rather than waiting like connect.
+            self._open()
+        self._sock.sendall(request)
+        response = self._reader.readline()
+        if not response:
+            raise ConnectionError('dhcp control connection closed')
+        return json.loads(response)
+
+    def send(self, commands):
+        """Send a batch of (action, *args) commands in one round trip, returning the
+        per-command results"""
+        request = json.dumps({'commands': [{'action': command[0], 'args': list(command[1:])}
+                                           for command in commands]}).encode() + b'\n'
+        LOGGER.debug('Gateway %s dhcp control %s', self._name, commands)
+        try:
+            response = self._exchange(request)
+        except ConnectionError:
+            # The container side may have restarted, so try again on a fresh connection.
+            self.close()
+            response = self._exchange(request)
+        if 'error' in response:
+            raise DaqException('dhcp control error: %s' % response['error'])
+        results = response['results']
+        for command, result in zip(commands, results):
+            if not result['ok']:
+                LOGGER.warning('Gateway %s dhcp control %s failed: %s',
+                               self._name, command[0], result['output'])
+            elif result['output']:
+                LOGGER.info('Gateway %s %s: %s', self._name, command[0], result['output'])
+        return results
+
+    def close(self):
+        """Close the control connection"""
+        if self._sock:
+            self._reader.close()
+            self._sock.close()
+        self._sock = None
+        self._reader = None
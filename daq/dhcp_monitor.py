@@ -1,30 +1,119 @@
 """Encapsulate DHCP monitor/startup"""
 
-import re
+import collections
+import socket
+import struct
 import time
 
 import logger
-import tcpdump_helper
+import packet_capture
 from host import MODE
 
 LOGGER = logger.get_logger('dhcp')
 
+ETH_TYPE_VLAN = 0x8100
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_ARP = 0x0806
+ARP_OP_REQUEST = 1
+ARP_OP_REPLY = 2
+IP_PROTO_UDP = 17
+DHCP_PORTS = (67, 68)
+BOOTP_HEADER_LEN = 236
+DHCP_MAGIC = b'\x63\x82\x53\x63'
+DHCP_OPTION_PAD = 0
+DHCP_OPTION_TYPE = 53
+DHCP_OPTION_END = 255
+BROADCAST_MAC = b'\xff' * 6
+
+# Message type names as printed by tcpdump, which is what downstream consumers expect.
+DHCP_TYPES = {
+    1: 'Discover',
+    2: 'Offer',
+    3: 'Request',
+    4: 'Decline',
+    5: 'ACK',
+    6: 'NACK',
+    7: 'Release',
+    8: 'Inform'
+}
+
+# kind is 'dhcp' or 'arp', ip is None for DHCP packets without a Your-IP address.
+DhcpEvent = collections.namedtuple('DhcpEvent', ('kind', 'mac', 'ip', 'dhcp_type'))
+
+
+def _format_mac(data):
+    return ':'.join('%02x' % octet for octet in data)
+
+
+def _decode_arp(data, offset, eth_dst, eth_src):
+    operation = struct.unpack_from('!H', data, offset + 6)[0]
+    if operation == ARP_OP_REQUEST and eth_dst != BROADCAST_MAC:
+        return None
+    if operation not in (ARP_OP_REQUEST, ARP_OP_REPLY):
+        return None
+    sender_ip = socket.inet_ntoa(data[offset + 14:offset + 18])
+    return DhcpEvent('arp', _format_mac(eth_src), sender_ip, None)
+
+
+def _decode_dhcp_type(data, offset):
+    while offset < len(data):
+        option = data[offset]
+        if option == DHCP_OPTION_END:
+            break
+        if option == DHCP_OPTION_PAD:
+            offset += 1
+            continue
+        length = data[offset + 1]
+        if option == DHCP_OPTION_TYPE and length == 1:
+            return DHCP_TYPES.get(data[offset + 2], str(data[offset + 2]))
+        offset += 2 + length
+    return None
+
+
+def _decode_ipv4(data, offset):
+    header_len = (data[offset] & 0x0f) * 4
+    flags_fragment, protocol = struct.unpack_from('!HxB', data, offset + 6)
+    if protocol != IP_PROTO_UDP or flags_fragment & 0x1fff:
+        return None
+    offset += header_len
+    src_port, dst_port = struct.unpack_from('!HH', data, offset)
+    if src_port not in DHCP_PORTS or dst_port not in DHCP_PORTS:
+        return None
+    bootp = offset + 8
+    if len(data) < bootp + BOOTP_HEADER_LEN:
+        return None
+    hw_len = data[bootp + 2]
+    your_ip = data[bootp + 16:bootp + 20]
+    mac = _format_mac(data[bootp + 28:bootp + 28 + min(hw_len, 16)])
+    options = bootp + BOOTP_HEADER_LEN
+    has_options = data[options:options + 4] == DHCP_MAGIC
+    dhcp_type = _decode_dhcp_type(data, options + 4) if has_options else None
+    ip_addr = socket.inet_ntoa(your_ip) if any(your_ip) else None
+    return DhcpEvent('dhcp', mac, ip_addr, dhcp_type)
+
+
+def decode_packet(data):
+    """Decode an ethernet frame into a DhcpEvent, or None if it's not DHCP or ARP"""
+    try:
+        eth_dst, eth_src = bytes(data[0:6]), bytes(data[6:12])
+        eth_type, = struct.unpack_from('!H', data, 12)
+        offset = 14
+        if eth_type == ETH_TYPE_VLAN:
+            eth_type, = struct.unpack_from('!H', data, 16)
+            offset = 18
+        if eth_type == ETH_TYPE_ARP:
+            return _decode_arp(data, offset, eth_dst, eth_src)
+        if eth_type == ETH_TYPE_IPV4:
+            return _decode_ipv4(data, offset)
+    except (struct.error, IndexError):
+        LOGGER.debug('Truncated packet of length %d', len(data))
+    return None
+
 
 class DhcpMonitor:
     """Class to handle DHCP monitoring"""
 
-    DHCP_START_PATTERN = 'BOOTP/DHCP'
-    DHCP_IP_PATTERN = 'Your-IP ([0-9.]+)'
-    DHCP_MAC_PATTERN = 'Client-Ethernet-Address ([a-f0-9:]+)'
-    DHCP_TYPE_PATTERN = 'DHCP-Message .*53.*, length 1: ([a-zA-Z]+)'
-    DHCP_ARP1_PATTERN = '([a-f0-9:]+) > ff:ff:ff:ff:ff:ff, ethertype ARP .* tell ([0-9.]+),'
-    DHCP_ARP2_PATTERN = '([a-f0-9:]+) > .*, ethertype ARP .* Reply ([0-9.]+) is-at '
-    DHCP_PATTERN = '(%s)|(%s)|(%s)|(%s)|(%s)|(%s)' % (DHCP_START_PATTERN,
-                                                      DHCP_IP_PATTERN,
-                                                      DHCP_MAC_PATTERN,
-                                                      DHCP_TYPE_PATTERN,
-                                                      DHCP_ARP1_PATTERN,
-                                                      DHCP_ARP2_PATTERN)
+    DHCP_FILTER = 'arp or udp port 67 or udp port 68'
     DHCP_THRESHHOLD_SEC = 80
 
     # pylint: disable=too-many-arguments
@@ -49,53 +138,28 @@ class DhcpMonitor:
             LOGGER.debug('Logging results to %s', self.log_file)
             self.dhcp_log = open(self.log_file, "w")
         self.scan_start = int(time.time())
-        # Because there's buffering somewhere, can't reliably filter out DHCP with "src port 67"
-        tcp_filter = ""
-        flags = "-Q out -v -l"  # use line buffering
-        helper = tcpdump_helper.TcpdumpHelper(self.host, tcp_filter, packets=None,
-                                              vflags=flags, timeout=None, blocking=False,
-                                              intf_name=self.intf_name)
-        self.dhcp_traffic = helper
+        netns_pid = self.host.pid if getattr(self.host, 'inNamespace', False) else None
+        self.dhcp_traffic = packet_capture.PacketCapture(self.intf_name, self.DHCP_FILTER,
+                                                         callback=self._dhcp_packet,
+                                                         direction='out', netns_pid=netns_pid)
         self.runner.monitor_stream(self.name, self.dhcp_traffic.stream(),
-                                   self._dhcp_line, hangup=self._dhcp_hangup,
+                                   self.dhcp_traffic.process, hangup=self._dhcp_hangup,
                                    error=self._dhcp_error)
 
-    def _dhcp_line(self):
-        dhcp_line = self.dhcp_traffic.next_line()
-        if not dhcp_line:
+    def _dhcp_packet(self, packet):
+        event = decode_packet(packet.data)
+        if not event:
             return
         if self.dhcp_log:
-            self.dhcp_log.write(dhcp_line)
-        match = re.search(self.DHCP_PATTERN, dhcp_line)
-        if match:
-            LOGGER.debug('dhcp_line: %s', dhcp_line.strip())
-            if match.group(1):
-                self.target_mac = None
-                self.target_ip = None
-                LOGGER.debug('Reset dhcp')
-            elif match.group(2):
-                assert not self.target_ip
-                self.target_ip = match.group(3)
-                LOGGER.debug('Found ip %s', self.target_ip)
-            elif match.group(4):
-                assert not self.target_mac
-                self.target_mac = match.group(5)
-                LOGGER.debug('Found mac %s', self.target_mac)
-            elif match.group(6):
-                LOGGER.debug('Message type %s', match.group(7))
-                self._dhcp_complete(match.group(7))
-            elif match.group(8):
-                LOGGER.debug('ARP message %s %s', match.group(9), match.group(10))
-                self.target_mac = match.group(9)
-                self.target_ip = match.group(10)
-                self._dhcp_complete('STATIC')
-            elif match.group(11):
-                LOGGER.debug('ARP message %s %s', match.group(12), match.group(13))
-                self.target_mac = match.group(12)
-                self.target_ip = match.group(13)
-                self._dhcp_complete('STATIC')
-            else:
-                LOGGER.info('Unknown dhcp match: %s', dhcp_line.strip())
+            self.dhcp_log.write('%.6f %s\n' % (packet.timestamp, event))
+        LOGGER.debug('dhcp_packet: %s', event)
+        self.target_mac = event.mac
+        self.target_ip = event.ip
+        if event.kind == 'arp':
+            self._dhcp_complete('STATIC')
+        elif event.dhcp_type:
+            LOGGER.debug('Message type %s', event.dhcp_type)
+            self._dhcp_complete(event.dhcp_type)
 
     def cleanup(self):
         """Cleanup any ongoing dhcp activity"""
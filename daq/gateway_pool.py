@@ -0,0 +1,122 @@
+"""Background gateway initialization and pooling of idle gateways"""
+
+import collections
+from concurrent import futures
+
+import logger
+
+LOGGER = logger.get_logger('gwpool')
+
+
+class GatewayInitializer:
+    """Bring up gateway hosts on worker threads, with a limit on how many run at once.
+
+    Completion is handed back to the main loop through the notify function (which
+    must run its argument on the main thread), where the gateway monitors are started
+    and any waiting callbacks are run."""
+
+    def __init__(self, limit, notify):
+        self._executor = futures.ThreadPoolExecutor(max_workers=limit,
+                                                    thread_name_prefix='gateway')
+        self._notify = notify
+        self._pending = {}
+        self._futures = {}
+
+    def start(self, gateway, callback=None):
+        """Start initializing a gateway, calling callback(gateway, exception) when done"""
+        assert gateway not in self._pending, 'gateway %s already initializing' % gateway
+        LOGGER.info('Gateway %s background initialization', gateway)
+        self._pending[gateway] = [callback] if callback else []
+        future = self._executor.submit(gateway.initialize_hosts)
+        self._futures[gateway] = future
+        future.add_done_callback(lambda future: self._notify(
+            lambda: self._complete(gateway, future)))
+
+    def is_pending(self, gateway):
+        """Check if the given gateway is still being initialized"""
+        return gateway in self._pending
+
+    def when_ready(self, gateway, callback):
+        """Call callback(gateway, exception) once the gateway is initialized"""
+        if gateway in self._pending:
+            self._pending[gateway].append(callback)
+        else:
+            callback(gateway, None)
+
+    def _complete(self, gateway, future):
+        callbacks = self._pending.pop(gateway)
+        self._futures.pop(gateway, None)
+        exception = futures.CancelledError() if future.cancelled() else future.exception()
+        if not exception:
+            try:
+                gateway.start_monitors()
+            except Exception as e:
+                exception = e
+        LOGGER.info('Gateway %s initialization complete: %s', gateway, exception)
+        for callback in callbacks:
+            callback(gateway, exception)
+
+    def shutdown(self):
+        """Abandon queued work and wait for in-progress initializations to finish"""
+        # Executor.shutdown only takes cancel_futures from python 3.9.
+        for future in self._futures.values():
+            future.cancel()
+        self._executor.shutdown(wait=True)
+
+
+class GatewayPool:
+    """Idle, already initialized gateways, ready to be handed out to new device groups"""
+
+    def __init__(self, size):
+        self.size = size
+        self._idle = collections.deque()
+        self._hits = 0
+        self._misses = 0
+        self._recycled = 0
+
+    def __len__(self):
+        return len(self._idle)
+
+    def __contains__(self, gateway):
+        return gateway in self._idle
+
+    def needs_fill(self):
+        """Check if the pool is below its target size"""
+        return len(self._idle) < self.size
+
+    def add(self, gateway, recycled=False):
+        """Add an idle gateway to the pool"""
+        assert gateway not in self._idle, 'gateway %s already pooled' % gateway
+        LOGGER.info('Pooling idle %s (%d/%d)', gateway, len(self._idle) + 1, self.size)
+        self._idle.append(gateway)
+        if recycled:
+            self._recycled += 1
+
+    def take(self):
+        """Take the longest idle gateway from the pool, or None if empty"""
+        if not self._idle:
+            self._misses += 1
+            return None
+        self._hits += 1
+        return self._idle.popleft()
+
+    def discard(self, gateway):
+        """Remove a gateway from the pool, e.g. if it failed to initialize"""
+        if gateway in self._idle:
+            self._idle.remove(gateway)
+
+    def drain(self):
+        """Remove and return all pooled gateways"""
+        gateways = list(self._idle)
+        self._idle.clear()
+        return gateways
+
+    def get_stats(self):
+        """Return pool occupancy and hit counters"""
+        return {
+            'size': self.size,
+            'idle': len(self._idle),
+            'hits': self._hits,
+            'misses': self._misses,
+            'recycled': self._recycled
+        }
@@ -3,11 +3,11 @@
 import copy
 import os
 import sys
-import yaml
 
 from daq import DAQ
 from env import DAQ_RUN_DIR
 import logger
+import yaml_util
 
 LOGGER = logger.get_logger('generator')
 
@@ -106,7 +106,7 @@ class TopologyGenerator():
     def _load_config(self, path):
         LOGGER.info('Loading %s', path)
         with open(path) as stream:
-            return yaml.safe_load(stream)
+            return yaml_util.safe_load(stream)
 
     def _write_config(self, target, filename, data):
         topo_base = self.config.get('topo_dir')
@@ -119,7 +119,7 @@ class TopologyGenerator():
         out_path = os.path.join(topo_dir, filename)
         LOGGER.info('Writing output file %s', out_path)
         with open(out_path, 'w') as stream:
-            yaml.safe_dump(data, stream=stream)
+            yaml_util.safe_dump(data, stream=stream)
 
     def _get_all_domains(self):
         return self._site['tier1']['domains'].keys()
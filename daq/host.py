@@ -15,6 +15,8 @@ from proto import usi_pb2_grpc as usi_service
 from proto.system_config_pb2 import DhcpMode
 
 import configurator
+import packet_capture
+import ping_helper
 import tcpdump_helper
 from test_modules import DockerModule, IpAddrModule, NativeModule
 from env import DAQ_RUN_DIR
@@ -119,6 +121,8 @@ class ConnectedHost:
         self.test_start = gcp.get_timestamp()
         self.test_host = None
         self.test_port = None
+        # Parallel-safe tests running alongside the main test, by name: (module, started).
+        self._parallel_tests = {}
         self._startup_time = None
         self._monitor_scan_sec = int(config.get('monitor_scan_sec', 0))
         _default_timeout_sec = int(config.get('default_timeout_sec', 0))
@@ -126,6 +130,8 @@ class ConnectedHost:
         self._usi_config = config.get('usi_setup', {})
         self._topology_hook_script = config.get('topology_hook')
         self._mirror_intf_name = None
+        self._native_capture = config.get('native_capture', False)
+        self._capture = None
         self._monitor_ref = None
         self._monitor_start = None
         self.target_ip = None
@@ -140,7 +146,9 @@ class ConnectedHost:
         self.logger.info('Host %s running with enabled tests %s', self.target_mac,
                          self.remaining_tests)
         self._report = ReportGenerator(config, self.target_mac, self._loaded_config,
-                                       self.runner.report_sink, get_devdir(self.target_mac))
+                                       self.runner.report_sink, get_devdir(self.target_mac),
+                                       renderer=self.runner.report_renderer)
+        self._report_futures = None
         self.record_result('startup', state=MODE.PREP)
         self._record_result('info', state=self.target_mac, config=self._make_config_bundle())
         self._trigger_path = None
@@ -148,6 +156,7 @@ class ConnectedHost:
         self.timeout_handler = self._aux_module_timeout_handler
         self._all_ips = []
         self._ip_listener = None
+        self._base_task = None
 
     @staticmethod
     def make_runid():
@@ -439,8 +448,10 @@ class ConnectedHost:
     def heartbeat(self):
         """Checks module run time for each event loop"""
         timeout_sec = self._get_test_timeout(self.test_name)
+        self._check_capture_timeout()
         if self.test_host:
             self.test_host.heartbeat()
+        self._parallel_heartbeat()
         if not timeout_sec or not self.test_start or self._no_test:
             return
         timeout = gcp.parse_timestamp(self.test_start) + timedelta(seconds=timeout_sec)
@@ -459,15 +470,38 @@ class ConnectedHost:
         self._dhcp_listeners.append(callback)
 
     def _finalize_report(self):
-        report_paths, test_results = self._report.finalize()
+        report_futures, test_results = self._report.finalize()
+        self._report_futures = report_futures
+        if all(future.done() for future in report_futures.values()):
+            self._upload_reports(report_futures)
+        else:
+            self.logger.info('Waiting for report rendering to complete')
+            for future in report_futures.values():
+                future.add_done_callback(lambda _: self.runner.queue_callback(
+                    functools.partial(self._report_rendered, report_futures)))
+        self._report = None
+
+        return test_results
+
+    def _report_rendered(self, report_futures):
+        if self._report_futures is not report_futures:
+            return
+        if all(future.done() for future in report_futures.values()):
+            self._upload_reports(report_futures)
+
+    def _upload_reports(self, report_futures):
+        self._report_futures = None
+        report_paths = {}
+        for name, future in report_futures.items():
+            try:
+                report_paths[name] = future.result()
+            except Exception as e:
+                self.logger.error('Target device %s report %s failed: %s', self, name, e)
         if self._trigger_path:
             report_paths.update({'trigger_path': self._trigger_path})
         self.logger.info('Finalized with reports %s', list(report_paths.keys()))
         report_blobs = {name: self._upload_file(path) for name, path in report_paths.items()}
         self.record_result('terminate', state=MODE.TERM, **report_blobs)
-        self._report = None
-
-        return test_results
 
     def terminate(self, reason, trigger=True):
         """Terminate this host"""
@@ -476,6 +510,9 @@ class ConnectedHost:
         self._state_transition(_STATE.TERM)
         self._release_config()
         self._monitor_cleanup()
+        self._close_capture()
+        if self._base_task:
+            self._base_task.cancel()
         if self._use_target_port_mirror:
             self.runner.network.delete_mirror_interface(self.target_port)
 
@@ -487,6 +524,7 @@ class ConnectedHost:
             except Exception as e:
                 self.logger.error('Target device %s terminating test: %s', self, self.test_name)
                 self.logger.exception(e)
+        self._terminate_parallel_tests()
         if trigger:
             self.runner.target_set_complete(self.device,
                                             'Target device %s termination: %s' % (
@@ -499,7 +537,10 @@ class ConnectedHost:
         if self.state == _STATE.INIT:
             self._prepare()
         elif self.state == _STATE.BASE:
-            self._base_start()
+            if not self.runner.async_loop:
+                self._base_start()
+            elif not self._base_task:
+                self._base_task = self.runner.spawn_task(self._base_start_async(), 'base')
 
     def ip_notify(self, target_ip, state=MODE.DONE, delta_sec=-1):
         """Handle completion of ip subtask"""
@@ -512,6 +553,8 @@ class ConnectedHost:
             self.target_ip = target_ip
         if self.test_host:
             self.test_host.ip_listener(target_ip, state)
+        for module, _ in list(self._parallel_tests.values()):
+            module.ip_listener(target_ip, state)
 
     def trigger_ready(self):
         """Check if this host is ready to be triggered"""
@@ -569,35 +612,79 @@ class ConnectedHost:
         self.logger.info('Target device %s pcap intf %s for %s seconds output in %s',
                          self, self._mirror_intf_name, timeout if timeout else 'infinite',
                          self._shorten_filename(output_file))
-        helper = tcpdump_helper.TcpdumpHelper(network.pri, tcp_filter, packets=None,
-                                              intf_name=self._mirror_intf_name,
-                                              timeout=timeout, pcap_out=output_file,
-                                              blocking=False)
-        self._monitor_ref = helper
         self._monitor_start = datetime.now()
+        if self._native_capture:
+            self._monitor_ref = self._capture_segment(tcp_filter, output_file, timeout)
+            return
+        self._monitor_ref = tcpdump_helper.TcpdumpHelper(network.pri, tcp_filter, packets=None,
+                                                         intf_name=self._mirror_intf_name,
+                                                         timeout=timeout, pcap_out=output_file,
+                                                         blocking=False)
         self.runner.monitor_stream('tcpdump', self._monitor_ref.stream(),
-                                   self._monitor_ref.next_line, error=self._monitor_error,
+                                   self._monitor_ref.next_lines, error=self._monitor_error,
                                    hangup=functools.partial(self._monitor_timeout, timeout))
 
+    def _capture_segment(self, tcp_filter, output_file, timeout):
+        # One capture runs for the life of the device, rotated to a new pcap for each phase.
+        if not self._capture:
+            self._capture = packet_capture.PacketCapture(self._mirror_intf_name, tcp_filter)
+            self.runner.monitor_stream('capture', self._capture.stream(),
+                                       self._capture.process, error=self._capture_error)
+        self._capture.rotate(output_file, timeout=timeout)
+        return self._capture
+
+    def _check_capture_timeout(self):
+        # In-process captures don't hang up on their own, so expire them from the heartbeat.
+        capture = self._capture
+        if capture and self._monitor_ref is capture and capture.expired():
+            self._monitor_timeout(capture.timeout)
+
+    def _capture_error(self, exception):
+        self._close_capture(drain=False)
+        self._monitor_error(exception)
+
+    def _close_capture(self, drain=True):
+        capture, self._capture = self._capture, None
+        if capture and capture.stream():
+            self.runner.monitor_forget(capture.stream())
+            if drain:
+                capture.terminate()
+            else:
+                capture.close()
+
     def _base_start(self):
         try:
-            success = self._base_tests()
+            self._base_complete(self._base_tests())
+        except Exception as e:
             self._monitor_cleanup()
-            if not success:
-                self.logger.warning('Target device %s base tests failed', self)
-                self._state_transition(_STATE.ERROR)
-                return
-            self.logger.info('Target device %s done with base.', self)
-            self._background_scan()
+            self._monitor_error(e)
+
+    async def _base_start_async(self):
+        try:
+            self._base_complete(await self._base_tests_async())
         except Exception as e:
             self._monitor_cleanup()
             self._monitor_error(e)
 
+    def _base_complete(self, success):
+        self._monitor_cleanup()
+        if not success:
+            self.logger.warning('Target device %s base tests failed', self)
+            self._state_transition(_STATE.ERROR)
+            return
+        self.logger.info('Target device %s done with base.', self)
+        self._background_scan()
+
     def _monitor_cleanup(self, forget=True):
         if self._monitor_ref:
             self.logger.info('Target device %s network pcap complete', self)
-            active = self._monitor_ref.stream() and not self._monitor_ref.stream().closed
-            assert active == forget, 'forget and active mismatch'
+            if self._monitor_ref is self._capture:
+                # The shared capture keeps running, so only the current segment ends here.
+                self._capture.rotate(None)
+                forget = False
+            else:
+                active = self._monitor_ref.stream() and not self._monitor_ref.stream().closed
+                assert active == forget, 'forget and active mismatch'
             self._upload_file(self._startup_file)
             if forget:
                 self.runner.monitor_forget(self._monitor_ref.stream())
@@ -658,13 +745,37 @@ class ConnectedHost:
         self.record_result('base', state=MODE.DONE)
         return True
 
+    async def _base_tests_async(self):
+        self.record_result('base', state=MODE.EXEC)
+        ping = ping_helper.ping_test_async
+        if not await ping(self.gateway.host, self.target_ip):
+            self.logger.debug('Target device %s warmup ping failed', self)
+        try:
+            success1 = await ping(self.gateway.host, self.target_ip)
+            success2 = await ping(self.gateway.host, self.target_ip, src_addr=self.fake_target)
+        except Exception as e:
+            self.record_result('base', exception=e)
+            self._monitor_cleanup()
+            raise
+        if not success1 or not success2:
+            # Informational only, to match the blocking _base_tests behavior.
+            self.logger.warning('Target device %s base ping failed: %s/%s',
+                                self, success1, success2)
+        self.record_result('base', state=MODE.DONE)
+        return True
+
     def _run_next_test(self):
         assert not self.test_name, 'test_name defined: %s' % self.test_name
         try:
+            self._start_parallel_tests()
             if self.remaining_tests:
                 self.logger.debug('Target device %s executing tests %s',
                                   self, self.remaining_tests)
                 self._run_test(self.remaining_tests.pop(0))
+                self._start_parallel_tests()
+            elif self._parallel_tests:
+                self.logger.info('Target device %s waiting for parallel tests %s',
+                                 self, list(self._parallel_tests))
             elif self._no_test:
                 self.logger.info('Target device %s entering no test hold', self)
                 self._state_transition(_STATE.HOLD, _STATE.NEXT)
@@ -687,12 +798,12 @@ class ConnectedHost:
             os.makedirs(path)
         return path
 
-    def _new_test(self, test_name):
+    def _new_test(self, test_name, root_name='test_root'):
         if test_name in self.config['test_metadata']:
             metadatum = self.config['test_metadata'][test_name]
             startup_cmd = metadatum['startup_cmd']
             basedir = os.path.abspath(metadatum['basedir'])
-            new_root = os.path.abspath(os.path.join(self.devdir, 'test_root'))
+            new_root = os.path.abspath(os.path.join(self.devdir, root_name))
             if os.path.isdir(new_root):
                 shutil.rmtree(new_root)
             os.makedirs(new_root)
@@ -739,16 +850,7 @@ class ConnectedHost:
     def _end_test(self, state=MODE.DONE, return_code=None, exception=None):
         self._monitor_cleanup()
         self._state_transition(_STATE.NEXT, _STATE.TESTING)
-        report_path = os.path.join(self._host_tmp_path(), 'report.txt')
-        activation_log_path = os.path.join(self._host_dir_path(), 'activate.log')
-        module_config_path = os.path.join(self._host_tmp_path(), self._MODULE_CONFIG)
-        remote_paths = {}
-        for result_type, path in ((ResultType.REPORT_PATH, report_path),
-                                  (ResultType.ACTIVATION_LOG_PATH, activation_log_path),
-                                  (ResultType.MODULE_CONFIG_PATH, module_config_path)):
-            if os.path.isfile(path):
-                self._report_accumulate(self.test_name, {result_type: path})
-                remote_paths[result_type.value] = self._upload_file(path)
+        remote_paths = self._collect_module_files(self.test_name, self._host_name())
         self.record_result(self.test_name, state=state, code=return_code, exception=exception,
                            **remote_paths)
         self.test_name = None
@@ -756,15 +858,100 @@ class ConnectedHost:
         self.timeout_handler = None
         self._run_next_test()
 
+    def _collect_module_files(self, test_name, host_name):
+        report_path = os.path.join(self._host_tmp_path(host_name), 'report.txt')
+        activation_log_path = os.path.join(self._host_dir_path(host_name), 'activate.log')
+        module_config_path = os.path.join(self._host_tmp_path(host_name), self._MODULE_CONFIG)
+        remote_paths = {}
+        for result_type, path in ((ResultType.REPORT_PATH, report_path),
+                                  (ResultType.ACTIVATION_LOG_PATH, activation_log_path),
+                                  (ResultType.MODULE_CONFIG_PATH, module_config_path)):
+            if os.path.isfile(path):
+                self._report_accumulate(test_name, {result_type: path})
+                remote_paths[result_type.value] = self._upload_file(path)
+        return remote_paths
+
+    def _is_parallel_test(self, test_name):
+        metadatum = self.config['test_metadata'].get(test_name, {})
+        test_config = self._get_test_config(test_name) or {}
+        return bool(test_config.get('parallel', metadatum.get('parallel')))
+
+    def _start_parallel_tests(self):
+        # A parallel-safe test can start once every test ahead of it has started, leaving
+        # a test port free for the next sequential test.
+        while self.remaining_tests and self._is_parallel_test(self.remaining_tests[0]):
+            if self.gateway.free_test_ports() < 2:
+                self.logger.info('Target device %s deferring parallel test %s for test port',
+                                 self, self.remaining_tests[0])
+                return
+            self._run_parallel_test(self.remaining_tests.pop(0))
+
+    def _run_parallel_test(self, test_name):
+        module = self._new_test(test_name, root_name='test_root_%s' % test_name)
+        test_port = self.gateway.allocate_test_port()
+        started = gcp.get_timestamp()
+        self.logger.info('Target device %s start parallel %s', self, module.host_name)
+        try:
+            self._write_module_config(self._loaded_config, self._host_tmp_path(module.host_name))
+            self._record_result(test_name, started=started, config=self._loaded_config,
+                                state=MODE.CONF)
+            self._record_parallel_result(test_name, started, state=MODE.EXEC)
+            params = self._get_module_params(test_port)
+            module.start(test_port, params, functools.partial(self._parallel_callback, test_name),
+                         functools.partial(self._finish_hook, module.host_name))
+        except Exception as e:
+            self.gateway.release_test_port(test_port)
+            raise e
+        self._parallel_tests[test_name] = (module, started)
+
+    def _parallel_callback(self, test_name, return_code=None, exception=None):
+        if test_name not in self._parallel_tests:
+            self.logger.warning('Target device %s ignoring callback for %s', self, test_name)
+            return
+        module, started = self._parallel_tests.pop(test_name)
+        self.logger.info('Host parallel callback %s/%s was %s with %s',
+                         test_name, module.host_name, return_code, exception)
+        self.gateway.release_test_port(module.port)
+        state = MODE.MERR if return_code or exception else MODE.DONE
+        remote_paths = self._collect_module_files(test_name, module.host_name)
+        self._record_parallel_result(test_name, started, state=state, code=return_code,
+                                     exception=exception, **remote_paths)
+        if self.state == _STATE.NEXT and not self.test_name:
+            self._run_next_test()
+
+    def _parallel_heartbeat(self):
+        for test_name, (module, _) in list(self._parallel_tests.items()):
+            module.heartbeat()
+            timeout_sec = self._get_test_timeout(test_name)
+            if not timeout_sec or test_name not in self._parallel_tests:
+                continue
+            if datetime.now() - module.start_time >= timedelta(seconds=timeout_sec):
+                self.logger.error('Monitoring timeout for parallel %s after %ds',
+                                  test_name, timeout_sec)
+                module.terminate()
+                self._parallel_callback(test_name, exception=self._TIMEOUT_EXCEPTION)
+
+    def _terminate_parallel_tests(self):
+        parallel_tests, self._parallel_tests = self._parallel_tests, {}
+        for test_name, (module, _) in parallel_tests.items():
+            try:
+                module.terminate()
+            except Exception as e:
+                self.logger.error('Target device %s terminating parallel test: %s',
+                                  self, test_name)
+                self.logger.exception(e)
+            self.gateway.release_test_port(module.port)
+
     def _report_accumulate(self, test_name, data):
         if self._report:
             self._report.accumulate(test_name, data)
         else:
             self.logger.warning('Accumulating finalzed report for test %s', test_name)
 
-    def _get_module_params(self):
+    def _get_module_params(self, test_port=None):
+        test_port = test_port or self.test_port
         switch_setup = self.switch_setup if 'mods_addr' in self.switch_setup else None
-        ext_loip = switch_setup.get('mods_addr') % self.test_port if switch_setup else None
+        ext_loip = switch_setup.get('mods_addr') % test_port if switch_setup else None
         params = {
             'local_ip': ext_loip,
             'target_ip': self.target_ip,
@@ -794,16 +981,16 @@ class ConnectedHost:
     def _host_name(self):
         return self.test_host.host_name if self.test_host else 'unknown'
 
-    def _host_dir_path(self):
-        return os.path.join(self.devdir, 'nodes', self._host_name())
+    def _host_dir_path(self, host_name=None):
+        return os.path.join(self.devdir, 'nodes', host_name or self._host_name())
 
-    def _host_tmp_path(self):
-        return os.path.join(self._host_dir_path(), 'tmp')
+    def _host_tmp_path(self, host_name=None):
+        return os.path.join(self._host_dir_path(host_name), 'tmp')
 
-    def _finish_hook(self):
+    def _finish_hook(self, host_name=None):
         script = self.config.get('finish_hook')
         if script:
-            finish_dir = os.path.join(self.devdir, 'finish', self._host_name())
+            finish_dir = os.path.join(self.devdir, 'finish', host_name or self._host_name())
             shutil.rmtree(finish_dir, ignore_errors=True)
             os.makedirs(finish_dir)
             self.logger.info('Executing finish_hook: %s %s', script, finish_dir)
@@ -856,10 +1043,19 @@ class ConnectedHost:
             self.test_start = current
         if name:
             self._record_result(name, current, **kwargs)
-            if kwargs.get("exception"):
-                self._report_accumulate(name, {ResultType.EXCEPTION: str(kwargs["exception"])})
-            if "code" in kwargs:
-                self._report_accumulate(name, {ResultType.RETURN_CODE: kwargs["code"]})
+            self._accumulate_result(name, kwargs)
+
+    def _record_parallel_result(self, name, started, **kwargs):
+        # Unlike record_result, leaves the main test_name and test_start alone.
+        self._record_result(name, started=started, **kwargs)
+        self._accumulate_result(name, kwargs)
+
+    def _accumulate_result(self, name, kwargs):
+        if kwargs.get("exception"):
+            self._report_accumulate(name, {ResultType.EXCEPTION: str(kwargs["exception"])})
+        if "code" in kwargs:
+            self._report_accumulate(name, {ResultType.RETURN_CODE: kwargs["code"]})
+        if self._report:
             self._report.accumulate(name, {ResultType.MODULE_CONFIG: self._loaded_config})
 
     def _record_result(self, name, run_info=True, current=None, **kwargs):
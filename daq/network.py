@@ -6,10 +6,11 @@ from ipaddress import ip_network
 import copy
 from functools import partial
 import os
+import threading
 import time
-import yaml
 
 import logger
+import yaml_util
 from topology import FaucetTopology
 from env import DAQ_RUN_DIR
 
@@ -67,6 +68,8 @@ class TestNetwork:
         self.sec_port = None
         self.tap_intf = None
         self._settle_sec = int(config.get('settle_sec', 0))
+        self._batch_sec = int(config.get('acl_batch_ms', 0)) / 1e3
+        self._config_due = None
         subnet = config.get('internal_subnet', {}).get('subnet', self.DEFAULT_MININET_SUBNET)
         self._mininet_subnet = ip_network(subnet)
         self._used_ip_indices = set()
@@ -82,11 +85,17 @@ class TestNetwork:
         self.faucitizer = faucetizer.Faucetizer(
             orch_config, self.INTERMEDIATE_FAUCET_FILE, self.OUTPUT_FAUCET_FILE)
         self._vxlan_port_sets = set()
+        # Gateways can be brought up on background threads, and mininet is not thread-safe.
+        self._host_lock = threading.RLock()
 
-    # pylint: disable=too-many-arguments
-    def add_host(self, name, cls=DAQHost, ip_addr=None, env_vars=None, vol_maps=None,
-                 port=None, tmpdir=None):
+    def add_host(self, *args, **kwargs):
         """Add a host to the ecosystem"""
+        with self._host_lock:
+            return self._add_host(*args, **kwargs)
+
+    # pylint: disable=too-many-arguments
+    def _add_host(self, name, cls=DAQHost, ip_addr=None, env_vars=None, vol_maps=None,
+                  port=None, tmpdir=None):
         override_ip = bool(ip_addr)
         if self._used_ip_indices and not ip_addr:
             for index in range(1, max(self._used_ip_indices)):
@@ -157,6 +166,10 @@ class TestNetwork:
 
     def remove_host(self, host):
         """Remove a host from the ecosystem"""
+        with self._host_lock:
+            self._remove_host(host)
+
+    def _remove_host(self, host):
         index = self.net.hosts.index(host)
         if host.IP() and self._get_host_ip_index(host) in self._used_ip_indices:
             self._used_ip_indices.remove(self._get_host_ip_index(host))
@@ -335,17 +348,35 @@ class TestNetwork:
         LOGGER.info('Directing traffic for %s on port %s to %s', device, port, dest)
         # TODO: Convert this to use faucitizer to change vlan
         self.topology.direct_port_traffic(device, port, target)
+        self._schedule_behavioral_config()
+
+    def _schedule_behavioral_config(self):
+        if not self._batch_sec:
+            self._generate_behavioral_config()
+        elif self._config_due is None:
+            self._config_due = time.monotonic() + self._batch_sec
+
+    def flush_behavioral_config(self):
+        """Apply config changes batched by acl_batch_ms once their window has passed.
+        Returns the seconds until the next pending flush, or None if nothing is pending."""
+        if self._config_due is None:
+            return None
+        remaining = self._config_due - time.monotonic()
+        if remaining > 0:
+            return remaining
         self._generate_behavioral_config()
+        return None
 
     def _generate_behavioral_config(self):
-        with open(self.INTERMEDIATE_FAUCET_FILE, 'w') as file:
-            network_topology = self.topology.get_network_topology()
-            yaml.safe_dump(network_topology, file)
+        self._config_due = None
+        acl_files = self.topology.flush_acls()
+        LOGGER.debug('Generating behavioral config with %d updated acl files', len(acl_files))
 
+        network_topology = self.topology.get_network_topology()
+        yaml_util.dump_atomic(network_topology, self.INTERMEDIATE_FAUCET_FILE)
         self.faucitizer.reload_structural_config(self.INTERMEDIATE_FAUCET_FILE)
 
-        with open(self.INTERMEDIATE_GAUGE_FILE, 'w') as file:
-            yaml.safe_dump(self.topology.get_gauge_config(), file)
+        yaml_util.dump_atomic(self.topology.get_gauge_config(), self.INTERMEDIATE_GAUGE_FILE)
         self.faucitizer.reload_and_flush_gauge_config(self.INTERMEDIATE_GAUGE_FILE)
 
         if self._settle_sec:
@@ -359,7 +390,7 @@ class TestNetwork:
                     device.mac, device.vlan, device.assigned, device.port.vxlan, port_set)
         # TODO: Convert this to use faucitizer to change vlan
         self.topology.direct_device_traffic(device)
-        self._generate_behavioral_config()
+        self._schedule_behavioral_config()
         if port_set:
             self._configure_remote_tap(device)
         else:
@@ -0,0 +1,343 @@
+"""In-process packet capture using AF_PACKET sockets, as an alternative to tcpdump"""
+
+import ctypes
+import functools
+import mmap
+import os
+import socket
+import struct
+import subprocess
+import threading
+import time
+
+import logger
+
+LOGGER = logger.get_logger('capture')
+
+ETH_P_ALL = 0x0003
+SOL_PACKET = 263
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+TPACKET_V3 = 2
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+SO_ATTACH_FILTER = 26
+CLONE_NEWNET = 0x40000000
+
+PACKET_HOST = 0
+PACKET_BROADCAST = 1
+PACKET_MULTICAST = 2
+PACKET_OUTGOING = 4
+
+LINKTYPE_ETHERNET = 1
+DEFAULT_SNAPLEN = 262144
+
+# struct tpacket_req3
+_RING_REQ = struct.Struct('=IIIIIII')
+# struct tpacket_block_desc: version, offset_to_priv, then tpacket_hdr_v1 fields.
+_BLOCK_HDR = struct.Struct('=IIIII')
+_BLOCK_STATUS_OFFSET = 8
+# struct tpacket3_hdr up to tp_net.
+_PACKET_HDR = struct.Struct('=IIIIIIHH')
+# struct sockaddr_ll, following the aligned tpacket3_hdr.
+_SLL_OFFSET = 48
+_SLL_PKTTYPE = struct.Struct('=HHiHB')
+_PCAP_HEADER = struct.Struct('=IHHiIII')
+_PCAP_RECORD = struct.Struct('=IIII')
+_PCAP_MAGIC = 0xa1b2c3d4
+
+
+@functools.lru_cache(maxsize=None)
+def compile_filter(tcp_filter):
+    """Compile a tcpdump filter expression to classic BPF instructions"""
+    if not tcp_filter:
+        return None
+    # Loopback uses ethernet framing on linux, so it compiles for the right link type.
+    output = subprocess.check_output(['tcpdump', '-ddd', '-i', 'lo', tcp_filter],
+                                     stderr=subprocess.DEVNULL).decode('utf-8')
+    lines = output.strip().split('\n')
+    count = int(lines[0])
+    program = tuple(tuple(int(part) for part in line.split()) for line in lines[1:])
+    assert len(program) == count, 'bpf instruction count mismatch'
+    return program
+
+
+def attach_filter(sock, program):
+    """Attach a compiled BPF program to a socket"""
+    instructions = b''.join(struct.pack('=HBBI', *insn) for insn in program)
+    buf = ctypes.create_string_buffer(instructions)
+    fprog = struct.pack('HL', len(program), ctypes.addressof(buf))
+    sock.setsockopt(socket.SOL_SOCKET, SO_ATTACH_FILTER, fprog)
+
+
+def _setns(fd):
+    if hasattr(os, 'setns'):
+        os.setns(fd, CLONE_NEWNET)
+        return
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.setns(fd, CLONE_NEWNET) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def _in_netns(pid, func):
+    """Run func in the network namespace of the given pid, using a scratch thread"""
+    if not pid:
+        return func()
+    result = {}
+
+    def target():
+        try:
+            with open('/proc/%d/ns/net' % pid) as netns:
+                _setns(netns.fileno())
+            result['value'] = func()
+        except Exception as e:
+            result['error'] = e
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+    if 'error' in result:
+        raise result['error']
+    return result['value']
+
+
+class PcapWriter:
+    """Buffered writer for classic (microsecond) pcap files"""
+
+    def __init__(self, path, snaplen=DEFAULT_SNAPLEN, buffer_size=2**20):
+        self.path = path
+        self.packets = 0
+        self._file = open(path, 'wb', buffering=buffer_size)
+        self._file.write(_PCAP_HEADER.pack(_PCAP_MAGIC, 2, 4, 0, 0, snaplen, LINKTYPE_ETHERNET))
+
+    def write(self, timestamp, data, orig_len=None):
+        """Write one packet record"""
+        sec = int(timestamp)
+        usec = int((timestamp - sec) * 1e6)
+        self._file.write(_PCAP_RECORD.pack(sec, usec, len(data), orig_len or len(data)))
+        self._file.write(data)
+        self.packets += 1
+
+    def flush(self):
+        """Flush buffered records to disk"""
+        self._file.flush()
+
+    def close(self):
+        """Flush and close the file"""
+        if not self._file.closed:
+            self._file.close()
+
+
+class CapturedPacket:
+    """A single captured frame with lazily decoded ethernet fields"""
+
+    __slots__ = ('timestamp', 'pkttype', 'data')
+
+    def __init__(self, timestamp, pkttype, data):
+        self.timestamp = timestamp
+        self.pkttype = pkttype
+        self.data = data
+
+    @property
+    def eth_dst(self):
+        """Destination mac as a colon separated string"""
+        return ':'.join('%02x' % octet for octet in self.data[0:6])
+
+    @property
+    def eth_src(self):
+        """Source mac as a colon separated string"""
+        return ':'.join('%02x' % octet for octet in self.data[6:12])
+
+    @property
+    def ethertype(self):
+        """Ethertype of the frame"""
+        return struct.unpack_from('!H', self.data, 12)[0]
+
+
+class PacketCapture:
+    """Capture packets from an interface into a pcap file and/or packet callbacks.
+
+    The object is meant to be registered with the stream monitor, with process()
+    as the data callback. Long-lived captures can be split into per-phase pcap
+    files with rotate()."""
+
+    _BLOCK_SIZE = 2**20
+    _BLOCK_COUNT = 8
+    _FRAME_SIZE = 2**11
+    _BLOCK_TIMEOUT_MS = 50
+    _FLUSH_SEC = 1
+    # Ring blocks are only handed over once retired, so keep the previous segment
+    # open long enough to receive packets that were stamped before the rotation.
+    _ROTATE_GRACE_SEC = 4 * _BLOCK_TIMEOUT_MS / 1e3
+
+    # pylint: disable=too-many-arguments
+    def __init__(self, intf_name, tcp_filter='', pcap_out=None, timeout=None,
+                 callback=None, direction=None, netns_pid=None, use_ring=True):
+        self.intf_name = intf_name
+        self.timeout = timeout
+        self.callback = callback
+        self._direction = direction
+        self._start = time.monotonic()
+        self._last_flush = self._start
+        self._ring = None
+        self._block_index = 0
+        self._recv_buf = None
+        self._previous = None
+        self._boundary = None
+        self.writer = PcapWriter(pcap_out) if pcap_out else None
+        program = compile_filter(tcp_filter)
+        self._sock = _in_netns(netns_pid, functools.partial(self._open_socket, program))
+        if use_ring:
+            self._setup_ring()
+        if not self._ring:
+            self._recv_buf = bytearray(DEFAULT_SNAPLEN)
+        LOGGER.info('Packet capture on %s fd %d filter "%s" ring %s', intf_name,
+                    self._sock.fileno(), tcp_filter, bool(self._ring))
+
+    def _open_socket(self, program):
+        # Protocol 0 receives nothing until the bind, so no unfiltered packets are
+        # queued from other interfaces while the filter is being attached.
+        sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, 0)
+        try:
+            if program:
+                attach_filter(sock, program)
+            sock.bind((self.intf_name, ETH_P_ALL))
+            sock.setblocking(False)
+        except Exception:
+            sock.close()
+            raise
+        return sock
+
+    def _setup_ring(self):
+        try:
+            self._sock.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V3)
+            frame_count = self._BLOCK_SIZE * self._BLOCK_COUNT // self._FRAME_SIZE
+            request = _RING_REQ.pack(self._BLOCK_SIZE, self._BLOCK_COUNT, self._FRAME_SIZE,
+                                     frame_count, self._BLOCK_TIMEOUT_MS, 0, 0)
+            self._sock.setsockopt(SOL_PACKET, PACKET_RX_RING, request)
+            self._ring = mmap.mmap(self._sock.fileno(), self._BLOCK_SIZE * self._BLOCK_COUNT,
+                                   mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        except OSError as e:
+            LOGGER.warning('Packet ring unavailable on %s, using recv: %s', self.intf_name, e)
+            self._ring = None
+
+    @property
+    def closed(self):
+        """True if the capture socket has been closed"""
+        return self._sock is None
+
+    def fileno(self):
+        """Return the capture socket fd, for use with the stream monitor"""
+        return self._sock.fileno()
+
+    def stream(self):
+        """Return the pollable capture object, or None if closed"""
+        return None if self.closed else self
+
+    def expired(self):
+        """Check if the capture has run for its configured timeout"""
+        return bool(self.timeout) and time.monotonic() - self._start >= self.timeout
+
+    def rotate(self, pcap_out, timeout=None):
+        """Start a new output segment (or none) at the current time, with its own timeout"""
+        boundary = time.time()
+        self.timeout = timeout
+        self._start = time.monotonic()
+        self.process()
+        self._close_previous()
+        if self.writer:
+            self.writer.flush()
+        LOGGER.debug('Packet capture on %s rotate to %s', self.intf_name, pcap_out)
+        self._previous, self._boundary = self.writer, boundary
+        self.writer = PcapWriter(pcap_out) if pcap_out else None
+
+    def _close_previous(self):
+        if self._previous:
+            self._previous.close()
+            self._previous = None
+
+    def process(self):
+        """Drain all pending packets, returning the number processed"""
+        if self.closed:
+            return 0
+        count = self._process_ring() if self._ring else self._process_recv()
+        now = time.monotonic()
+        if self._previous and time.time() - self._boundary >= self._ROTATE_GRACE_SEC:
+            self._close_previous()
+        if self.writer and now - self._last_flush >= self._FLUSH_SEC:
+            self.writer.flush()
+            self._last_flush = now
+        return count
+
+    def _process_ring(self):
+        count = 0
+        ring = self._ring
+        while True:
+            block_offset = self._block_index * self._BLOCK_SIZE
+            _, _, status, num_pkts, first_offset = _BLOCK_HDR.unpack_from(ring, block_offset)
+            if not status & TP_STATUS_USER:
+                break
+            packet_offset = block_offset + first_offset
+            for _ in range(num_pkts):
+                packet_offset += self._process_frame(packet_offset)
+                count += 1
+            struct.pack_into('=I', ring, block_offset + _BLOCK_STATUS_OFFSET, TP_STATUS_KERNEL)
+            self._block_index = (self._block_index + 1) % self._BLOCK_COUNT
+        return count
+
+    def _process_frame(self, packet_offset):
+        """Deliver the tpacket3 frame at the given ring offset, returning the next offset"""
+        ring = self._ring
+        (next_offset, sec, nsec, snaplen, orig_len, _,
+         mac_offset, _) = _PACKET_HDR.unpack_from(ring, packet_offset)
+        pkttype = _SLL_PKTTYPE.unpack_from(ring, packet_offset + _SLL_OFFSET)[4]
+        data_offset = packet_offset + mac_offset
+        with memoryview(ring)[data_offset:data_offset + snaplen] as data:
+            self._deliver(sec + nsec / 1e9, pkttype, data, orig_len)
+        return next_offset
+
+    def _process_recv(self):
+        count = 0
+        while True:
+            try:
+                nbytes, address = self._sock.recvfrom_into(self._recv_buf)
+            except BlockingIOError:
+                break
+            with memoryview(self._recv_buf)[:nbytes] as data:
+                self._deliver(time.time(), address[2], data, nbytes)
+            count += 1
+        return count
+
+    def _deliver(self, timestamp, pkttype, data, orig_len):
+        if self._direction == 'out' and pkttype != PACKET_OUTGOING:
+            return
+        if self._direction == 'in' and pkttype == PACKET_OUTGOING:
+            return
+        writer = self.writer
+        if self._previous and timestamp < self._boundary:
+            writer = self._previous
+        if writer:
+            writer.write(timestamp, data, orig_len)
+        if self.callback:
+            self.callback(CapturedPacket(timestamp, pkttype, bytes(data)))
+
+    def close(self):
+        """Close the capture socket and output file"""
+        if self._ring:
+            self._ring.close()
+            self._ring = None
+        if self._sock:
+            self._sock.close()
+            self._sock = None
+        self._close_previous()
+        if self.writer:
+            self.writer.close()
+
+    def terminate(self):
+        """Stop the capture, draining anything still pending"""
+        LOGGER.info('Packet capture on %s terminate', self.intf_name)
+        try:
+            self.process()
+        finally:
+            self.close()
+        return 0
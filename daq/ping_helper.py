@@ -0,0 +1,68 @@
+"""Ping tests between mininet hosts, blocking, in parallel, or from an asyncio loop"""
+
+import subprocess
+
+import async_monitor
+import logger
+
+LOGGER = logger.get_logger('ping')
+
+_FAILURE = 'ping FAILED'
+_WAIT_SEC = 10
+
+
+def _ping_args(src, dst, src_addr):
+    dst_name = dst if isinstance(dst, str) else dst.name
+    dst_ip = dst if isinstance(dst, str) else dst.IP()
+    from_msg = ' from %s' % src_addr if src_addr else ''
+    LOGGER.info('Test ping %s->%s%s', src.name, dst_name, from_msg)
+    assert dst_ip != "0.0.0.0", "IP address not assigned, can't ping"
+    return ['-I', src_addr, dst_ip] if src_addr else [dst_ip]
+
+
+def ping_test(src, dst, src_addr=None, count=2):
+    """Test ping between hosts"""
+    ping_args = _ping_args(src, dst, src_addr)
+    try:
+        output = src.cmd('ping -c', count, *ping_args, '> /dev/null 2>&1 || echo ', _FAILURE)
+        return output.strip() != _FAILURE
+    except Exception as e:
+        LOGGER.info('Test ping failure: %s', e)
+        return False
+
+
+def _wait(proc, timeout):
+    try:
+        return proc.wait(timeout=timeout) == 0
+    except subprocess.TimeoutExpired:
+        LOGGER.info('Test parallel ping timeout after %ds', timeout)
+        proc.kill()
+        proc.wait()
+        return False
+
+
+def ping_test_parallel(pings, count=2):
+    """Run a list of (src, dst, src_addr) ping tests concurrently, returning the results"""
+    procs = []
+    for src, dst, src_addr in pings:
+        cmd = ' '.join(['ping -c', str(count), *_ping_args(src, dst, src_addr)])
+        try:
+            procs.append(src.popen(cmd, stdin=subprocess.DEVNULL,
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        except Exception as e:
+            LOGGER.info('Test parallel ping failure: %s', e)
+            procs.append(None)
+    return [bool(proc) and _wait(proc, count + _WAIT_SEC) for proc in procs]
+
+
+async def ping_test_async(src, dst, src_addr=None, count=2):
+    """Test ping between hosts without blocking the asyncio event loop"""
+    ping_args = _ping_args(src, dst, src_addr)
+    # Attach to the source host's namespaces the same way mininet's popen does.
+    cmd = ['mnexec', '-a', str(src.pid), 'ping', '-c', str(count), *ping_args]
+    try:
+        return_code, _, _ = await async_monitor.run_command(*cmd, timeout=count + _WAIT_SEC)
+        return return_code == 0
+    except Exception as e:
+        LOGGER.info('Test async ping failure: %s', e)
+        return False
@@ -6,17 +6,16 @@ import json
 import os
 import re
 import shutil
+from concurrent import futures
 from enum import Enum
 
 import pytz
 import jinja2
 
-import pypandoc
-import weasyprint
-
-from env import DAQ_RUN_DIR, DAQ_LIB_DIR
+from env import DAQ_RUN_DIR
 import gcp
 import logger
+import report_renderer
 LOGGER = logger.get_logger('report')
 REPORT_BASE_DIR = os.path.join(DAQ_RUN_DIR, "reports")
 
@@ -55,9 +54,6 @@ class ReportGenerator:
 
     _NAME_FORMAT = "report_%s_%s"
     _SIMPLE_REPORT = "report"
-    _REPORT_CSS_PATH = os.path.join(DAQ_LIB_DIR, 'resources', 'setups', 'baseline',
-                                    'device_report.css')
-    _REPORT_TMP_HTML_PATH = os.path.join(DAQ_RUN_DIR, 'last_report_out.html')
     _TEST_SEPARATOR = "\n## %s\n"
     _TEST_SUBHEADER = "\n#### %s\n"
     _RESULT_REGEX = r'^RESULT (.*?)\s+(.*?)\s+([^%]*)\s*(%%.*)?$'
@@ -82,9 +78,11 @@ class ReportGenerator:
     _INDEX_SKIP = 2
 
     # pylint: disable=too-many-arguments
-    def __init__(self, config, target_mac, module_config, report_sink, dev_base):
+    def __init__(self, config, target_mac, module_config, report_sink, dev_base,
+                 renderer=None):
         self._config = config
         self._report_sink = report_sink
+        self._renderer = renderer
         self._module_config = copy.deepcopy(module_config)
         self._repitems = {}
         self._clean_mac = target_mac.replace(':', '')
@@ -149,7 +147,8 @@ class ReportGenerator:
             LOGGER.error('Report generation failed: %s', e)
 
     def finalize(self):
-        """Finalize this report"""
+        """Finalize this report, returning futures for the report file paths, which are
+        complete except for a pdf still being rendered, and the test results"""
         LOGGER.info('Finalizing %s', self._report_name)
         assert not self._finalized, 'report already finalized'
         self._finalized = True
@@ -158,20 +157,30 @@ class ReportGenerator:
         self._module_config['end_time'] = datetime.datetime.now(pytz.utc).replace(microsecond=0)
         self._process_results()
         self._write_md_report()
-        self._write_pdf_report()
         self._write_json_report()
         self._report_sink(self._all_results)
         LOGGER.info('Copying reports to %s.*', self._alt_prefix)
         LOGGER.info('Copying reports to %s.*', self._dev_prefix)
-        report_paths = {}
+        report_futures = {}
         for extension in ['.md', '.pdf', '.json']:
+            if extension == '.pdf':
+                report_futures[self._PATH_PREFIX + extension] = self._write_pdf_report()
+                continue
             report_path = self._report_prefix + extension
-            if self._alt_prefix:
-                shutil.copyfile(report_path, self._alt_prefix + extension)
-            if self._dev_prefix:
-                shutil.copyfile(report_path, self._dev_prefix + extension)
-            report_paths.update({self._PATH_PREFIX + extension: report_path})
-        return report_paths, self._all_results
+            for copy_path in self._copy_paths(extension):
+                shutil.copyfile(report_path, copy_path)
+            report_futures[self._PATH_PREFIX + extension] = self._completed(report_path)
+        return report_futures, self._all_results
+
+    def _copy_paths(self, extension):
+        prefixes = (self._alt_prefix, self._dev_prefix)
+        return [prefix + extension for prefix in prefixes if prefix]
+
+    @staticmethod
+    def _completed(result):
+        future = futures.Future()
+        future.set_result(result)
+        return future
 
     def _write_json_report(self):
         json_path = self._report_prefix + '.json'
@@ -210,16 +219,15 @@ class ReportGenerator:
             self._file_md = None
 
     def _write_pdf_report(self):
-        """Convert the markdown report to html, then pdf"""
-        LOGGER.info('Generating HTML for writing pdf report...')
+        """Convert the markdown report to html, then pdf, returning a future for the pdf"""
         md_file = self._report_prefix + '.md'
-        pypandoc.convert_file(md_file, 'html',
-                              outputfile=self._REPORT_TMP_HTML_PATH,
-                              extra_args=['-V', 'geometry:margin=1.5cm', '--columns', '1000'])
-        LOGGER.info('Metamorphosising HTML to PDF...')
-        html_writer = weasyprint.HTML(self._REPORT_TMP_HTML_PATH)
         pdf_file = self._report_prefix + '.pdf'
-        html_writer.write_pdf(pdf_file, stylesheets=[weasyprint.CSS(self._REPORT_CSS_PATH)])
+        copy_paths = self._copy_paths('.pdf')
+        if self._renderer:
+            LOGGER.info('Queueing pdf report %s for rendering', pdf_file)
+            return self._renderer.submit(md_file, pdf_file, copy_paths)
+        LOGGER.info('Generating pdf report %s', pdf_file)
+        return self._completed(report_renderer.render_pdf(md_file, pdf_file, copy_paths))
 
     def _write_test_summary(self):
         self._writeln(self._TEST_SEPARATOR % self._SUMMARY_LINE)
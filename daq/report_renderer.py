@@ -0,0 +1,66 @@
+"""Rendering of device reports to pdf, inline or on a pool of worker processes"""
+
+from concurrent import futures
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+import pypandoc
+import weasyprint
+
+from env import DAQ_LIB_DIR
+import logger
+
+LOGGER = logger.get_logger('renderer')
+
+REPORT_CSS_PATH = os.path.join(DAQ_LIB_DIR, 'resources', 'setups', 'baseline',
+                               'device_report.css')
+_PANDOC_ARGS = ['-V', 'geometry:margin=1.5cm', '--columns', '1000']
+_stylesheets = {}
+
+
+def _stylesheet(css_path=REPORT_CSS_PATH):
+    if css_path not in _stylesheets:
+        _stylesheets[css_path] = weasyprint.CSS(css_path)
+    return _stylesheets[css_path]
+
+
+def _init_worker():
+    # Parse the stylesheet once per worker, rather than once per report.
+    _stylesheet()
+
+
+def render_pdf(md_path, pdf_path, copy_paths=()):
+    """Convert a markdown report to html, then pdf, and copy the pdf to copy_paths"""
+    html_fd, html_path = tempfile.mkstemp(prefix=os.path.basename(pdf_path) + '.',
+                                          suffix='.html')
+    os.close(html_fd)
+    try:
+        pypandoc.convert_file(md_path, 'html', outputfile=html_path, extra_args=_PANDOC_ARGS)
+        weasyprint.HTML(html_path).write_pdf(pdf_path, stylesheets=[_stylesheet()])
+    finally:
+        os.remove(html_path)
+    for copy_path in copy_paths:
+        shutil.copyfile(pdf_path, copy_path)
+    return pdf_path
+
+
+class ReportRenderer:
+    """Pool of worker processes for pdf rendering, so that report finalization does not
+    block on pandoc and weasyprint"""
+
+    def __init__(self, workers):
+        LOGGER.info('Starting %d report rendering workers', workers)
+        # Spawn rather than fork, since the runner process has many threads.
+        self._executor = futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker)
+
+    def submit(self, md_path, pdf_path, copy_paths=()):
+        """Start rendering a pdf report, returning a future for its path"""
+        return self._executor.submit(render_pdf, md_path, pdf_path, list(copy_paths))
+
+    def shutdown(self):
+        """Wait for in-progress renders to finish and stop the workers"""
+        self._executor.shutdown(wait=True)
@@ -15,6 +15,7 @@ from functools import partial
 
 from forch.proto.shared_constants_pb2 import PortBehavior
 
+import async_monitor
 import configurator
 from session_server import SessionServer
 from env import DAQ_RUN_DIR, DAQ_LIB_DIR
@@ -22,11 +23,15 @@ from python_lib.faucet_event_client import FaucetEventClient
 from python_lib.shell_command_helper import ShellCommandHelper
 import container_gateway
 import external_gateway
+import gateway_pool
 import gcp
 import host as connected_host
 import network
+import ping_helper
 import report
+import report_renderer
 import stream_monitor
+import target_queue
 import udmi_manager
 from utils import dict_proto
 from wrappers import DaqException, DisconnectedException
@@ -57,13 +62,12 @@ class IpInfo:
 
 class Device:
     """Simple container for device info"""
-    def __init__(self):
-        # Neutral change that should not impact code coverage.
+    def __init__(self, registry=None):
+        self._host = None
+        self._gateway = None
+        self._group = None
+        self._port = None
         self.mac = None
-        self.host = None
-        self.gateway = None
-        self.group = None
-        self.port = None
         self.dhcp_ready = False
         self.dhcp_mode = None
         self.ip_info = IpInfo()
@@ -73,10 +77,54 @@ class Device:
         self.wait_remote = False
         self.session_endpoint = None
         self._report = True
+        self._registry = registry
 
     def __repr__(self):
         return self.mac.replace(":", "")
 
+    def _update(self, field, value):
+        attr = '_' + field
+        previous = getattr(self, attr)
+        setattr(self, attr, value)
+        if self._registry:
+            self._registry.reindex(self, field, previous, value)
+
+    @property
+    def host(self):
+        """Host running tests for this device, if triggered"""
+        return self._host
+
+    @host.setter
+    def host(self, host):
+        self._update('host', host)
+
+    @property
+    def gateway(self):
+        """Gateway this device is attached to"""
+        return self._gateway
+
+    @gateway.setter
+    def gateway(self, gateway):
+        self._update('gateway', gateway)
+
+    @property
+    def group(self):
+        """Device group name"""
+        return self._group
+
+    @group.setter
+    def group(self, group):
+        self._update('group', group)
+
+    @property
+    def port(self):
+        """Port info of this device"""
+        return self._port
+
+    @port.setter
+    def port(self, port):
+        self._update('port', port)
+
     def should_block(self):
         """Determine if this device should be blocked from test or not"""
         block_file = os.path.join(connected_host.get_devdir(self.mac), BLOCK_FILE)
@@ -106,19 +154,28 @@ class Device:
 
 
 class Devices:
-    """Container for all devices"""
+    """Container for all devices, with secondary indexes kept up to date on mutation"""
     def __init__(self):
         self._devices = {}
         self._set_ids = set()
+        # Each index maps a key to an insertion-ordered {mac: device} dict.
+        self._indexes = {
+            'port': {},
+            'gateway': {},
+            'group': {}
+        }
+        self._triggered = {}
 
     def new_device(self, mac, port_info=None, vlan=None):
         """Adding a new device"""
         assert mac not in self._devices, "Device with mac: %s is already added." % mac
         LOGGER.info('Creating new device %s on %s, port info %s', mac, vlan, bool(port_info))
-        device = Device()
+        device = Device(registry=self)
         device.mac = mac
         self._devices[mac] = device
         device.port = port_info if port_info else PortInfo()
+        self._index_add('gateway', device.gateway, device)
+        self._index_add('group', device.group, device)
         device.vlan = vlan
         port_no = device.port.port_no
         set_id = port_no if port_no else self._allocate_set_id()
@@ -143,6 +200,34 @@ class Devices:
         assert self.contains(device), "Device %s not found." % device
         del self._devices[device.mac]
         self._set_ids.remove(device.set_id)
+        self._index_remove('port', device.port, device)
+        self._index_remove('gateway', device.gateway, device)
+        self._index_remove('group', device.group, device)
+        self._triggered.pop(device.mac, None)
+        device._registry = None  # pylint: disable=protected-access
+
+    def _index_add(self, field, key, device):
+        self._indexes[field].setdefault(key, {})[device.mac] = device
+
+    def _index_remove(self, field, key, device):
+        entries = self._indexes[field].get(key)
+        if entries is not None:
+            entries.pop(device.mac, None)
+            if not entries:
+                del self._indexes[field][key]
+
+    def reindex(self, device, field, previous, value):
+        """Update indexes for a changed device field"""
+        if not self.contains(device):
+            return
+        if field == 'host':
+            if value:
+                self._triggered[device.mac] = device
+            else:
+                self._triggered.pop(device.mac, None)
+            return
+        self._index_remove(field, previous, device)
+        self._index_add(field, value, device)
 
     def get(self, device_mac):
         """Get a device using its mac address"""
@@ -150,18 +235,15 @@ class Devices:
 
     def get_by_port_info(self, port):
         """Get a device using its port info object"""
-        for device in self._devices.values():
-            if device.port == port:
-                return device
-        return None
+        return next(iter(self._indexes['port'].get(port, {}).values()), None)
 
     def get_by_gateway(self, gateway):
         """Get devices under specified gateway"""
-        return [device for device in self._devices.values() if device.gateway == gateway]
+        return list(self._indexes['gateway'].get(gateway, {}).values())
 
     def get_by_group(self, group_name):
         """Get devices under a group name"""
-        return [device for device in self._devices.values() if device.group == group_name]
+        return list(self._indexes['group'].get(group_name, {}).values())
 
     def get_all_devices(self):
         """Get all devices"""
@@ -169,7 +251,11 @@ class Devices:
 
     def get_triggered_devices(self):
         """Get devices with hosts"""
-        return [device for device in self._devices.values() if device.host]
+        return list(self._triggered.values())
+
+    def count_triggered(self):
+        """Get the number of devices with hosts"""
+        return len(self._triggered)
 
     def contains(self, device):
         """Returns true if the device is expected"""
@@ -182,6 +268,7 @@ class DAQRunner:
     class owns the main event loop and shards out work to subclasses."""
 
     _DEFAULT_MAX_GATEWAYS = 9
+    _HEARTBEAT_SEC = 1
     _DEFAULT_RETENTION_DAYS = 30
     _SITE_CONFIG = 'site_config.json'
     _RUNNER_CONFIG_PATH = 'runner/setup'
@@ -221,6 +308,7 @@ class DAQRunner:
         self.fail_mode = config.get('fail_mode', False)
         self._run_tests = True
         self.stream_monitor = None
+        self.async_loop = config.get('async_loop', False)
         self.exception = None
         self._run_count = 0
         self._run_limit = int(config.get('run_limit', 0))
@@ -230,10 +318,9 @@ class DAQRunner:
         self._device_result_handler = self._init_device_result_handler()
         self._cleanup_previous_runs()
         self._init_test_list()
-        self._max_hosts = self.run_trigger.get('max_hosts') or float('inf')
-        self._target_set_queue = []
         self._one_test_started = False
         self._auto_session = config.get('run_trigger', {}).get('auto_session')
+        self._init_scaling()
 
         LOGGER.info('DAQ RUN id: %s', self.daq_run_id)
         tests_string = ', '.join(config['test_list']) or '**none**'
@@ -242,8 +329,22 @@ class DAQRunner:
         LOGGER.info('LSB release %s', self._lsb_release)
         LOGGER.info('system uname %s', self._sys_uname)
 
+    def _init_scaling(self):
+        self._max_hosts = self.run_trigger.get('max_hosts') or float('inf')
+        self._target_set_queue = target_queue.TargetSetQueue(
+            self.run_trigger.get('queue_priority'), group_func=self.network.device_group_for)
+        init_workers = self.run_trigger.get('gateway_init_workers')
+        self._gateway_initializer = gateway_pool.GatewayInitializer(
+            init_workers, self.queue_callback) if init_workers else None
+        self._gateway_waiting = {}
+        pool_size = self.run_trigger.get('gateway_pool_size')
+        self._gateway_pool = gateway_pool.GatewayPool(pool_size) if pool_size else None
+        report_workers = self.config.get('report_workers')
+        self.report_renderer = report_renderer.ReportRenderer(
+            report_workers) if report_workers else None
+
     def _init_cloud(self):
-        self.gcp = gcp.GcpManager(self.config, self._queue_callback)
+        self.gcp = gcp.GcpManager(self.config, self.queue_callback)
         logging_client = self.gcp.get_logging_client()
         if logging_client:
             logger.set_stackdriver_client(logging_client,
@@ -335,6 +436,9 @@ class DAQRunner:
             'name': 'status',
             'states': self._get_states(),
             'ports': self._get_active_ports(),
+            'queue': self._target_set_queue.get_stats(),
+            'gateway_pool': self._gateway_pool.get_stats() if self._gateway_pool else None,
+            'debounce': self.faucet_events.get_debounce_stats() if self.faucet_events else None,
             'description': self.description,
             'timestamp': time.time()
         }
@@ -385,12 +489,22 @@ class DAQRunner:
         LOGGER.debug('Done with initialization')
 
     def _create_stream_monitor(self):
-        return stream_monitor.StreamMonitor(idle_handler=self._handle_system_idle,
-                                            loop_hook=self._loop_hook,
-                                            timeout_sec=20)  # Polling rate
+        monitor_class = (async_monitor.AsyncStreamMonitor if self.async_loop
+                         else stream_monitor.StreamMonitor)
+        LOGGER.info('Using %s event loop', monitor_class.__name__)
+        return monitor_class(idle_handler=self._handle_system_idle,
+                             loop_hook=self._loop_hook,
+                             timeout_sec=20)  # Polling rate
 
     def cleanup(self):
         """Cleanup instance"""
+        if self._gateway_initializer:
+            self._gateway_initializer.shutdown()
+        if self.report_renderer:
+            LOGGER.info('Waiting for report rendering...')
+            self.report_renderer.shutdown()
+            # Upload the reports whose rendering finished after the main loop exited.
+            self._handle_queued_events()
         try:
             LOGGER.info('Stopping network...')
             self.network.stop()
@@ -541,9 +655,12 @@ class DAQRunner:
         if device.gateway:
             self._direct_device_traffic(device)
 
-    def _queue_callback(self, callback):
+    def queue_callback(self, callback):
+        """Queue a callback to be run on the main loop thread"""
         with self._event_lock:
             self._callback_queue.append(callback)
+        if self.stream_monitor:
+            self.stream_monitor.wakeup()
 
     def _handle_queued_events(self):
         with self._event_lock:
@@ -577,8 +694,10 @@ class DAQRunner:
             self._target_set_trigger(device)
             all_idle = False
         self._target_set_consider()
+        self._fill_gateway_pool()
 
-        active_tests = bool(self._devices.get_triggered_devices() or self._target_set_queue)
+        active_tests = bool(self._devices.get_triggered_devices() or self._target_set_queue or
+                            self._gateway_waiting)
         more_testing = self._run_tests and not (self._single_shot and self._one_test_started)
         if not active_tests and not more_testing:
             if self.faucet_events and not self._linger_exit:
@@ -613,16 +732,48 @@ class DAQRunner:
             self.faucet_events = None
         count = self.stream_monitor.log_monitors(as_info=True)
         LOGGER.warning('No active ports remaining (%d monitors), ending test run.', count)
+        LOGGER.info('Stream monitor stats: %s', self.stream_monitor.get_stats())
+        LOGGER.info('Target set queue stats: %s', self._target_set_queue.get_stats())
         self._send_heartbeat()
 
     def _loop_hook(self):
         self._handle_queued_events()
+        self._flush_network_config()
+        self._flush_gateway_commands()
+        self._schedule_port_debounce()
         states = {device.mac: device.host.state for device in self._devices.get_triggered_devices()}
         LOGGER.debug('Active target sets/state: %s', states)
 
+    def _flush_network_config(self):
+        pending_sec = self.network.flush_behavioral_config()
+        if pending_sec is not None:
+            self.stream_monitor.request_wakeup(pending_sec)
+
+    def _schedule_port_debounce(self):
+        debounce_sec = self.faucet_events.next_debounce_sec() if self.faucet_events else None
+        if debounce_sec is not None:
+            self.stream_monitor.request_wakeup(debounce_sec)
+
+    def _flush_gateway_commands(self):
+        # Changes queued for devices in the same group go out as one gateway batch.
+        gateways = {device.gateway for device in self._devices.get_triggered_devices()}
+        gateways.add(self._native_gateway)
+        for gateway in gateways:
+            if not gateway:
+                continue
+            try:
+                gateway.flush_commands()
+            except Exception as e:
+                LOGGER.error('Gateway %s command flush error: %s', gateway, e)
+                LOGGER.exception(e)
+
     def _terminate(self):
         for device in self._devices.get_triggered_devices():
             self.target_set_error(device, DaqException('terminated'))
+        if self._gateway_pool:
+            for gateway in self._gateway_pool.drain():
+                gateway.terminate()
+                self.gateway_sets.add(gateway.port_set)
         if self._device_result_handler:
             self._device_result_handler.stop()
             if self._auto_session:
@@ -639,9 +790,12 @@ class DAQRunner:
             self._monitor_faucet_events()
             LOGGER.info('Entering main event loop.')
             LOGGER.info('See docs/troubleshooting.md if this blocks for more than a few minutes.')
-            while self.stream_monitor.event_loop():
-                self._reap_stale_ports()
-                self._module_heartbeat()
+            if self.async_loop:
+                self._async_main_loop()
+            else:
+                while self.stream_monitor.event_loop():
+                    self._reap_stale_ports()
+                    self._module_heartbeat()
         except Exception as e:
             LOGGER.error('Event loop exception: %s', e)
             LOGGER.exception(e)
@@ -657,10 +811,24 @@ class DAQRunner:
 
         self._terminate()
 
+    def _async_main_loop(self):
+        self.stream_monitor.add_timer('reap', self._HEARTBEAT_SEC, self._reap_stale_ports)
+        self.stream_monitor.add_timer('heartbeat', self._HEARTBEAT_SEC, self._module_heartbeat)
+        self.stream_monitor.run()
+
+    def spawn_task(self, coro, name=None):
+        """Run a coroutine in the background on the asyncio event loop"""
+        assert self.async_loop, 'background tasks require async_loop'
+        return self.stream_monitor.spawn(coro, name)
+
+    def _target_set_full(self):
+        active = self._devices.count_triggered() + len(self._gateway_waiting)
+        return active >= self._max_hosts
+
     def _target_set_has_capacity(self, device):
-        num_triggered = len(self._devices.get_triggered_devices())
         existing = self._get_existing_gateway(device)
-        return num_triggered < self._max_hosts and (existing or self.gateway_sets)
+        pooled = self._gateway_pool and len(self._gateway_pool)
+        return not self._target_set_full() and (existing or self.gateway_sets or pooled)
 
     def _should_trigger_device(self, device, remote_trigger):
         if device.host:
@@ -675,6 +843,10 @@ class DAQRunner:
             LOGGER.debug('Target device %s already queued', device)
             return False
 
+        if device.mac in self._gateway_waiting:
+            LOGGER.debug('Target device %s waiting for gateway', device)
+            return False
+
         if device.should_block():
             LOGGER.debug('Target device %s block suppress', device)
             return False
@@ -701,21 +873,18 @@ class DAQRunner:
             LOGGER.info('Target device %s direct activate', device)
             self._target_set_activate(device)
         else:
-            self._target_set_queue.append(device)
+            self._target_set_queue.push(device)
             LOGGER.info('Target device %s queing activate (%s)',
                         device, len(self._target_set_queue))
 
     def _target_set_consider(self):
         if self._target_set_queue:
-            for num, device in enumerate(self._target_set_queue):
-                if self._target_set_has_capacity(device):
-                    LOGGER.info('Target device %s pop activate (%s)',
-                                device, len(self._target_set_queue))
-                    self._target_set_activate(device)
-                    self._target_set_queue.pop(num)
-                    break
+            self._target_set_queue.admit(self._target_set_has_capacity,
+                                         self._target_set_activate,
+                                         is_full=self._target_set_full)
 
     def _target_set_activate(self, device):
+        self._target_set_queue.record_activation(device)
         external_dhcp = device.dhcp_mode == DhcpMode.EXTERNAL
 
         port_trigger = device.is_local()
@@ -730,13 +899,43 @@ class DAQRunner:
                 LOGGER.warning('Target device %s trigger ignored b/c activated gateway', device)
                 return False
         except Exception as e:
-            LOGGER.error('Target device %s target trigger error %s', device, str(e))
-            LOGGER.exception(e)
-            if self.fail_mode:
-                LOGGER.warning('Suppressing further tests due to failure.')
-                self._run_tests = False
+            self._target_trigger_error(device, e)
             return False
 
+        if self._gateway_initializer and self._gateway_initializer.is_pending(gateway):
+            LOGGER.info('Target device %s waiting for %s', device, gateway)
+            self._gateway_waiting[device.mac] = device
+            self._gateway_initializer.when_ready(gateway, partial(self._gateway_ready, device))
+            return True
+
+        return self._target_set_start(device, gateway)
+
+    def _target_trigger_error(self, device, exception):
+        LOGGER.error('Target device %s target trigger error %s', device, str(exception))
+        LOGGER.exception(exception)
+        if self.fail_mode:
+            LOGGER.warning('Suppressing further tests due to failure.')
+            self._run_tests = False
+
+    def _gateway_ready(self, device, gateway, exception):
+        self._gateway_waiting.pop(device.mac, None)
+        if exception:
+            self._target_trigger_error(device, exception)
+            device.gateway = None
+            if device.vlan:
+                self._direct_device_traffic(device)
+            return
+        if device.is_local() and not device.port.active and not device.port.flapping_start:
+            # Port went down while waiting, so let the port flap timeout deal with it.
+            LOGGER.info('Target device %s port inactive after gateway wait', device)
+            device.port.flapping_start = time.time()
+        self._target_set_start(device, gateway)
+
+    def _target_set_start(self, device, gateway):
+        external_dhcp = device.dhcp_mode == DhcpMode.EXTERNAL
+        port_trigger = device.is_local()
+        group_name = device.group
+
         # Stops all DHCP response initially
         # Selectively enables dhcp response at ipaddr stage based on dhcp mode
         if not external_dhcp:
@@ -750,6 +949,8 @@ class DAQRunner:
             new_host.register_dhcp_ready_listener(self._dhcp_ready_listener)
             new_host.initialize()
 
+            # The dhcp response stop has to reach the gateway before the device traffic.
+            gateway.flush_commands()
             if port_trigger:
                 target = {
                     'port': device.port.port_no,
@@ -829,7 +1030,8 @@ class DAQRunner:
                 assert module not in metadata, "Duplicate module definition for %s" % module
                 metadata[module] = {
                     "startup_cmd": metadatum["startup_cmd"],
-                    "basedir": meta_file.parent
+                    "basedir": meta_file.parent,
+                    "parallel": metadatum.get("parallel", False)
                 }
         return metadata
 
@@ -858,6 +1060,12 @@ class DAQRunner:
                 device.gateway = existing
             return existing
         group_name = 'native' if is_native else device.group
+        use_pool = not is_native and device.dhcp_mode != DhcpMode.EXTERNAL
+        pooled = self._take_pooled_gateway(group_name) if use_pool else None
+        if pooled:
+            device.gateway = pooled
+            self._direct_device_traffic(device)
+            return pooled
         set_num = 1 if is_native else self._find_gateway_set(device)
         LOGGER.info('Gateway for device group %s not found, creating set num %d',
                     group_name, set_num)
@@ -883,7 +1091,10 @@ class DAQRunner:
             if device:
                 device.gateway = gateway
                 self._direct_device_traffic(device)
-            gateway.initialize()
+            if self._gateway_initializer and not is_native:
+                self._gateway_initializer.start(gateway, self._gateway_initialized)
+            else:
+                gateway.initialize()
             if is_native and str(gateway.host.switch_intf) != network.NATIVE_GATEWAY_INTF:
                 assert False, 'iface mismatch'
         except Exception:
@@ -898,6 +1109,66 @@ class DAQRunner:
 
         return gateway
 
+    def _gateway_initialized(self, gateway, exception):
+        if exception:
+            LOGGER.error('Cleaning up from failed background initialization of %s', gateway)
+            if self._gateway_pool:
+                self._gateway_pool.discard(gateway)
+            self.gateway_sets.add(gateway.port_set)
+
+    def _take_pooled_gateway(self, group_name):
+        if not self._gateway_pool:
+            return None
+        gateway = self._gateway_pool.take()
+        if gateway:
+            LOGGER.info('Using pooled %s for device group %s', gateway, group_name)
+            gateway.name = group_name
+        return gateway
+
+    def _fill_gateway_pool(self):
+        if not self._gateway_pool or not self._run_tests or not self.faucet_events:
+            return
+        # Without background workers this blocks, so only add one gateway per idle pass.
+        while self._gateway_pool.needs_fill() and self.gateway_sets:
+            set_num = self.gateway_sets.pop()
+            gateway = container_gateway.ContainerGateway(self, 'pool', set_num)
+            try:
+                if self._gateway_initializer:
+                    self._gateway_initializer.start(gateway, self._gateway_initialized)
+                else:
+                    gateway.initialize()
+            except Exception as e:
+                LOGGER.error('Pool gateway set %d initialization failed: %s', set_num, e)
+                self.gateway_sets.add(set_num)
+                return
+            self._gateway_pool.add(gateway)
+            if not self._gateway_initializer:
+                return
+
+    def _recycle_gateway(self, gateway):
+        pool = self._gateway_pool
+        if not pool or not pool.needs_fill() or gateway.result_linger:
+            return False
+        if not gateway.recyclable():
+            return False
+        try:
+            gateway.recycle('pool')
+        except Exception as e:
+            LOGGER.error('Recycling %s failed: %s', gateway, e)
+            return False
+        pool.add(gateway, recycled=True)
+        return True
+
+    def _release_pooled_gateway(self):
+        gateway = self._gateway_pool.take() if self._gateway_pool else None
+        if gateway and self._gateway_initializer and self._gateway_initializer.is_pending(gateway):
+            self._gateway_pool.add(gateway)
+            return
+        if gateway:
+            LOGGER.info('Releasing pooled %s', gateway)
+            gateway.terminate()
+            self.gateway_sets.add(gateway.port_set)
+
     def ip_notify(self, state, target, gateway, exception=None):
         """Handle a DHCP / Static IP notification"""
         if exception:
@@ -1009,6 +1280,9 @@ class DAQRunner:
             self.target_set_error(device, DaqException('terminated'))
 
     def _find_gateway_set(self, device):
+        if not self.gateway_sets:
+            # Sets held by idle pooled gateways can't be used for other gateway types.
+            self._release_pooled_gateway()
         if not self.gateway_sets:
             raise Exception('Could not allocate open gateway set')
         if device.port.port_no in self.gateway_sets:
@@ -1019,20 +1293,7 @@ class DAQRunner:
     @staticmethod
     def ping_test(src, dst, src_addr=None, count=2):
         """Test ping between hosts"""
-        dst_name = dst if isinstance(dst, str) else dst.name
-        dst_ip = dst if isinstance(dst, str) else dst.IP()
-        from_msg = ' from %s' % src_addr if src_addr else ''
-        LOGGER.info('Test ping %s->%s%s', src.name, dst_name, from_msg)
-        failure = "ping FAILED"
-        assert dst_ip != "0.0.0.0", "IP address not assigned, can't ping"
-        ping_opt = '-I %s' % src_addr if src_addr else ''
-        try:
-            output = src.cmd('ping -c', count, ping_opt, dst_ip,
-                             '> /dev/null 2>&1 || echo ', failure)
-            return output.strip() != failure
-        except Exception as e:
-            LOGGER.info('Test ping failure: %s', e)
-            return False
+        return ping_helper.ping_test(src, dst, src_addr=src_addr, count=count)
 
     def target_set_error(self, device, exception):
         """Handle an error in the target set"""
@@ -1090,8 +1351,7 @@ class DAQRunner:
         self._handle_faucet_events()
 
     def _target_set_cancel(self, device):
-        if device in self._target_set_queue:
-            self._target_set_queue.remove(device)
+        self._target_set_queue.remove(device)
         target_host = device.host
         if not target_host:
             return
@@ -1122,8 +1382,9 @@ class DAQRunner:
             return
         if not target_gateway.detach_target(device):
             LOGGER.info('Retiring %s. Last device: %s', target_gateway, device)
-            target_gateway.terminate()
-            self.gateway_sets.add(target_gateway.port_set)
+            if not self._recycle_gateway(target_gateway):
+                target_gateway.terminate()
+                self.gateway_sets.add(target_gateway.port_set)
 
         device.gateway = None
         if device.vlan:
@@ -1,23 +1,135 @@
 """Utility class to monitor a bunch of input streams and trigger events"""
 
 import fcntl
+import logging
 import os
 import select
+import time
 
 import logger
 
 LOGGER = logger.get_logger('stream')
 
+
+class _Poller:
+    """Thin wrapper around epoll (when available) or poll with a common interface"""
+
+    def __init__(self):
+        self._epoll = select.epoll() if hasattr(select, 'epoll') else None
+        self._poll = None if self._epoll else select.poll()
+
+    def register(self, fd, events):
+        """Register an fd for the given event mask"""
+        if self._epoll:
+            self._epoll.register(fd, events)
+        else:
+            self._poll.register(fd, events)
+
+    def unregister(self, fd):
+        """Unregister an fd"""
+        if self._epoll:
+            self._epoll.unregister(fd)
+        else:
+            self._poll.unregister(fd)
+
+    def fileno(self):
+        """Return the epoll descriptor, for nesting inside another event loop"""
+        assert self._epoll, 'fileno requires epoll support'
+        return self._epoll.fileno()
+
+    def poll(self, timeout_sec=None):
+        """Poll for events, returning a list of (fd, event) tuples"""
+        if self._epoll:
+            return self._epoll.poll(-1 if timeout_sec is None else timeout_sec)
+        return self._poll.poll(None if timeout_sec is None else timeout_sec * 1e3)
+
+
+class _StreamCopier:
+    """Copy raw bytes from a non-blocking source fd to a sink, with batched flushing"""
+
+    _CHUNK_SIZE = 2**16
+    _MAX_CHUNKS = 16
+    _FLUSH_SEC = 1
+
+    def __init__(self, source_fd, data_sink):
+        self.source_fd = source_fd
+        # Text sinks are bypassed in favor of their underlying binary buffer.
+        if hasattr(data_sink, 'buffer'):
+            data_sink.flush()
+            data_sink = data_sink.buffer
+        self._sink = data_sink
+        self._sink_fd = data_sink.fileno() if hasattr(data_sink, 'fileno') else None
+        self._splice = hasattr(os, 'splice') and self._sink_fd is not None
+        self._buffer = None if self._splice else bytearray(self._CHUNK_SIZE)
+        self._dirty = False
+        self._last_flush = time.monotonic()
+        self.total_bytes = 0
+
+    def copy(self):
+        """Drain available data from the source, returning the number of bytes copied"""
+        copied = 0
+        for _ in range(self._MAX_CHUNKS):
+            try:
+                count = self._splice_chunk() if self._splice else self._copy_chunk()
+            except BlockingIOError:
+                break
+            if not count:
+                break
+            copied += count
+        self.total_bytes += copied
+        self.maybe_flush()
+        return copied
+
+    def _splice_chunk(self):
+        # Anything already buffered in the sink must land before the spliced bytes.
+        self._sink.flush()
+        return os.splice(self.source_fd, self._sink_fd, self._CHUNK_SIZE)
+
+    def _copy_chunk(self):
+        count = os.readv(self.source_fd, [self._buffer])
+        if count:
+            self._sink.write(memoryview(self._buffer)[:count])
+            self._dirty = True
+        return count
+
+    def maybe_flush(self, force=False):
+        """Flush the sink if there is unflushed data and the flush interval has passed"""
+        now = time.monotonic()
+        if self._dirty and (force or now - self._last_flush >= self._FLUSH_SEC):
+            if not self._sink.closed:
+                self._sink.flush()
+            self._dirty = False
+            self._last_flush = now
+
+
 class StreamMonitor:
     """Monitor set of stream objects"""
 
+    # Level-triggered on purpose: callbacks like TcpdumpHelper.next_line only consume
+    # part of the available data, so edge-triggered would strand buffered input.
+    _EVENT_MASK = select.POLLHUP | select.POLLIN
+
     def __init__(self, timeout_sec=None, idle_handler=None, loop_hook=None):
         self.timeout_sec = timeout_sec
         self.idle_handler = idle_handler
         self.loop_hook = loop_hook
-        self.poller = select.poll()
+        self.poller = _Poller()
         self.callbacks = {}
         self.fd_priority = {}
+        self._copiers = {}
+        self._priority_counts = {}
+        self._priorities = []
+        self._wakeup = None
+        # Self-pipe so other threads can interrupt a blocking poll, see wakeup().
+        self._wake_fd, self._wake_write_fd = os.pipe()
+        os.set_blocking(self._wake_fd, False)
+        os.set_blocking(self._wake_write_fd, False)
+        self.poller.register(self._wake_fd, select.POLLIN)
+        self._stats_start = time.monotonic()
+        self._loop_count = 0
+        self._callback_count = 0
+        self._callback_sec = 0
+        self._callback_max_sec = 0
 
     def get_fd(self, target):
         """Return the fd from a stream object, or fd directly"""
@@ -32,20 +144,38 @@ class StreamMonitor:
         if copy_to:
             assert not callback, 'Both callback and copy_to set'
             self.make_nonblock(desc)
-            callback = lambda: self.copy_data(name, desc, copy_to)
+            copier = _StreamCopier(fd, copy_to)
+            self._copiers[fd] = copier
+            callback = lambda: self.copy_data(name, copier)
         LOGGER.debug('Monitoring start %s fd %d', name, fd)
         self.callbacks[fd] = (name, callback, hangup, error, desc)
-        self.fd_priority[fd] = priority
-        self.poller.register(fd, select.POLLHUP | select.POLLIN)
+        self._set_priority(fd, priority)
+        self.poller.register(fd, self._EVENT_MASK)
         self.log_monitors()
 
-    def copy_data(self, name, data_source, data_sink):
+    def _set_priority(self, fd, priority):
+        self.fd_priority[fd] = priority
+        count = self._priority_counts.get(priority, 0)
+        self._priority_counts[priority] = count + 1
+        if not count:
+            self._priorities = sorted(self._priority_counts, reverse=True)
+
+    def _clear_priority(self, fd):
+        priority = self.fd_priority.pop(fd)
+        self._priority_counts[priority] -= 1
+        if not self._priority_counts[priority]:
+            del self._priority_counts[priority]
+            self._priorities = sorted(self._priority_counts, reverse=True)
+
+    def copy_data(self, name, copier):
         """Function to just copy data to a given sink"""
-        LOGGER.debug('Monitoring copying data for %s from fd %d to fd %d',
-                     name, self.get_fd(data_source), self.get_fd(data_sink))
-        data = data_source.read(1024)
-        data_sink.write(data.decode('utf-8'))
-        data_sink.flush()
+        count = copier.copy()
+        LOGGER.debug('Monitoring copied %d bytes for %s from fd %d',
+                     count, name, copier.source_fd)
+
+    def _flush_copies(self, force=False):
+        for copier in self._copiers.values():
+            copier.maybe_flush(force=force)
 
     def make_nonblock(self, data_source):
         """Make the given source non-blocking"""
@@ -60,28 +190,59 @@ class StreamMonitor:
         assert fd in self.callbacks, 'Missing descriptor fd %d' % fd
         LOGGER.debug('Monitoring forget fd %d', fd)
         del self.callbacks[fd]
-        self.poller.unregister(fd)
+        self._clear_priority(fd)
+        copier = self._copiers.pop(fd, None)
+        if copier:
+            copier.maybe_flush(force=True)
+        try:
+            self.poller.unregister(fd)
+        except (OSError, KeyError) as e:
+            # epoll drops closed descriptors on its own, so this is benign.
+            LOGGER.debug('Monitoring unregister fd %d: %s', fd, e)
         self.log_monitors()
 
     def log_monitors(self, as_info=False):
         """Log all active monitors"""
-        log_str = ''
-        count = 0
-        for fd in self.callbacks:
-            name = self.callbacks[fd][0]
-            log_str = log_str + ', %s fd %d' % (name, fd)
-            count += 1
+        count = len(self.callbacks)
+        level = logging.INFO if as_info else logging.DEBUG
+        if LOGGER.isEnabledFor(level):
+            log_str = ', '.join('%s fd %d' % (callback[0], fd)
+                                for fd, callback in self.callbacks.items())
+            LOGGER.log(level, 'Monitoring %d fds %s', count, log_str)
+        return count
 
-        log_func = LOGGER.info if as_info else LOGGER.debug
-        log_func('Monitoring %d fds %s', count, log_str[2:])
+    def get_stats(self, reset=False):
+        """Return loop and callback counters accumulated since the last reset"""
+        elapsed = max(time.monotonic() - self._stats_start, 1e-6)
+        count = self._callback_count
+        stats = {
+            'monitors': len(self.callbacks),
+            'loops': self._loop_count,
+            'loops_per_sec': self._loop_count / elapsed,
+            'callbacks': count,
+            'callback_avg_ms': self._callback_sec / count * 1e3 if count else 0,
+            'callback_max_ms': self._callback_max_sec * 1e3
+        }
+        if reset:
+            self._stats_start = time.monotonic()
+            self._loop_count = 0
+            self._callback_count = 0
+            self._callback_sec = 0
+            self._callback_max_sec = 0
+        return stats
 
-        return count
+    def _record_latency(self, start):
+        delta = time.monotonic() - start
+        self._callback_count += 1
+        self._callback_sec += delta
+        self._callback_max_sec = max(self._callback_max_sec, delta)
 
     def trigger_callback(self, fd):
         """Trigger a data callback for the given fd"""
         name = self.callbacks[fd][0]
         callback = self.callbacks[fd][1]
         on_error = self.callbacks[fd][3]
+        start = time.monotonic()
         try:
             if callback:
                 LOGGER.debug('Monitoring callback fd %d (%s) start', fd, name)
@@ -93,15 +254,18 @@ class StreamMonitor:
         except Exception as e:
             LOGGER.error('Monitoring callback exception (%s): %s', name, str(e))
             self.error_handler(e, name, on_error)
+        self._record_latency(start)
 
     def trigger_hangup(self, fd, event):
         """Trigger hangup callback for the given fd"""
         name = self.callbacks[fd][0]
         callback = self.callbacks[fd][2]
         on_error = self.callbacks[fd][3]
-        self.callbacks[fd][4].close()
+        desc = self.callbacks[fd][4]
+        start = time.monotonic()
         try:
             self.forget(fd)
+            desc.close()
             if callback:
                 LOGGER.debug('Monitoring hangup because %d (%s)', event, name)
                 callback()
@@ -111,6 +275,7 @@ class StreamMonitor:
         except Exception as e:
             LOGGER.error('Monitoring hangup exception (%s): %s', name, str(e))
             self.error_handler(e, name, on_error)
+        self._record_latency(start)
 
     def error_handler(self, e, name, handler):
         """Call given error handler"""
@@ -136,9 +301,20 @@ class StreamMonitor:
         else:
             assert False, "Unknown event type %d on fd %d" % (event, fd)
 
-    def event_loop(self):
-        """Main event loop. Returns True if there are active streams to monitor."""
-        fds = self.poller.poll(0)
+    def _bucket_ready(self, fds):
+        buckets = {priority: [] for priority in self._priorities}
+        for fd, event in fds:
+            if fd == self._wake_fd:
+                self._drain_wakeup()
+                continue
+            priority = self.fd_priority.get(fd)
+            if priority is not None:
+                buckets[priority].append((fd, event))
+        return buckets
+
+    def run_hooks(self, fds):
+        """Run the idle handler (if nothing is ready) and loop hook. Returns False if
+        the idle handler removed all monitored streams."""
         try:
             if not fds and self.idle_handler:
                 self.idle_handler()
@@ -150,11 +326,51 @@ class StreamMonitor:
         except Exception as e:
             LOGGER.error('Monitoring exception in callback: %s', e)
             LOGGER.exception(e)
-        self.log_monitors()
-        fds = self.poller.poll(self.timeout_sec * 10e3 if self.timeout_sec else None)
+        self._flush_copies()
+        return True
+
+    def request_wakeup(self, delay_sec):
+        """Make sure the loop hook runs again within delay_sec, even with no fd activity"""
+        wakeup = time.monotonic() + delay_sec
+        if self._wakeup is None or wakeup < self._wakeup:
+            self._wakeup = wakeup
+
+    def wakeup(self):
+        """Interrupt a blocking poll from another thread, so the loop hook runs promptly"""
+        try:
+            os.write(self._wake_write_fd, b'\0')
+        except BlockingIOError:
+            pass  # Pipe is full, so a wakeup is already pending.
+
+    def _drain_wakeup(self):
+        try:
+            while os.read(self._wake_fd, 1024):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _poll_timeout(self):
+        if self._wakeup is None:
+            return self.timeout_sec
+        remaining = max(self._wakeup - time.monotonic(), 0)
+        return remaining if self.timeout_sec is None else min(remaining, self.timeout_sec)
+
+    def dispatch(self, fds):
+        """Dispatch a set of poll results in priority order"""
         LOGGER.debug('Monitoring found fds %s', fds)
         if fds:
-            for fd, event in sorted(fds, key=lambda f: -self.fd_priority[f[0]]):
-                if fd in self.callbacks: # Monitoring set could be modified
-                    self.process_poll_result(event, fd)
+            buckets = self._bucket_ready(fds)
+            for priority in list(buckets):
+                for fd, event in buckets[priority]:
+                    if fd in self.callbacks:  # Monitoring set could be modified
+                        self.process_poll_result(event, fd)
+
+    def event_loop(self):
+        """Main event loop. Returns True if there are active streams to monitor."""
+        self._loop_count += 1
+        if not self.run_hooks(self.poller.poll(0)):
+            return False
+        fds = self.poller.poll(self._poll_timeout())
+        self._wakeup = None
+        self.dispatch(fds)
         return len(self.callbacks) > 0
@@ -0,0 +1,127 @@
+"""Priority queue of devices waiting for an available target set"""
+
+import collections
+import heapq
+import itertools
+import time
+
+import logger
+
+LOGGER = logger.get_logger('queue')
+
+
+class TargetSetQueue:
+    """Heap ordered queue of devices waiting for activation, with wait time metrics.
+
+    Supported priorities are:
+      first_seen: order in which devices were queued (the default)
+      group: keep devices of the same group together, so they share a gateway
+      port: lowest switch port first
+      retry: devices with the fewest previous activations first
+
+    Activation counts are kept for the most recently activated max_history devices.
+    """
+
+    PRIORITIES = ('first_seen', 'group', 'port', 'retry')
+
+    def __init__(self, priority=None, group_func=None, max_history=1024):
+        self.priority = priority or 'first_seen'
+        assert self.priority in self.PRIORITIES, 'unknown queue priority %s' % self.priority
+        self._group_func = group_func
+        self._heap = []
+        self._entries = {}
+        self._counter = itertools.count()
+        self._activations = collections.OrderedDict()
+        self._max_history = max_history
+        self._admitted = 0
+        self._wait_sec = 0
+        self._wait_max_sec = 0
+
+    def _priority_key(self, device):
+        first_seen = next(self._counter)
+        if self.priority == 'group':
+            group = self._group_func(device) if self._group_func else device.group
+            return (group or '', first_seen)
+        if self.priority == 'port':
+            port_no = device.port.port_no if device.port else None
+            return (port_no if port_no is not None else float('inf'), first_seen)
+        if self.priority == 'retry':
+            return (self._activations.get(device.mac, 0), first_seen)
+        return (first_seen,)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, device):
+        entry = self._entries.get(device.mac)
+        return bool(entry) and entry[-1] is device
+
+    def push(self, device):
+        """Add a device to the queue"""
+        assert device.mac not in self._entries, 'device %s already queued' % device
+        entry = [self._priority_key(device), next(self._counter), time.monotonic(), device]
+        self._entries[device.mac] = entry
+        heapq.heappush(self._heap, entry)
+
+    def remove(self, device):
+        """Remove a device from the queue, returning True if it was queued"""
+        if device not in self:
+            return False
+        # Lazy deletion: the heap entry is skipped when it reaches the top.
+        self._entries.pop(device.mac)[-1] = None
+        return True
+
+    def record_activation(self, device):
+        """Note a device activation, for retry ordering"""
+        self._activations[device.mac] = self._activations.pop(device.mac, 0) + 1
+        while len(self._activations) > self._max_history:
+            self._activations.popitem(last=False)
+
+    def _pop(self):
+        while self._heap:
+            entry = heapq.heappop(self._heap)
+            if entry[-1] is not None:
+                del self._entries[entry[-1].mac]
+                return entry
+        return None
+
+    def admit(self, has_capacity, activate, is_full=None):
+        """Activate queued devices in priority order for as long as there is capacity.
+        Devices without capacity stay queued in place. Returns the number admitted."""
+        admitted = 0
+        deferred = []
+        try:
+            while not (is_full and is_full()):
+                entry = self._pop()
+                if not entry:
+                    break
+                device = entry[-1]
+                if not has_capacity(device):
+                    deferred.append(entry)
+                    continue
+                wait_sec = time.monotonic() - entry[2]
+                LOGGER.info('Target device %s pop activate after %.1fs (%s)',
+                            device, wait_sec, len(self._entries) + len(deferred))
+                self._admitted += 1
+                self._wait_sec += wait_sec
+                self._wait_max_sec = max(self._wait_max_sec, wait_sec)
+                admitted += 1
+                activate(device)
+        finally:
+            for entry in deferred:
+                self._entries[entry[-1].mac] = entry
+                heapq.heappush(self._heap, entry)
+        return admitted
+
+    def get_stats(self):
+        """Return queue depth and wait time metrics"""
+        now = time.monotonic()
+        oldest = min((entry[2] for entry in self._entries.values()), default=now)
+        return {
+            'priority': self.priority,
+            'depth': len(self._entries),
+            'admitted': self._admitted,
+            'wait_avg_sec': self._wait_sec / self._admitted if self._admitted else 0,
+            'wait_max_sec': self._wait_max_sec,
+            'oldest_wait_sec': now - oldest
+        }
@@ -2,10 +2,13 @@
 
 from __future__ import absolute_import
 
+import codecs
+import collections
 import errno
 import fcntl
 import os
 import re
+import select
 import subprocess
 import threading
 import logger
@@ -34,6 +37,7 @@ class TcpdumpHelper:
     readbuf = None
     blocking = True
     terminate_retries = 10
+    read_size = 2**16
 
     # pylint: disable=too-many-arguments
     def __init__(self, tcpdump_host, tcpdump_filter, funcs=None,
@@ -72,7 +76,11 @@ class TcpdumpHelper:
             LOGGER.debug('tcpdump_helper stream fd %s %s' % (
                 self.stream().fileno(), self.intf_name))
 
-        self.readbuf = ''
+        self.readbuf = bytearray(self.read_size)
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._lines = collections.deque()
+        self._partial = []
+        self._eof = False
         self.set_blocking(blocking)
 
     def stream(self):
@@ -138,26 +146,64 @@ class TcpdumpHelper:
                 self.pipe.stdout.fileno(), err))
             return -2
 
-    def readline(self):
-        """Replacement readline() because built-in doesn't work with non-blocking IO"""
+    def _split(self, text):
+        parts = text.split('\n')
+        if len(parts) > 1:
+            self._partial.append(parts[0])
+            self._lines.append(''.join(self._partial) + '\n')
+            self._lines.extend(part + '\n' for part in parts[1:-1])
+            self._partial = []
+        if parts[-1]:
+            self._partial.append(parts[-1])
+
+    def _fill(self, wait=True):
+        """Read available output into the line queue, optionally waiting for some"""
         fileno = self.pipe.stdout.fileno()
-        while '\n' not in self.readbuf:
+        if self.blocking and not wait and not select.select([fileno], [], [], 0)[0]:
+            return
+        while not self._eof:
             try:
-                read = os.read(fileno, 2**10)
-            except OSError as err:
-                if err.errno != errno.EAGAIN or not self.blocking:
-                    raise
+                count = os.readv(fileno, [self.readbuf])
+            except BlockingIOError:
+                if not wait:
+                    return
+                select.select([fileno], [], [])
                 continue
-            if not read:
-                line = self.readbuf
-                self.readbuf = ''
-                return line
-            self.readbuf += read.decode()
-        pos = self.readbuf.find('\n') + 1
-        line = self.readbuf[0:pos]
-        self.readbuf = self.readbuf[pos:]
+            if not count:
+                self._eof = True
+                self._split(self._decoder.decode(b'', final=True))
+                return
+            self._split(self._decoder.decode(memoryview(self.readbuf)[:count]))
+            wait = False
+            if self.blocking:
+                return
+
+    def readline(self):
+        """Replacement readline() because built-in doesn't work with non-blocking IO"""
+        while not self._lines and not self._eof:
+            self._fill(wait=self.blocking)
+            if not self.blocking and not self._lines and not self._eof:
+                raise BlockingIOError(errno.EAGAIN, 'no complete line available')
+        if self._lines:
+            return self._lines.popleft()
+        line = ''.join(self._partial)
+        self._partial = []
         return line
 
+    def _check_started(self, line):
+        """Handle tcpdump startup output, returning True once lines are real output"""
+        if self.started:
+            return True
+        if re.search('listening on %s' % self.intf_name, line):
+            self.started = True
+            # When we see tcpdump start, then call provided functions.
+            if self.funcs is not None:
+                for func in self.funcs:
+                    func()
+        else:
+            self.last_line = line
+        return False
+
     def next_line(self):
         """Retrieve next line from helper."""
         while True:
@@ -168,13 +214,19 @@ class TcpdumpHelper:
                     return ''
                 raise
             assert line or self.started, 'tcpdump did not start: %s' % self.last_line.strip()
-            if self.started:
+            if self._check_started(line):
                 return line
-            if re.search('listening on %s' % self.intf_name, line):
-                self.started = True
-                # When we see tcpdump start, then call provided functions.
-                if self.funcs is not None:
-                    for func in self.funcs:
-                        func()
-            else:
-                self.last_line = line
+
+    def next_lines(self):
+        """Retrieve all lines currently available from helper, without waiting."""
+        self._fill(wait=False)
+        if self._eof and self._partial:
+            self._lines.append(''.join(self._partial))
+            self._partial = []
+        lines = []
+        while self._lines:
+            line = self._lines.popleft()
+            if self._check_started(line):
+                lines.append(line)
+        assert self.started or not self._eof, 'tcpdump did not start: %s' % self.last_line.strip()
+        return lines
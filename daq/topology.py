@@ -1,14 +1,23 @@
 """Faucet-specific topology module"""
 
+import collections
 import copy
 import os
-import yaml
 
 import logger
+import yaml_util
+from acl_rule import AclRule
 from env import DAQ_RUN_DIR, DAQ_LIB_DIR
 
 LOGGER = logger.get_logger('topology')
 
+# A template @from rule with its placeholders pre-resolved, as an AclRule; mac_src marks
+# a dl_src to fill in with the target mac.
+_FromRule = collections.namedtuple('_FromRule', ('acl', 'mac_src', 'target', 'match_key'))
+
+# Precompiled template, with to_keys holding (nw_src, match_key) for each @to rule.
+_AclTemplate = collections.namedtuple('_AclTemplate', ('from_rules', 'to_keys'))
+
 
 class FaucetTopology:
     """Topology manager specific to FAUCET configs"""
@@ -48,6 +57,7 @@ class FaucetTopology:
     _DEFAULT_GAUGE_VARZ_PORT = 9303
     _VXLAN_ACL = 'vxlan'
     _COUPLER_ACL = 'vxlan_coupler'
+    _MATCH_FIELDS = ('udp_src', 'udp_dst', 'tcp_src', 'tcp_dst')
 
     def __init__(self, config):
         self.config = config
@@ -66,8 +76,17 @@ class FaucetTopology:
         self._ext_faucet = switch_setup.get('model') == self._EXT_STACK
         self._gauge_varz_port = int(switch_setup.get('varz_port_2', self._DEFAULT_GAUGE_VARZ_PORT))
         self._device_specs = self._load_device_specs()
+        self._has_controllers = self._specs_have_controllers()
         self._port_targets = {}
         self._set_devices = {}
+        # Port acls only get regenerated for dirty ports, and files only get
+        # rewritten when their content changes. Changed files are staged until
+        # flush_acls(), so a burst of updates lands as one set of writes.
+        self._dirty_ports = set(range(1, self.sec_port))
+        self._acl_outputs = {}
+        self._pending_acls = {}
+        self._template_cache = {}
+        self._rule_match_cache = {}
         self._egress_vlan = self.config.setdefault('run_trigger', {}).get('egress_vlan')
         self._native_vlan = self.config.setdefault('run_trigger', {}).get('native_vlan')
         self.topology = None
@@ -118,7 +137,7 @@ class FaucetTopology:
             raise Exception("File %s does not exist." % filename)
         LOGGER.debug("Loading file %s", filename)
         with open(filename) as stream:
-            return yaml.safe_load(stream)
+            return yaml_util.safe_load(stream)
 
     def get_ext_intf(self):
         """Return the external interface for seconday, if any"""
@@ -150,6 +169,7 @@ class FaucetTopology:
         elif device_set in self._set_devices:
             self._set_devices[device_set].discard(device)
         set_active = bool(self._set_devices.get(device_set))
+        self._mark_port_set_dirty(device_set)
         vlan = device.vlan if set_active else self._DUMP_VLAN
         LOGGER.info('Setting port set %s to vlan %s', device_set, vlan)
         return device_set, vlan
@@ -204,6 +224,7 @@ class FaucetTopology:
     def direct_port_traffic(self, device, port_no, target):
         """Direct traffic from a port to specified port set"""
         self._populate_set_devices(device, device.gateway.port_set)
+        previous = self._port_targets.get(port_no)
         if target is None and port_no in self._port_targets:
             del self._port_targets[port_no]
         elif target is not None and port_no not in self._port_targets:
@@ -212,11 +233,29 @@ class FaucetTopology:
             assert self._port_targets[port_no] == target
             LOGGER.debug('Ignoring no-change in port status for %s', port_no)
             return
+        self._dirty_ports.add(port_no)
+        for changed in (previous, target):
+            if changed:
+                self._mark_port_set_dirty(changed['port_set'])
+        if self._has_controllers:
+            # Controller rules on any port can reference the target on this one.
+            self._dirty_ports.update(self._port_targets)
         self._generate_acls()
         port_set = target['port_set'] if target else None
         interface = self.topology['dps'][self.sec_name]['interfaces'][port_no]
         interface['native_vlan'] = self._port_set_vlan(port_set)
 
+    def _mark_port_set_dirty(self, port_set):
+        for port_no, target in self._port_targets.items():
+            if target['port_set'] == port_set:
+                self._dirty_ports.add(port_no)
+
+    def _specs_have_controllers(self):
+        if not self._device_specs:
+            return False
+        device_macs = self._device_specs.get('macAddrs', {})
+        return any('controllers' in device_info for device_info in device_macs.values())
+
     def _get_port_vlan(self, port_no):
         port_set = self._port_targets.get(port_no, {}).get('port_set')
         return self._port_set_vlan(port_set)
@@ -467,7 +506,7 @@ class FaucetTopology:
             LOGGER.debug("mirroring vlan %s to %s", vlan, mirror_ports)
             for src_mac, src_mirror in mirror_tuples:
                 self._add_acl_rule(incoming_acl, dl_src=src_mac, dl_dst=self.BROADCAST_MAC,
-                                   vlan_vid=self._NO_VLAN, ports=copy.copy(mirror_ports))
+                                   vlan_vid=self._NO_VLAN, ports=mirror_ports)
                 for dst_mac, dst_mirror in mirror_tuples:
                     if dst_mac != src_mac:
                         self._add_acl_rule(incoming_acl, dl_src=src_mac, dl_dst=dst_mac,
@@ -581,12 +620,27 @@ class FaucetTopology:
         LOGGER.debug('Writing updated pri acls to %s', filename)
         self._write_acl_file(filename, pri_acls)
 
+    def _serialize_acls(self, pri_acls):
+        acls = pri_acls['acls']
+        return {'acls': {name: [rule.to_dict() for rule in acls[name]] for name in acls}}
+
     def _write_acl_file(self, filename, pri_acls):
-        directory = os.path.dirname(filename)
-        os.makedirs(directory, exist_ok=True)
-        LOGGER.debug('Writing acl file to %s', filename)
-        with open(filename, "w") as output_stream:
-            yaml.safe_dump(pri_acls, stream=output_stream)
+        contents = yaml_util.safe_dump(self._serialize_acls(pri_acls))
+        if self._acl_outputs.get(filename) == contents:
+            LOGGER.debug('Skipping unchanged acl file %s', filename)
+            self._pending_acls.pop(filename, None)
+            return
+        LOGGER.debug('Staging acl file %s', filename)
+        self._pending_acls[filename] = contents
+
+    def flush_acls(self):
+        """Atomically write all staged acl files, returning the list of files written"""
+        pending, self._pending_acls = self._pending_acls, {}
+        for filename, contents in pending.items():
+            LOGGER.debug('Writing acl file to %s', filename)
+            yaml_util.write_atomic(filename, contents)
+            self._acl_outputs[filename] = contents
+        return list(pending)
 
     def _maybe_apply(self, target, keyword, origin, source=None):
         source_keyword = source if source else keyword
@@ -614,7 +668,7 @@ class FaucetTopology:
         self._maybe_apply(actions, 'mirror', kwargs)
 
         subrule = {}
-        subrule["actions"] = actions
+        subrule['actions'] = actions
         self._maybe_apply(subrule, 'dl_type', kwargs)
         self._maybe_apply(subrule, 'dl_src', kwargs)
         self._maybe_apply(subrule, 'dl_dst', kwargs)
@@ -626,10 +680,7 @@ class FaucetTopology:
         self._maybe_apply(subrule, 'ipv4_dst', kwargs)
         self._maybe_apply(subrule, 'eth_type', kwargs)
 
-        rule = {}
-        rule['rule'] = subrule
-
-        return rule
+        return AclRule(subrule)
 
     def _add_acl_rule(self, acl, **kwargs):
         acl.append(self._make_acl_rule(**kwargs))
@@ -638,8 +689,11 @@ class FaucetTopology:
         acl.insert(0, self._make_acl_rule(**kwargs))
 
     def _generate_port_acls(self):
-        for port in range(1, self.sec_port):
-            self._generate_port_acl(port)
+        dirty_ports, self._dirty_ports = self._dirty_ports, set()
+        LOGGER.debug('Regenerating port acls for %s', sorted(dirty_ports))
+        for port in sorted(dirty_ports):
+            if 1 <= port < self.sec_port:
+                self._generate_port_acl(port)
 
     def _generate_port_acl(self, port):
         target_mac = None
@@ -674,10 +728,7 @@ class FaucetTopology:
         acls[acl_name] = rules
         port_acl = {}
         port_acl['acls'] = acls
-        directory = os.path.dirname(filename)
-        os.makedirs(directory, exist_ok=True)
-        with open(filename, "w") as output_stream:
-            yaml.safe_dump(port_acl, stream=output_stream)
+        self._write_acl_file(filename, port_acl)
 
     def _get_device_type(self, target_mac):
         device_macs = self._device_specs['macAddrs']
@@ -719,9 +770,7 @@ class FaucetTopology:
         return count if count else 1
 
     def _make_default_allow_rule(self):
-        actions = {'allow': 1}
-        subrule = {'actions': actions}
-        return {'rule': subrule}
+        return AclRule({'actions': {'allow': 1}})
 
     def _append_augmented_rule(self, rules, acl, targets=None):
         if targets is None:
@@ -735,51 +784,84 @@ class FaucetTopology:
         for target in targets:
             rules.append(self._augment_sec_port_acl(acl, [target['port']], target['mac']))
 
-    def _augment_sec_port_acl(self, acls, ports, dl_dst):
-        acls = copy.deepcopy(acls)
-        actions = acls['rule']['actions']
+    def _augment_sec_port_acl(self, acl, ports, dl_dst):
+        actions = acl.actions
         assert not 'output' in actions, 'output actions explicitly defined'
-        if actions['allow']:
-            out_ports = (ports + [self.sec_port]) if ports else [self.sec_port]
-            actions['output'] = {'ports': out_ports}
-            if dl_dst:
-                acls['rule']['dl_dst'] = dl_dst
-            udp_src = acls['rule'].get('udp_src')
-            is_dhcp = int(udp_src) == 68 if udp_src else False
-            if ports is not None and not is_dhcp:
-                del actions['allow']
-        return acls
+        if not actions['allow']:
+            return acl
+        out_ports = (ports + [self.sec_port]) if ports else [self.sec_port]
+        actions['output'] = {'ports': out_ports}
+        udp_src = acl.get('udp_src')
+        is_dhcp = int(udp_src) == 68 if udp_src else False
+        if ports is not None and not is_dhcp:
+            del actions['allow']
+        if dl_dst:
+            return acl.replace(actions=actions, dl_dst=dl_dst)
+        return acl.replace(actions=actions)
 
     def _append_device_default_allow(self, rules, target_mac):
         device_spec = self._device_specs['macAddrs'].get(target_mac)
         if device_spec and 'default_allow' in device_spec:
             allow_action = 1 if device_spec['default_allow'] else 0
-            actions = {'allow': allow_action}
-            subrule = {'actions': actions}
+            subrule = {'actions': {'allow': allow_action}}
             subrule['description'] = "device_spec default_allow"
-            acl = {'rule': subrule}
-            self._append_augmented_rule(rules, acl)
+            self._append_augmented_rule(rules, AclRule(subrule))
 
     def _get_acl_template(self, device_type):
-        filename = self.TEMPLATE_FILE_FORMAT % device_type
         if not self._device_specs:
             return None
-        return self._load_file(filename)
+        filename = self.TEMPLATE_FILE_FORMAT % device_type
+        if not os.path.isfile(filename):
+            raise Exception("File %s does not exist." % filename)
+        stat = os.stat(filename)
+        file_key = (stat.st_mtime_ns, stat.st_size)
+        cached = self._template_cache.get(device_type)
+        if cached and cached[0] == file_key:
+            return cached[1]
+        template = self._compile_acl_template(device_type, self._load_file(filename))
+        self._template_cache[device_type] = (file_key, template)
+        return template
+
+    def _compile_acl_template(self, device_type, template_acl):
+        if not template_acl:
+            return None
+        acls = template_acl['acls']
+        from_acls = acls.get(self.FROM_ACL_KEY_FORMAT % device_type)
+        to_acls = acls.get(self.TO_ACL_KEY_FORMAT % device_type)
+        from_rules = None if from_acls is None else [
+            self._compile_from_rule(acl) for acl in from_acls]
+        to_keys = None if to_acls is None else [
+            (acl['rule'].get('nw_src'), self._match_key(acl['rule'])) for acl in to_acls]
+        return _AclTemplate(from_rules, to_keys)
+
+    def _compile_from_rule(self, acl):
+        acl = copy.deepcopy(acl)
+        rule = acl['rule']
+        dl_src = rule.get('dl_src')
+        mac_src = bool(dl_src) and dl_src.startswith(self.MAC_PREFIX)
+        if not mac_src:
+            self._resolve_template_field(rule, 'dl_src')
+        target = self._resolve_template_field(rule, 'nw_dst')
+        return _FromRule(AclRule.from_dict(acl), mac_src, target, self._match_key(rule))
+
+    def _match_key(self, rule):
+        return tuple(rule.get(field) for field in self._MATCH_FIELDS)
 
     def _append_acl_template(self, rules, device_type, target_mac=None):
         template_acl = self._get_acl_template(device_type)
         if not template_acl:
             return False
-        template_key = self.FROM_ACL_KEY_FORMAT % device_type
-        for acl in template_acl['acls'][template_key]:
-            new_rule = acl['rule']
-            self._resolve_template_field(new_rule, 'dl_src', target_mac=target_mac)
-            target = self._resolve_template_field(new_rule, 'nw_dst')
-            targets = self._resolve_targets(target, target_mac, new_rule)
+        if template_acl.from_rules is None:
+            raise KeyError(self.FROM_ACL_KEY_FORMAT % device_type)
+        for from_rule in template_acl.from_rules:
+            acl = from_rule.acl
+            if from_rule.mac_src:
+                acl = acl.replace(dl_src=target_mac)
+            targets = self._resolve_targets(from_rule.target, target_mac, from_rule.match_key)
             self._append_augmented_rule(rules, acl, targets)
         return True
 
-    def _resolve_targets(self, target, src_mac, src_rule):
+    def _resolve_targets(self, target, src_mac, src_key):
         if not target or not target.startswith(self.CTL_PREFIX):
             return None
         controller = target[len(self.CTL_PREFIX):]
@@ -794,7 +876,7 @@ class FaucetTopology:
         target_macs = middle[controller]['mac_addrs']
         target_ports = []
         for target_mac in target_macs:
-            if self._allow_target_mac(target_mac, src_rule, controller):
+            if self._allow_target_mac(target_mac, src_key, controller):
                 LOGGER.debug('allow_target %s', target_mac)
                 for port_target in self._port_targets.values():
                     if port_target['mac'] == target_mac:
@@ -802,37 +884,32 @@ class FaucetTopology:
                         target_ports.append(port_target)
         return target_ports
 
-    def _allow_target_mac(self, target_mac, src_rule, controller):
+    def _allow_target_mac(self, target_mac, src_key, controller):
         device_type = self._get_device_type(target_mac)
         template_acl = self._get_acl_template(device_type)
         if not template_acl:
             return False
-        device_macs = self._device_specs['macAddrs']
-        if target_mac not in device_macs:
+        if target_mac not in self._device_specs['macAddrs']:
             return False
-        device_info = device_macs[target_mac]
-        device_type = device_info['type'] if 'type' in device_info else 'default'
-        template_key = self.TO_ACL_KEY_FORMAT % device_type
-        for acl in template_acl['acls'][template_key]:
-            target_rule = acl['rule']
-            if self._rule_match(src_rule, target_rule, controller):
+        if template_acl.to_keys is None:
+            raise KeyError(self.TO_ACL_KEY_FORMAT % device_type)
+        for nw_src, dst_key in template_acl.to_keys:
+            if self._rule_match(src_key, nw_src, dst_key, controller):
                 return True
         return False
 
-    def _rule_match(self, src_rule, dst_rule, controller):
-        LOGGER.debug('Checking rule match for controller %s', controller)
-        dst_ctl = self.CTL_PREFIX + controller
-        if dst_rule.get('nw_src') != dst_ctl:
-            return False
-        match = self._conditional_match(src_rule, dst_rule, 'udp_src')
-        match = match and self._conditional_match(src_rule, dst_rule, 'udp_dst')
-        match = match and self._conditional_match(src_rule, dst_rule, 'tcp_src')
-        match = match and self._conditional_match(src_rule, dst_rule, 'tcp_dst')
+    def _rule_match(self, src_key, dst_nw_src, dst_key, controller):
+        cache_key = (src_key, dst_nw_src, dst_key, controller)
+        match = self._rule_match_cache.get(cache_key)
+        if match is None:
+            LOGGER.debug('Checking rule match for controller %s', controller)
+            dst_ctl = self.CTL_PREFIX + controller
+            match = dst_nw_src == dst_ctl and all(
+                self._conditional_match(src, dst) for src, dst in zip(src_key, dst_key))
+            self._rule_match_cache[cache_key] = match
         return match
 
-    def _conditional_match(self, src_rule, dst_rule, field):
-        src = src_rule.get(field)
-        dst = dst_rule.get(field)
+    def _conditional_match(self, src, dst):
         if src and dst:
             return src == dst
         return True
@@ -5,13 +5,14 @@ from __future__ import absolute_import
 import os
 
 from google.protobuf import json_format
-import yaml
+
+import yaml_util
 
 
 def yaml_proto(file_name, proto_func):
     """Load a yaml file into a proto object"""
     with open(file_name) as stream:
-        file_dict = yaml.safe_load(stream)
+        file_dict = yaml_util.safe_load(stream)
     return json_format.ParseDict(file_dict, proto_func())
 
 
@@ -0,0 +1,40 @@
+"""YAML helpers that use the libyaml C bindings when they are available"""
+
+import os
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+    LIBYAML = True
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+    LIBYAML = False
+
+
+def safe_load(stream, loader=SafeLoader):
+    """Drop-in for yaml.safe_load"""
+    return yaml.load(stream, Loader=loader)
+
+
+def safe_dump(data, stream=None, dumper=SafeDumper, **kwargs):
+    """Drop-in for yaml.safe_dump"""
+    return yaml.dump_all([data], stream, Dumper=dumper, **kwargs)
+
+
+def write_atomic(filename, contents):
+    """Replace filename with the given text, so readers never see a partial file"""
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temp_file = '%s.%d.tmp' % (filename, os.getpid())
+    with open(temp_file, 'w') as output_stream:
+        output_stream.write(contents)
+    os.replace(temp_file, filename)
+
+
+def dump_atomic(data, filename, **kwargs):
+    """safe_dump data to filename with write_atomic, returning the yaml text"""
+    contents = safe_dump(data, **kwargs)
+    write_atomic(filename, contents)
+    return contents
@@ -1,8 +1,10 @@
 """Simple client for working with the faucet event socket"""
 
+import collections
+import heapq
+import itertools
 import json
 import os
-from queue import Queue, Empty
 import select
 import socket
 import threading
@@ -20,16 +22,25 @@ class FaucetEventClient():
     FAUCET_RETRIES = 20
     _PORT_DEBOUNCE_SEC = 5
     _DEFAULT_EVENT_TIMEOUT_SEC = 10
+    _RECV_SIZE = 65536
 
     def __init__(self, config):
         self.config = config
         self.sock = None
-        self.buffer = ''
-        self.debounced_q = Queue()
+        # Raw bytes of a partially received event, and parsed events waiting to be handled.
+        self._buffer = bytearray()
+        self._recv_buffer = bytearray(self._RECV_SIZE)
+        self._events = collections.deque()
+        self._debounced = collections.deque()
         self._buffer_lock = threading.Lock()
         self.previous_state = {}
         self._port_debounce_sec = int(config.get('port_debounce_sec', self._PORT_DEBOUNCE_SEC))
+        # Debounce deadlines, as a heap of [deadline, sequence, port_state] entries.
         self._port_timers = {}
+        self._port_timer_heap = []
+        self._port_timer_counter = itertools.count()
+        self._port_timers_fired = 0
+        self._port_timers_cancelled = 0
         self._sock_path = os.getenv('FAUCET_EVENT_SOCK')
         assert self._sock_path, 'Environment FAUCET_EVENT_SOCK not defined'
 
@@ -70,18 +81,33 @@ class FaucetEventClient():
     def has_event(self, blocking=False):
         """Check if there are any queued events"""
         while True:
-            if '\n' in self.buffer:
+            if self._events:
                 return True
             if blocking or self.has_data():
-                data = self.sock.recv(1024).decode('utf-8')
+                nbytes = self.sock.recv_into(self._recv_buffer)
                 # when there is data but recv len is 0 means the socket has been disconnected
-                if len(data) == 0:
+                if nbytes == 0:
                     raise DisconnectedException("Faucet event client is disconnected.")
-                with self._buffer_lock:
-                    self.buffer += data
+                self._receive(memoryview(self._recv_buffer)[:nbytes])
             else:
                 return False
 
+    def _receive(self, data):
+        with self._buffer_lock:
+            self._buffer += data
+            end = self._buffer.rfind(b'\n')
+            if end < 0:
+                return
+            lines = self._buffer[:end].split(b'\n')
+            del self._buffer[:end + 1]
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                self._events.append(json.loads(line))
+            except Exception as e:
+                LOGGER.info('Error (%s) parsing\n%s*', str(e), line.decode('utf-8', 'replace'))
+
     def _filter_faucet_event(self, event):
         (dpid, port, active) = self.as_port_state(event)
         if dpid and port:
@@ -93,9 +119,9 @@ class FaucetEventClient():
 
         (dpid, status) = self.as_ports_status(event)
         if dpid:
-            for port in status:
-                # Prepend events so they functionally replace the current one in the queue.
-                self._prepend_event(self._make_port_state(dpid, port, status[port]))
+            # Prepend events so they functionally replace the current one in the queue.
+            self._prepend_events([self._make_port_state(dpid, port, status[port])
+                                  for port in status])
             return None
         return event
 
@@ -114,52 +140,64 @@ class FaucetEventClient():
         state_key = '%s-%d' % (dpid, port)
         if state_key in self._port_timers:
             LOGGER.debug('Port cancel %s', state_key)
-            self._port_timers[state_key].cancel()
+            # Lazy deletion: the heap entry is skipped when its deadline comes up.
+            self._port_timers.pop(state_key)[-1] = None
+            self._port_timers_cancelled += 1
         if active:
             self._handle_debounce(dpid, port, active)
             return
         LOGGER.debug('Port timer %s = %s', state_key, active)
-        timer = threading.Timer(self._port_debounce_sec,
-                                lambda: self._handle_debounce(dpid, port, active))
-        timer.start()
-        self._port_timers[state_key] = timer
+        deadline = time.monotonic() + self._port_debounce_sec
+        entry = [deadline, next(self._port_timer_counter), (dpid, port, active)]
+        heapq.heappush(self._port_timer_heap, entry)
+        self._port_timers[state_key] = entry
+
+    def _expire_port_timers(self):
+        now = time.monotonic()
+        while self._port_timer_heap and self._port_timer_heap[0][0] <= now:
+            entry = heapq.heappop(self._port_timer_heap)
+            if entry[-1] is None:
+                continue
+            (dpid, port, active) = entry[-1]
+            del self._port_timers['%s-%d' % (dpid, port)]
+            self._port_timers_fired += 1
+            self._handle_debounce(dpid, port, active)
+
+    def next_debounce_sec(self):
+        """Return seconds until the next port debounce is due, or None if none pending"""
+        while self._port_timer_heap and self._port_timer_heap[0][-1] is None:
+            heapq.heappop(self._port_timer_heap)
+        if not self._port_timer_heap:
+            return None
+        return max(0, self._port_timer_heap[0][0] - time.monotonic())
+
+    def get_debounce_stats(self):
+        """Return port debounce backlog and timer counters"""
+        return {
+            'pending': len(self._port_timers),
+            'next_sec': self.next_debounce_sec(),
+            'fired': self._port_timers_fired,
+            'cancelled': self._port_timers_cancelled
+        }
 
     def _handle_debounce(self, dpid, port, active):
         LOGGER.debug('Port handle %s-%s as %s', dpid, port, active)
-        self.debounced_q.put_nowait(self._make_port_state(dpid, port, active, debounced=True))
+        self._debounced.append(self._make_port_state(dpid, port, active, debounced=True))
 
-    def _prepend_event(self, event):
-        with self._buffer_lock:
-            self.buffer = '%s\n%s' % (json.dumps(event), self.buffer)
+    def _prepend_events(self, events):
+        self._events.extendleft(reversed(events))
 
     def _append_event(self, event):
-        event_str = json.dumps(event)
-        with self._buffer_lock:
-            index = self.buffer.rfind('\n')
-            if index == len(self.buffer) - 1:
-                self.buffer = '%s%s\n' % (self.buffer, event_str)
-            elif index == -1:
-                self.buffer = '%s\n%s' % (event_str, self.buffer)
-            else:
-                self.buffer = '%s\n%s%s' % (self.buffer[:index], event_str, self.buffer[index:])
-            LOGGER.debug('appended %s\n%s*', event_str, self.buffer)
+        self._events.append(event)
+        LOGGER.debug('appended %s (%d)', event, len(self._events))
 
     def next_event(self, blocking=False):
         """Return the next event from the queue"""
-        while self.debounced_q.qsize() or self.has_event(blocking=blocking):
-            if not self.debounced_q.empty():
-                try:
-                    return self.debounced_q.get_nowait()
-                except Empty:
-                    continue
-            with self._buffer_lock:
-                line, remainder = self.buffer.split('\n', 1)
-                self.buffer = remainder
-            try:
-                event = json.loads(line)
-            except Exception as e:
-                LOGGER.info('Error (%s) parsing\n%s*\nwith\n%s*', str(e), line, remainder)
-            event = self._filter_faucet_event(event)
+        self._expire_port_timers()
+        while self._debounced or self.has_event(blocking=blocking):
+            if self._debounced:
+                return self._debounced.popleft()
+            event = self._filter_faucet_event(self._events.popleft())
             if event:
                 return event
         return None
@@ -212,4 +250,5 @@ class FaucetEventClient():
         self.sock.close()
         self.sock = None
         with self._buffer_lock:
-            self.buffer = None
+            self._buffer.clear()
+        self._events.clear()
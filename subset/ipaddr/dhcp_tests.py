@@ -1,11 +1,17 @@
 from __future__ import absolute_import
+import struct
 import sys
 import json
-from scapy.all import rdpcap, DHCP, ICMP, IP
+from scapy.all import RawPcapReader, DHCP, Ether, ICMP, IP
 
 TEST_REQUEST = str(sys.argv[1])
 DHCP_REQUEST = 3
 DHCP_ACKNOWLEDGE = 5
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_VLAN = (0x8100, 0x88a8)
+IP_PROTO_ICMP = 1
+IP_PROTO_UDP = 17
+DHCP_PORTS = (67, 68)
 
 def main():
     """main"""
@@ -46,6 +52,42 @@ def main():
                     return packet
         return None
 
+    def _is_candidate(data, ip_proto, udp_ports=None):
+        """Cheap check of the raw ethernet/ip/udp headers, before full decoding"""
+        try:
+            offset = 12
+            eth_type = struct.unpack_from('!H', data, offset)[0]
+            while eth_type in ETH_TYPE_VLAN:
+                offset += 4
+                eth_type = struct.unpack_from('!H', data, offset)[0]
+            offset += 2
+            if eth_type != ETH_TYPE_IPV4:
+                return False
+            version_ihl, _, _, _, _, _, proto = struct.unpack_from('!BBHHHBB', data, offset)
+            if proto != ip_proto:
+                return False
+            if udp_ports is None:
+                return True
+            offset += (version_ihl & 0xf) * 4
+            src_port, dst_port = struct.unpack_from('!HH', data, offset)
+            return src_port in udp_ports or dst_port in udp_ports
+        except struct.error:
+            return False
+
+    def _read_packets(ip_proto, udp_ports=None):
+        """Stream the capture, fully decoding only packets passing the header check,
+        so memory use does not grow with the capture length"""
+        reader = RawPcapReader(scan_file)
+        try:
+            for data, metadata in reader:
+                if not _is_candidate(data, ip_proto, udp_ports):
+                    continue
+                packet = Ether(data)
+                packet.time = metadata[0] + metadata[1] / 1e6
+                yield packet
+        finally:
+            reader.close()
+
     def _get_dhcp_option(packet, option):
         for opt in packet[DHCP].options:
             if opt[0] == option:
@@ -58,18 +100,23 @@ def main():
     def _in_range(ip, start, end):
         return _to_ipv4(start) < _to_ipv4(ip) < _to_ipv4(end)
 
-    def _supports_range(capture, start, end):
-        found_request = False
+    def _requested_addresses(capture):
+        addresses = []
         for packet in capture:
             if DHCP not in packet:
                 continue
             if not packet[DHCP].options[0][1] == DHCP_REQUEST:
                 continue
-            if _get_dhcp_option(packet, 'requested_addr') is None:
-                continue
-            if _in_range(_get_dhcp_option(packet, 'requested_addr'), start, end):
-                found_request = True
-        return found_request
+            requested_addr = _get_dhcp_option(packet, 'requested_addr')
+            if requested_addr is not None:
+                addresses.append(requested_addr)
+        return addresses
+
+    def _supports_range(requested_addresses, start, end):
+        for requested_addr in requested_addresses:
+            if _in_range(requested_addr, start, end):
+                return True
+        return False
 
     def _test_dhcp_short():
         fd = open(ipaddr_log, 'r')
@@ -105,7 +152,7 @@ def main():
             return 'fail', 'No ip change found.'
 
         print('ip_change looking for ping src IP %s' % ip_change_ip)
-        capture = rdpcap(scan_file)
+        capture = _read_packets(IP_PROTO_ICMP)
         pingFound = False
         for packet in capture:
             if ICMP in packet:
@@ -117,10 +164,10 @@ def main():
     def _test_private_address():
         if len(dhcp_ranges) == 0:
             return 'skip', 'No private address ranges were specified.'
-        capture = rdpcap(scan_file)
+        requested_addresses = _requested_addresses(_read_packets(IP_PROTO_UDP, DHCP_PORTS))
         passing = True
         for dhcp_range in dhcp_ranges:
-            if not _supports_range(capture, dhcp_range['start'], dhcp_range['end']):
+            if not _supports_range(requested_addresses, dhcp_range['start'], dhcp_range['end']):
                 passing = False
         if passing:
             return 'pass', 'All private address ranges are supported.'
@@ -148,7 +195,7 @@ def main():
 
         print('dhcp_change looking for ping src IP %s' % dhcp_change_ip)
 
-        capture = rdpcap(scan_file)
+        capture = _read_packets(IP_PROTO_ICMP)
         for packet in capture:
             if ICMP in packet:
                 print('ping from src %s' % packet[IP].src)
@@ -3,11 +3,11 @@
 
 """
 from __future__ import absolute_import
-import subprocess
 import sys
 
 import re
-import datetime
+
+import pcap_index
 
 arguments = sys.argv
 
@@ -16,7 +16,6 @@ cap_pcap_file = str(arguments[2])
 device_address = str(arguments[3])
 
 report_filename = 'dns_tests.txt'
-min_packet_length_bytes = 20
 max_packets_in_report = 10
 port_list = []
 ignore = '%%'
@@ -26,11 +25,6 @@ dash_break_line = '--------------------\n'
 
 DESCRIPTION_HOSTNAME_CONNECT = 'Check device uses the DNS server from DHCP and resolves hostnames'
 
-TCPDUMP_DATE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
-
-IP_REGEX = r'(([0-9]{1,3}\.){3}[0-9]{1,3})'
-RDATA_REGEX = r''
-
 DNS_SERVER_HOST = '.2'
 
 
@@ -40,32 +34,6 @@ def write_report(string_to_append):
         file_open.write(string_to_append)
 
 
-def exec_tcpdump(tcpdump_filter, capture_file=None):
-    """
-    Args
-        tcpdump_filter: Filter to pass onto tcpdump file
-        capture_file: Optional capture file to look
-
-    Returns
-        List of packets matching the filter
-    """
-
-    capture_file = cap_pcap_file if capture_file is None else capture_file
-    command = 'tcpdump -tttt -n -r {} {}'.format(capture_file, tcpdump_filter)
-
-    process = subprocess.Popen(command,
-                               universal_newlines=True,
-                               shell=True,
-                               stdout=subprocess.PIPE,
-                               stderr=subprocess.PIPE)
-    text = str(process.stdout.read()).rstrip()
-
-    if text:
-        return text.split("\n")
-
-    return []
-
-
 def add_summary(text):
     global summary_text
     summary_text = summary_text + " " + text if summary_text else text
@@ -85,34 +53,25 @@ def get_dns_server_from_ip(ip_address):
     return re.sub(r'\.\d+$', DNS_SERVER_HOST, ip_address)
 
 
-def check_communication_for_response(response_line):
+def check_communication_for_response(index, response_row):
     """
-    Given a line from the TCPdump output for DNS responses
-    Look through the packet capture to see if any communitication to the
-    IP addresses from the DNS
+    Given a DNS response packet, look through the packet capture to see if
+    there is any communication to the IP addresses from the DNS response
 
     Args
-        tcpdump_line: Line from tcpdump filtered to DNS resposnes
+        index: Packet index of the capture
+        response_row: Row of the DNS response packet in the index
 
     Returns
         True/False if the device has communicated with an IP from the
         DNS response after it has recieved it
     """
 
-    response_time = datetime.datetime.strptime(response_line[:26], TCPDUMP_DATE_FORMAT)
+    response_time = index.column('time')[response_row]
 
-    # Use regex to extract all IP addresses in the response
-    matches = re.findall(IP_REGEX, response_line)
-
-    # The first two IP addresses are the source/destination
-    ip_addresses = matches[2:]
-
-    for address in ip_addresses:
-        packets = exec_tcpdump('dst host {}'.format(address[0]))
-        for packet in packets:
-            packet_time = datetime.datetime.strptime(packet[:26], TCPDUMP_DATE_FORMAT)
-            if packet_time > response_time:
-                return True
+    for address in index.column('dns_answers')[response_row] or []:
+        if index.select(pcap_index.Match(dst_host=address, after=response_time)):
+            return True
 
     return False
 
@@ -132,9 +91,10 @@ def test_dns(target_ip):
     # Get server IP of the DHCP server
     dhcp_dns_ip = get_dns_server_from_ip(target_ip)
 
+    index = pcap_index.load(cap_pcap_file)
+
     # Check if the device has sent any DNS requests
-    filter_to_dns = 'dst port 53 and src host {}'.format(target_ip)
-    to_dns = exec_tcpdump(filter_to_dns)
+    to_dns = index.select(pcap_index.Match(dst_port=53, src_host=target_ip))
     num_query_dns = len(to_dns)
 
     if num_query_dns == 0:
@@ -142,10 +102,7 @@ def test_dns(target_ip):
         return 'skip'
 
     # Check if the device only sent DNS requests to the DHCP Server
-    filter_to_dhcp_dns = 'dst port 53 and src host {} and dst host {}' \
-        .format(target_ip, dhcp_dns_ip)
-
-    to_dhcp_dns = exec_tcpdump(filter_to_dhcp_dns)
+    to_dhcp_dns = index.select(pcap_index.Match(dst_host=dhcp_dns_ip), rows=to_dns)
     num_query_dhcp_dns = len(to_dhcp_dns)
 
     if num_query_dns > num_query_dhcp_dns:
@@ -153,8 +110,7 @@ def test_dns(target_ip):
         return 'fail'
 
     # Retrieve responses from DNS
-    filter_dns_response = 'src port 53 and src host {}'.format(dhcp_dns_ip)
-    dns_responses = exec_tcpdump(filter_dns_response)
+    dns_responses = index.select(pcap_index.Match(src_port=53, src_host=dhcp_dns_ip))
 
     num_dns_responses = len(dns_responses)
 
@@ -166,7 +122,7 @@ def test_dns(target_ip):
     # it has recieved from the DNS requests
 
     for response in dns_responses:
-        if check_communication_for_response(response):
+        if check_communication_for_response(index, response):
             add_summary('Device sends DNS requests and resolves host names')
             return 'pass'
 
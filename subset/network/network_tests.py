@@ -9,10 +9,11 @@
     Usage: python network_tests.py <test_to_run> <monitor.pcap file> <target_ip>
     E.g. python network_tests.py communication.network.min_send $MONITOR $TARGET_IP
 """
-import subprocess, time, sys, json
+import sys
 
 import re
-import datetime
+
+import pcap_stats
 
 arguments = sys.argv
 
@@ -21,7 +22,6 @@ cap_pcap_file = str(arguments[2])
 device_address = str(arguments[3])
 
 report_filename = 'network_tests.txt'
-min_packet_length_bytes = 20
 max_packets_in_report = 10
 port_list = []
 ignore = '%%'
@@ -32,15 +32,7 @@ dash_break_line = '--------------------\n'
 description_min_send = 'Device sends data at a frequency of less than 5 minutes.'
 description_communication_type = 'Device sends unicast or broadcast packets.'
 
-tcpdump_display_all_packets = 'tcpdump -tttt -n src host ' + device_address + ' -r ' + cap_pcap_file
-tcpdump_display_udp_bacnet_packets = 'tcpdump -n udp dst portrange 47808-47809 -r ' + cap_pcap_file
-tcpdump_display_arp_packets = 'tcpdump arp -n src host ' + device_address + ' -r ' + cap_pcap_file
-
-tcpdump_display_broadcast_packets = 'tcpdump broadcast and src host ' + device_address + ' -r ' + cap_pcap_file
-tcpdump_display_multicast_packets = 'tcpdump -n \'ip[16] & 240 = 224\' -r ' + cap_pcap_file
-
 system_conf_file = "/config/inst/system.conf"
-tcpdump_date_format = "%Y-%m-%d %H:%M:%S.%f"
 min_send_seconds = 300
 min_send_duration = "5 minutes"
 
@@ -50,41 +42,20 @@ def write_report(string_to_append):
         file_open.write(string_to_append)
 
 
-def shell_command_with_result(command, wait_time, terminate_flag):
-    process = subprocess.Popen(command, universal_newlines=True, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    text = process.stdout.read()
-    retcode = process.wait()
-    time.sleep(wait_time)
-    if terminate_flag:
-        process.terminate()
-    return str(text)
-
-
 def add_packet_count_to_report(packet_type, packet_count):
     write_report("{i} {t} packets received={p}\n".format(i=ignore, t=packet_type, p=packet_count))
 
 
-def add_packet_info_to_report(packets_received):
-    packet_list = packets_received.strip().split("\n")
-    outnum = min(len(packet_list), max_packets_in_report)
-    for x in range(0, outnum):
-        write_report("{i} {p}\n".format(i=ignore, p=packet_list[x]))
-    write_report("{i} packets_count={p}\n".format(i=ignore, p=len(packet_list)))
-
+def add_packet_info_to_report(index, rows):
+    for row in rows[:max_packets_in_report]:
+        write_report("{i} {p}\n".format(i=ignore, p=index.describe(row)))
+    write_report("{i} packets_count={p}\n".format(i=ignore, p=len(rows)))
 
-def decode_shell_result(shell_result):
-    if len(shell_result) > min_packet_length_bytes:
-        packet_request_list = shell_result.rstrip().split("\n")
-        packets_received = len(packet_request_list)
-        return packets_received
-    return 0
 
-
-def packets_received_count(shell_result):
-    if shell_result is None:
-        return 0
-    else:
-        return decode_shell_result(shell_result)
+def add_send_rate_to_report(stats):
+    packet_rate, byte_rate = stats.send_rate()
+    write_report("{i} send_rate={p:.3f} packets/s {b:.1f} bytes/s\n".format(
+        i=ignore, p=packet_rate, b=byte_rate))
 
 
 def get_scan_length(config_file):
@@ -134,39 +105,23 @@ def test_connection_min_send():
 
     # Get scan length
     scan_length = get_scan_length(system_conf_file)
-    min_send_delta = datetime.timedelta(seconds=min_send_seconds)
-    min_send_pass = False
 
     # The test scans the monitor.pcap, so if it's not found skip
     if not scan_length:
         add_summary("DAQ monitor scan not running, test skipped")
         return 'skip'
 
-    arp_shell_result = shell_command_with_result(tcpdump_display_arp_packets, 0, False)
-    arp_packets_received = packets_received_count(arp_shell_result)
-    if arp_packets_received > 0:
-        add_summary("ARP packets received.")
-
-    shell_result = shell_command_with_result(tcpdump_display_all_packets, 0, False)
-    all_packets = shell_result.splitlines()
+    index, stats = pcap_stats.load(cap_pcap_file, device_address)
 
-    # Loop through tcpdump result and measure the time between succesive packets
-    for i, packet in enumerate(all_packets):
-        # datetime is the first 26 characters of the line
-        packet_time = datetime.datetime.strptime(packet[:26], tcpdump_date_format)
-
-        if i == 0:
-            previous_packet_time = packet_time
-            continue
-
-        delta = packet_time - previous_packet_time
-        if delta < min_send_delta:
-            min_send_pass = True
-            break
+    if stats.sent_arp_count() > 0:
+        add_summary("ARP packets received.")
 
-        previous_packet_time = packet_time
+    # Measure the time between successive packets
+    min_send_gap = stats.min_send_gap()
+    min_send_pass = min_send_gap is not None and min_send_gap < min_send_seconds
 
-    add_packet_info_to_report(shell_result)
+    add_packet_info_to_report(index, stats.sent_rows())
+    add_send_rate_to_report(stats)
 
     if not min_send_pass:
         if scan_length > min_send_seconds:
@@ -188,23 +143,19 @@ def test_communication_type_broadcast():
     Counts the number of unicast, broadcast and multicast packets sent.
     """
     test_result = 'fail'
+    _, stats = pcap_stats.load(cap_pcap_file, device_address)
+    unicast_packets, broadcast_packets, multicast_packets = stats.class_counts()
 
-    broadcast_result = shell_command_with_result(tcpdump_display_broadcast_packets, 0, False)
-    broadcast_packets = packets_received_count(broadcast_result)
     if broadcast_packets > 0:
         test_result = 'pass'
         add_summary("Broadcast packets received.")
         add_packet_count_to_report("Broadcast", broadcast_packets)
 
-    multicast_result = shell_command_with_result(tcpdump_display_multicast_packets, 0, False)
-    multicast_packets = packets_received_count(multicast_result)
     if multicast_packets > 0:
         test_result = 'pass'
         add_summary("Multicast packets received.")
         add_packet_count_to_report("Multicast", multicast_packets)
 
-    unicast_result = shell_command_with_result(tcpdump_display_all_packets, 0, False)
-    unicast_packets = packets_received_count(unicast_result) - broadcast_packets - multicast_packets
     if unicast_packets > 0:
         test_result = 'pass'
         add_summary("Unicast packets received.")
@@ -1,7 +1,7 @@
 from __future__ import absolute_import, division
-from scapy.all import NTP, rdpcap
 import sys
-import os
+
+import pcap_index
 
 arguments = sys.argv
 
@@ -33,39 +33,26 @@ def write_report(string_to_append):
 
 
 # Extracts the NTP version from the first client NTP packet
-def ntp_client_version(capture):
-    client_packets = ntp_packets(capture, MODE_CLIENT)
+def ntp_client_version(index, rows):
+    client_packets = ntp_packets(index, MODE_CLIENT, rows)
     if len(client_packets) == 0:
         return None
-    return ntp_payload(client_packets[0]).version
-
-
-# Filters the packets by type (NTP)
-def ntp_packets(capture, mode=None):
-    packets = []
-    for packet in capture:
-        if NTP in packet:
-            ip = packet.payload
-            udp = ip.payload
-            ntp = udp.payload
-            if mode is None or mode == ntp.mode:
-                packets.append(packet)
-    return packets
+    return index.column('ntp_version')[client_packets[0]]
 
 
-# Extracts the NTP payload from a packet of type NTP
-def ntp_payload(packet):
-    ip = packet.payload
-    udp = ip.payload
-    ntp = udp.payload
-    return ntp
+# Filters the packets by type (NTP), returning their rows in the index
+def ntp_packets(index, mode=None, rows=None):
+    modes = index.column('ntp_mode')
+    candidates = range(len(index)) if rows is None else rows
+    return [row for row in candidates
+            if modes[row] is not None and (mode is None or mode == modes[row])]
 
 
 def test_ntp_support():
-    capture = rdpcap(pcap_file)
-    packets = ntp_packets(capture)
+    index = pcap_index.load(pcap_file)
+    packets = ntp_packets(index)
     if len(packets) > 0:
-        version = ntp_client_version(packets)
+        version = ntp_client_version(index, packets)
         if version is None:
             add_summary("No NTP packets received.")
             return 'skip'
@@ -81,20 +68,23 @@ def test_ntp_support():
 
 
 def test_ntp_update():
-    capture = rdpcap(pcap_file)
-    packets = ntp_packets(capture)
+    index = pcap_index.load(pcap_file)
+    packets = ntp_packets(index)
     if len(packets) < 2:
         add_summary("Not enough NTP packets received.")
         return 'skip'
     # Check that DAQ NTP server has been used
     using_local_server = False
     local_ntp_packets = []
+    ip_src = index.column('ip_src')
+    ip_dst = index.column('ip_dst')
+    modes = index.column('ntp_mode')
     for packet in packets:
         # Packet is to or from local NTP server
-        if ((packet.payload.dst.startswith(LOCAL_PREFIX) and
-                packet.payload.dst.endswith(NTP_SERVER_SUFFIX)) or
-                (packet.payload.src.startswith(LOCAL_PREFIX) and
-                    packet.payload.src.endswith(NTP_SERVER_SUFFIX))):
+        if ((ip_dst[packet].startswith(LOCAL_PREFIX) and
+                ip_dst[packet].endswith(NTP_SERVER_SUFFIX)) or
+                (ip_src[packet].startswith(LOCAL_PREFIX) and
+                    ip_src[packet].endswith(NTP_SERVER_SUFFIX))):
             using_local_server = True
             local_ntp_packets.append(packet)
     if not using_local_server or len(local_ntp_packets) < 2:
@@ -104,18 +94,18 @@ def test_ntp_update():
     p1 = p2 = p3 = p4 = None
     for i in range(len(local_ntp_packets)):
         if p1 is None:
-            if ntp_payload(local_ntp_packets[i]).mode == MODE_CLIENT:
+            if modes[local_ntp_packets[i]] == MODE_CLIENT:
                 p1 = local_ntp_packets[i]
         elif p2 is None:
-            if ntp_payload(local_ntp_packets[i]).mode == MODE_SERVER:
+            if modes[local_ntp_packets[i]] == MODE_SERVER:
                 p2 = local_ntp_packets[i]
             else:
                 p1 = local_ntp_packets[i]
         elif p3 is None:
-            if ntp_payload(local_ntp_packets[i]).mode == MODE_CLIENT:
+            if modes[local_ntp_packets[i]] == MODE_CLIENT:
                 p3 = local_ntp_packets[i]
         elif p4 is None:
-            if ntp_payload(local_ntp_packets[i]).mode == MODE_SERVER:
+            if modes[local_ntp_packets[i]] == MODE_SERVER:
                 p4 = local_ntp_packets[i]
                 p1 = p3
                 p2 = p4
@@ -125,10 +115,12 @@ def test_ntp_update():
     if p1 is None or p2 is None:
         add_summary("Device clock not synchronized with local NTP server.")
         return 'fail'
-    t1 = ntp_payload(p1).sent
-    t2 = ntp_payload(p1).time
-    t3 = ntp_payload(p2).sent
-    t4 = ntp_payload(p2).time
+    sent = index.column('ntp_sent')
+    times = index.column('time')
+    t1 = sent[p1]
+    t2 = times[p1]
+    t3 = sent[p2]
+    t4 = times[p2]
 
     # Timestamps are inconsistenly either from 1900 or 1970
     if t1 > YEAR_2500:
@@ -141,7 +133,7 @@ def test_ntp_update():
         t4 = t4 - SECONDS_BETWEEN_1900_1970
 
     offset = abs((t2 - t1) + (t3 - t4))/2
-    if offset < OFFSET_ALLOWANCE and not ntp_payload(p1).leap == LEAP_ALARM:
+    if offset < OFFSET_ALLOWANCE and not index.column('ntp_leap')[p1] == LEAP_ALARM:
         add_summary("Device clock synchronized.")
         return 'pass'
     else:
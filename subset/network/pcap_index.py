@@ -0,0 +1,344 @@
+"""
+    Single-pass packet index for monitor captures.
+
+    Decodes a pcap file once and writes a compact columnar index next to it
+    (<pcap>.idx, gzipped json), holding per-packet timestamps, L2/L3/L4 tuples,
+    protocol flags and the DNS/NTP/DHCP fields used by the network tests.
+    Test scripts load the index with load() and query it instead of running
+    tcpdump or scapy over the full capture for every sub-test.
+
+    Usage: python pcap_index.py <pcap file> [index file]
+"""
+from __future__ import absolute_import, division, print_function
+import collections
+import datetime
+import gzip
+import json
+import os
+import socket
+import struct
+import sys
+
+INDEX_VERSION = 2
+INDEX_SUFFIX = '.idx'
+
+COLUMNS = ('time', 'length', 'eth_src', 'eth_dst', 'arp', 'ip_src', 'ip_dst', 'proto',
+           'sport', 'dport', 'dst_class', 'dns_response', 'dns_answers', 'ntp_version',
+           'ntp_mode', 'ntp_leap', 'ntp_sent', 'dhcp_type', 'dhcp_yiaddr')
+
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+LINKTYPE_ETHERNET = 1
+
+ETH_BROADCAST = 'ff:ff:ff:ff:ff:ff'
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_ARP = 0x0806
+ETH_TYPE_VLAN = (0x8100, 0x88a8)
+ETH_TYPE_IPV6 = 0x86dd
+IP_PROTO_TCP = 6
+IP_PROTO_UDP = 17
+DNS_PORT = 53
+NTP_PORT = 123
+DHCP_PORTS = (67, 68)
+DNS_TYPE_A = 1
+DHCP_MAGIC_COOKIE = 0x63825363
+DHCP_OPTION_MESSAGE_TYPE = 53
+DHCP_OPTION_END = 255
+DHCP_OPTION_PAD = 0
+NTP_FRACTION = float(1 << 32)
+
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# Values of the dst_class column.
+DST_UNICAST = 0
+DST_BROADCAST = 1
+DST_MULTICAST = 2
+
+# Conditions for PcapIndex.select, unset (None) fields match any packet.
+Match = collections.namedtuple('Match', ('src_host', 'dst_host', 'port', 'src_port', 'dst_port',
+                                         'arp', 'eth_broadcast', 'ip_multicast', 'after'))
+Match.__new__.__defaults__ = (None,) * len(Match._fields)
+
+
+def _mac(data, offset):
+    return ':'.join('%02x' % byte for byte in bytearray(data[offset:offset + 6]))
+
+
+def _skip_dns_name(data, offset):
+    while True:
+        length = bytearray(data[offset:offset + 1])[0]
+        if length & 0xc0 == 0xc0:
+            return offset + 2
+        offset += 1 + length
+        if length == 0:
+            return offset
+
+
+def _decode_dns(row, data, offset):
+    _, flags, questions, answers = struct.unpack_from('!HHHH', data, offset)
+    row['dns_response'] = bool(flags & 0x8000)
+    if not row['dns_response']:
+        return
+    pos = offset + 12
+    for _ in range(questions):
+        pos = _skip_dns_name(data, pos) + 4
+    addresses = []
+    for _ in range(answers):
+        pos = _skip_dns_name(data, pos)
+        rtype, _, _, rdlength = struct.unpack_from('!HHIH', data, pos)
+        pos += 10
+        if rtype == DNS_TYPE_A and rdlength == 4:
+            addresses.append(socket.inet_ntoa(data[pos:pos + 4]))
+        pos += rdlength
+    row['dns_answers'] = addresses
+
+
+def _decode_ntp(row, data, offset):
+    first = bytearray(data[offset:offset + 1])[0]
+    seconds, fraction = struct.unpack_from('!II', data, offset + 40)
+    row['ntp_leap'] = first >> 6
+    row['ntp_version'] = (first >> 3) & 0x7
+    row['ntp_mode'] = first & 0x7
+    row['ntp_sent'] = seconds + fraction / NTP_FRACTION
+
+
+def _decode_dhcp(row, data, offset):
+    row['dhcp_yiaddr'] = socket.inet_ntoa(data[offset + 16:offset + 20])
+    if struct.unpack_from('!I', data, offset + 236)[0] != DHCP_MAGIC_COOKIE:
+        return
+    pos = offset + 240
+    options = bytearray(data[pos:])
+    pos = 0
+    while pos < len(options) and options[pos] != DHCP_OPTION_END:
+        if options[pos] == DHCP_OPTION_PAD:
+            pos += 1
+            continue
+        if options[pos] == DHCP_OPTION_MESSAGE_TYPE:
+            row['dhcp_type'] = options[pos + 2]
+            return
+        pos += 2 + options[pos + 1]
+
+
+def _decode_transport(row, data, offset, proto):
+    if proto == IP_PROTO_UDP:
+        row['sport'], row['dport'] = struct.unpack_from('!HH', data, offset)
+        payload = offset + 8
+    elif proto == IP_PROTO_TCP:
+        row['sport'], row['dport'], _, _, data_offset = struct.unpack_from('!HHIIB', data,
+                                                                          offset)
+        # DNS over TCP has a two byte length prefix.
+        payload = offset + (data_offset >> 4) * 4 + 2
+        if payload >= len(data):
+            return
+    else:
+        return
+    ports = (row['sport'], row['dport'])
+    if DNS_PORT in ports:
+        _decode_dns(row, data, payload)
+    elif proto == IP_PROTO_UDP and NTP_PORT in ports:
+        _decode_ntp(row, data, payload)
+    elif proto == IP_PROTO_UDP and (row['sport'] in DHCP_PORTS and row['dport'] in DHCP_PORTS):
+        _decode_dhcp(row, data, payload)
+
+
+def _decode_packet(row, data):
+    row['eth_dst'] = _mac(data, 0)
+    row['eth_src'] = _mac(data, 6)
+    offset = 12
+    eth_type = struct.unpack_from('!H', data, offset)[0]
+    while eth_type in ETH_TYPE_VLAN:
+        offset += 4
+        eth_type = struct.unpack_from('!H', data, offset)[0]
+    offset += 2
+    if eth_type == ETH_TYPE_ARP:
+        # Like tcpdump host filters, use the sender and target protocol addresses.
+        row['arp'] = True
+        row['ip_src'] = socket.inet_ntoa(data[offset + 14:offset + 18])
+        row['ip_dst'] = socket.inet_ntoa(data[offset + 24:offset + 28])
+    elif eth_type == ETH_TYPE_IPV4:
+        version_ihl, = struct.unpack_from('!B', data, offset)
+        row['proto'], = struct.unpack_from('!B', data, offset + 9)
+        row['ip_src'] = socket.inet_ntoa(data[offset + 12:offset + 16])
+        row['ip_dst'] = socket.inet_ntoa(data[offset + 16:offset + 20])
+        _decode_transport(row, data, offset + (version_ihl & 0xf) * 4, row['proto'])
+    elif eth_type == ETH_TYPE_IPV6:
+        row['proto'], = struct.unpack_from('!B', data, offset + 6)
+        row['ip_src'] = socket.inet_ntop(socket.AF_INET6, data[offset + 8:offset + 24])
+        row['ip_dst'] = socket.inet_ntop(socket.AF_INET6, data[offset + 24:offset + 40])
+        _decode_transport(row, data, offset + 40, row['proto'])
+
+
+def _dst_class(row):
+    if row['eth_dst'] == ETH_BROADCAST:
+        return DST_BROADCAST
+    if row['proto'] is not None and is_ip_multicast(row['ip_dst']):
+        return DST_MULTICAST
+    return DST_UNICAST
+
+
+def read_packets(pcap_file):
+    """Generate (timestamp, original length, data) for each packet of a pcap file,
+    reading one record at a time"""
+    with open(pcap_file, 'rb') as pcap:
+        header = pcap.read(24)
+        if len(header) < 24:
+            return
+        for endian in ('<', '>'):
+            magic, = struct.unpack(endian + 'I', header[:4])
+            if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+                break
+        else:
+            raise ValueError('%s is not a pcap file' % pcap_file)
+        linktype, = struct.unpack(endian + 'I', header[20:24])
+        if linktype != LINKTYPE_ETHERNET:
+            raise ValueError('%s has unsupported link type %d' % (pcap_file, linktype))
+        divisor = 1e9 if magic == PCAP_MAGIC_NSEC else 1e6
+        record_format = endian + 'IIII'
+        while True:
+            record = pcap.read(16)
+            if len(record) < 16:
+                return
+            seconds, fraction, caplen, length = struct.unpack(record_format, record)
+            data = pcap.read(caplen)
+            if len(data) < caplen:
+                return
+            yield seconds + fraction / divisor, length, data
+
+
+def build(pcap_file):
+    """Decode every packet of a capture into a column dict"""
+    columns = dict((name, []) for name in COLUMNS)
+    for timestamp, length, data in read_packets(pcap_file):
+        row = dict.fromkeys(COLUMNS)
+        row['time'] = timestamp
+        row['length'] = length
+        try:
+            _decode_packet(row, data)
+        except (struct.error, IndexError, ValueError, socket.error):
+            # Keep whatever was decoded before the truncated or malformed part.
+            pass
+        row['dst_class'] = _dst_class(row)
+        for name in COLUMNS:
+            columns[name].append(row[name])
+    return columns
+
+
+def index_path(pcap_file):
+    """Sidecar index file for a capture, in /tmp if the capture directory is read-only"""
+    pcap_dir = os.path.dirname(os.path.abspath(pcap_file))
+    if os.access(pcap_dir, os.W_OK):
+        return os.path.abspath(pcap_file) + INDEX_SUFFIX
+    return os.path.join('/tmp', os.path.basename(pcap_file) + INDEX_SUFFIX)
+
+
+def write_index(pcap_file, index_file=None):
+    """Index a capture and write the sidecar file, returning the loaded PcapIndex"""
+    index_file = index_file or index_path(pcap_file)
+    columns = build(pcap_file)
+    contents = {
+        'version': INDEX_VERSION,
+        'pcap_size': os.path.getsize(pcap_file),
+        'columns': columns
+    }
+    tmp_file = '%s.%d.tmp' % (index_file, os.getpid())
+    with gzip.open(tmp_file, 'wb') as index_out:
+        index_out.write(json.dumps(contents, separators=(',', ':')).encode('utf-8'))
+    os.rename(tmp_file, index_file)
+    return PcapIndex(columns)
+
+
+def _read_index(pcap_file, index_file):
+    if not os.path.exists(index_file):
+        return None
+    if os.path.getmtime(index_file) < os.path.getmtime(pcap_file):
+        return None
+    with gzip.open(index_file, 'rb') as index_in:
+        contents = json.loads(index_in.read().decode('utf-8'))
+    if (contents.get('version') != INDEX_VERSION or
+            contents.get('pcap_size') != os.path.getsize(pcap_file)):
+        return None
+    return PcapIndex(contents['columns'])
+
+
+def load(pcap_file, index_file=None):
+    """Load the index for a capture, building it first if missing or stale"""
+    index_file = index_file or index_path(pcap_file)
+    return _read_index(pcap_file, index_file) or write_index(pcap_file, index_file)
+
+
+def is_ip_multicast(address):
+    """True for IPv4 multicast (224.0.0.0/4) addresses"""
+    return bool(address) and '.' in address and 224 <= int(address.split('.', 1)[0]) <= 239
+
+
+class PcapIndex:
+    """Column store of decoded packets, queried by row number"""
+
+    def __init__(self, columns):
+        self.columns = columns
+        self._count = len(columns['time'])
+
+    def __len__(self):
+        return self._count
+
+    def column(self, name, rows=None):
+        """Values of a column, for all packets or the given rows"""
+        values = self.columns[name]
+        if rows is None:
+            return values
+        return [values[row] for row in rows]
+
+    def select(self, match, rows=None):
+        """Row numbers of packets matching all the conditions of a Match. Host and port
+        conditions follow tcpdump 'src/dst host' and 'port' semantics."""
+        columns = self.columns
+        tests = []
+        for column, value in (('ip_src', match.src_host), ('ip_dst', match.dst_host),
+                              ('sport', match.src_port), ('dport', match.dst_port)):
+            if value is not None:
+                tests.append((columns[column], lambda found, value=value: found == value))
+        if match.arp is not None:
+            tests.append((columns['arp'], lambda value: bool(value) == match.arp))
+        if match.eth_broadcast is not None:
+            tests.append((columns['eth_dst'],
+                          lambda value: (value == ETH_BROADCAST) == match.eth_broadcast))
+        if match.after is not None:
+            tests.append((columns['time'], lambda value: value > match.after))
+        candidates = range(self._count) if rows is None else rows
+        if match.port is not None:
+            sports, dports = columns['sport'], columns['dport']
+            candidates = [row for row in candidates if match.port in (sports[row], dports[row])]
+        if match.ip_multicast is not None:
+            protos, ip_dsts = columns['proto'], columns['ip_dst']
+            candidates = [row for row in candidates if match.ip_multicast == (
+                protos[row] is not None and is_ip_multicast(ip_dsts[row]))]
+        return [row for row in candidates
+                if all(test(values[row]) for values, test in tests)]
+
+    def describe(self, row):
+        """One line summary of a packet, in the style of tcpdump -tttt -n"""
+        columns = self.columns
+        when = datetime.datetime.fromtimestamp(columns['time'][row]).strftime(DATE_FORMAT)
+        if columns['arp'][row]:
+            return '%s ARP %s > %s' % (when, columns['ip_src'][row], columns['ip_dst'][row])
+        if columns['ip_src'][row] is None:
+            return '%s %s > %s length %d' % (when, columns['eth_src'][row],
+                                             columns['eth_dst'][row], columns['length'][row])
+        src, dst = columns['ip_src'][row], columns['ip_dst'][row]
+        if columns['sport'][row] is not None:
+            src = '%s.%d' % (src, columns['sport'][row])
+            dst = '%s.%d' % (dst, columns['dport'][row])
+        return '%s IP %s > %s: proto %s length %d' % (when, src, dst, columns['proto'][row],
+                                                      columns['length'][row])
+
+
+def main(argv):
+    """Build the index for a capture file"""
+    pcap_file = argv[1]
+    index_file = argv[2] if len(argv) > 2 else None
+    index = write_index(pcap_file, index_file)
+    print('Indexed %d packets from %s' % (len(index), pcap_file))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
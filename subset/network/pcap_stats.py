@@ -0,0 +1,64 @@
+"""
+    Vectorized packet statistics for the communication.network tests.
+
+    Loads the timestamps, sizes and destination classes of a capture index
+    into numpy arrays, so that send gaps, rates and class counts are computed
+    without iterating over packets in python.
+"""
+from __future__ import absolute_import, division
+import numpy as np
+
+import pcap_index
+
+
+class PcapStats:
+    """Packet arrays of a capture, relative to the device under test"""
+
+    def __init__(self, index, device_address):
+        self.time = np.asarray(index.column('time'), dtype=np.float64)
+        self.length = np.asarray(index.column('length'), dtype=np.int64)
+        self.dst_class = np.asarray(index.column('dst_class'), dtype=np.int8)
+        self.arp = np.asarray(index.column('arp'), dtype=bool)
+        # Like 'src host', matches both IP source and ARP sender addresses.
+        self.sent = np.asarray(index.column('ip_src'), dtype=object) == device_address
+
+    def sent_rows(self):
+        """Index rows of packets sent by the device"""
+        return np.flatnonzero(self.sent)
+
+    def sent_arp_count(self):
+        """Number of ARP packets sent by the device"""
+        return int(np.count_nonzero(self.sent & self.arp))
+
+    def send_gaps(self):
+        """Seconds between successive packets sent by the device"""
+        return np.diff(self.time[self.sent])
+
+    def min_send_gap(self):
+        """Shortest time between two sent packets, None if fewer than two were sent"""
+        gaps = self.send_gaps()
+        return float(gaps.min()) if gaps.size else None
+
+    def send_rate(self):
+        """Packets and bytes per second sent by the device over the capture"""
+        duration = self.time[-1] - self.time[0] if self.time.size > 1 else 0
+        if not duration:
+            return 0.0, 0.0
+        sent_bytes = self.length[self.sent].sum()
+        return np.count_nonzero(self.sent) / duration, sent_bytes / duration
+
+    def class_counts(self):
+        """Counts of (unicast, broadcast, multicast) packets. Broadcasts are those
+        sent by the device, multicasts are any IPv4 multicast in the capture, and
+        the remaining sent packets are unicast."""
+        counts = np.bincount(self.dst_class[self.sent], minlength=3)
+        broadcast = int(counts[pcap_index.DST_BROADCAST])
+        multicast = int(np.count_nonzero(self.dst_class == pcap_index.DST_MULTICAST))
+        unicast = int(np.count_nonzero(self.sent)) - broadcast - multicast
+        return unicast, broadcast, multicast
+
+
+def load(pcap_file, device_address):
+    """Load the index of a capture and return it with its packet stats"""
+    index = pcap_index.load(pcap_file)
+    return index, PcapStats(index, device_address)
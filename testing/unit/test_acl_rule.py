@@ -0,0 +1,43 @@
+"""Unit tests for acl_rule"""
+
+import unittest
+
+from acl_rule import AclRule
+
+
+class TestAclRule(unittest.TestCase):
+    """Test class for AclRule"""
+
+    _FIELDS = {'dl_type': '0x800', 'nw_proto': 17,
+               'actions': {'allow': 1, 'output': {'ports': [1, 2]}}}
+
+    def test_interned(self):
+        """Test that identical rules share one instance"""
+        rule = AclRule(self._FIELDS)
+        self.assertIs(AclRule(dict(self._FIELDS)), rule)
+        self.assertIs(AclRule.from_dict({'rule': self._FIELDS}), rule)
+        self.assertEqual(rule.to_dict(), {'rule': self._FIELDS})
+        self.assertEqual(len({rule, AclRule(self._FIELDS)}), 1)
+
+    def test_bool_distinct(self):
+        """Test that True and 1 are kept apart, since they render differently"""
+        true_rule = AclRule({'actions': {'allow': True}})
+        one_rule = AclRule({'actions': {'allow': 1}})
+        self.assertIsNot(true_rule, one_rule)
+        self.assertIs(true_rule.actions['allow'], True)
+        self.assertNotEqual(AclRule({'ports': [['a', 1]]}), AclRule({'ports': [{'a': 1}]}))
+
+    def test_replace(self):
+        """Test that replace leaves the original rule untouched"""
+        rule = AclRule(self._FIELDS)
+        actions = rule.actions
+        actions['output']['ports'].append(3)
+        updated = rule.replace(actions=actions, dl_dst='ff:ff:ff:ff:ff:ff')
+        self.assertEqual(rule.actions['output']['ports'], [1, 2])
+        self.assertEqual(updated.get('dl_dst'), 'ff:ff:ff:ff:ff:ff')
+        self.assertEqual(updated.actions['output']['ports'], [1, 2, 3])
+        self.assertIsNone(rule.get('dl_dst'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""Unit tests for the batched dhcp control channel"""
+
+from importlib.machinery import SourceFileLoader
+import importlib.util
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+from dhcp_control import DhcpControl
+from wrappers import DaqException
+
+_SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '../../docker/include/network/scripts/dhcp_control')
+_SERVER_LOADER = SourceFileLoader('dhcp_control_server', _SERVER_SCRIPT)
+dhcp_control_server = importlib.util.module_from_spec(
+    importlib.util.spec_from_loader(_SERVER_LOADER.name, _SERVER_LOADER))
+_SERVER_LOADER.exec_module(dhcp_control_server)
+
+_CONFIG = """interface=gw01-eth0
+dhcp-range=10.20.7.100,10.20.7.254
+dhcp-option=6,10.20.7.2
+dhcp-host=*,ignore
+"""
+
+_LEASES = """1600000000 9a:02:57:1e:8f:01 10.20.7.101 * 01:9a:02:57:1e:8f:01
+1600000000 9a:02:57:1e:8f:02 10.20.7.102 * 01:9a:02:57:1e:8f:02
+"""
+
+_MAC1 = '9a:02:57:1e:8f:01'
+_MAC2 = '9a:02:57:1e:8f:02'
+
+
+# pylint: disable=protected-access
+class TestDhcpControl(unittest.TestCase):
+    """Test the dnsmasq config editor and its socket client"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._config_file = os.path.join(self._tmpdir, 'dnsmasq.conf')
+        leases_file = os.path.join(self._tmpdir, 'dnsmasq.leases')
+        with open(self._config_file, 'w') as config_fd:
+            config_fd.write(_CONFIG)
+        with open(leases_file, 'w') as leases_fd:
+            leases_fd.write(_LEASES)
+        self._config = dhcp_control_server.DnsmasqConfig(self._config_file, leases_file,
+                                                         local_if='gw01-eth0')
+        self._writes = 0
+        write_lines = self._config._write_lines
+
+        def count_writes(lines):
+            self._writes += 1
+            write_lines(lines)
+        self._config._write_lines = count_writes
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _read_config(self):
+        with open(self._config_file) as config_fd:
+            return config_fd.read().splitlines()
+
+    def test_batch_single_write(self):
+        """A batch of changes for several macs results in one config write"""
+        results = self._config.apply([
+            {'action': 'change_lease_time', 'args': ['120s']},
+            {'action': 'change_dhcp_response_time', 'args': [_MAC1, -1]},
+            {'action': 'change_dhcp_response_time', 'args': [_MAC2, -1]},
+            {'action': 'change_dhcp_response_time', 'args': [_MAC1, 0]},
+            {'action': 'new_ip', 'args': [_MAC1]}])
+        self.assertTrue(all(result['ok'] for result in results), results)
+        self.assertEqual(self._writes, 1)
+        self.assertEqual(self._read_config(), [
+            'interface=gw01-eth0',
+            'dhcp-range=10.20.7.100,10.20.7.254,120s',
+            'dhcp-option=6,10.20.7.2',
+            'dhcp-host=%s,ignore' % _MAC2,
+            'dhcp-host=%s,10.20.7.103' % _MAC1])
+
+        results = self._config.apply([{'action': 'new_ip', 'args': [_MAC1]},
+                                      {'action': 'change_lease_time', 'args': ['120s']}])
+        self.assertEqual(results[0]['output'],
+                         '%s current IP: 10.20.7.103 new IP: 10.20.7.104' % _MAC1)
+        self.assertIn('dhcp-host=%s,10.20.7.104' % _MAC1, self._read_config())
+        self.assertEqual(self._writes, 2)
+
+        self._config.apply([{'action': 'change_lease_time', 'args': ['120s']}])
+        self.assertEqual(self._writes, 2, 'unchanged config should not be rewritten')
+
+    def test_delayed_response(self):
+        """A delayed dhcp response is re-enabled by a later write"""
+        self._config.apply([{'action': 'change_dhcp_response_time', 'args': [_MAC1, 0.05]}])
+        self.assertIn('dhcp-host=%s,ignore' % _MAC1, self._read_config())
+        threading.Event().wait(0.5)
+        self.assertNotIn('dhcp-host=%s,ignore' % _MAC1, self._read_config())
+        self.assertEqual(self._writes, 2)
+
+    def test_socket_round_trip(self):
+        """Batches sent by the client are applied by the control server"""
+        socket_file = os.path.join(self._tmpdir, 'dhcp_control.sock')
+        server = dhcp_control_server.DhcpControlServer(socket_file, self._config)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        client = DhcpControl('test', socket_file)
+        try:
+            client.connect()
+            results = client.send([('change_dhcp_response_time', _MAC1, -1),
+                                   ('change_dhcp_response_time', _MAC2, -1)])
+            self.assertEqual([result['ok'] for result in results], [True, True])
+            results = client.send([('unknown_action', _MAC1), ('new_ip', _MAC2)])
+            self.assertEqual([result['ok'] for result in results], [False, True])
+            self.assertEqual(self._writes, 2)
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+        self.assertIn('dhcp-host=%s,ignore' % _MAC1, self._read_config())
+        self.assertIn('dhcp-host=%s,10.20.7.103' % _MAC2, self._read_config())
+
+    def test_missing_socket(self):
+        """Sending fails right away without a socket, while connect waits for it"""
+        socket_file = os.path.join(self._tmpdir, 'dhcp_control.sock')
+        client = DhcpControl('test', socket_file)
+        with self.assertRaises(OSError):
+            client.send([('new_ip', _MAC1)])
+        with self.assertRaisesRegex(DaqException, 'not found'):
+            client.connect(timeout_sec=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+"""Unit tests for dhcp_monitor packet decoding"""
+
+import socket
+import struct
+import unittest
+
+from dhcp_monitor import DhcpEvent, decode_packet
+
+DEVICE_MAC = bytes.fromhex('9a02571e8f01')
+GATEWAY_MAC = bytes.fromhex('0242ac110002')
+BROADCAST_MAC = b'\xff' * 6
+
+
+def _ether(dst, src, eth_type, payload):
+    return dst + src + struct.pack('!H', eth_type) + payload
+
+
+def _dhcp_frame(message_type, your_ip='0.0.0.0', sport=67, dport=68):
+    bootp = struct.pack('!BBBBIHH', 2, 1, 6, 0, 0x1234, 0, 0)
+    bootp += socket.inet_aton('0.0.0.0') + socket.inet_aton(your_ip)
+    bootp += socket.inet_aton('0.0.0.0') * 2
+    bootp += DEVICE_MAC + b'\x00' * 10 + b'\x00' * 192
+    bootp += b'\x63\x82\x53\x63' + bytes([0, 53, 1, message_type, 255])
+    udp = struct.pack('!HHHH', sport, dport, 8 + len(bootp), 0) + bootp
+    ip_header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(udp), 0, 0, 64, 17, 0,
+                            socket.inet_aton('10.20.0.1'), socket.inet_aton('255.255.255.255'))
+    return _ether(BROADCAST_MAC, GATEWAY_MAC, 0x0800, ip_header + udp)
+
+
+def _arp_frame(dst, operation, sender_ip):
+    arp = struct.pack('!HHBBH', 1, 0x0800, 6, 4, operation)
+    arp += GATEWAY_MAC + socket.inet_aton(sender_ip) + b'\x00' * 6 + socket.inet_aton('10.20.0.5')
+    return _ether(dst, GATEWAY_MAC, 0x0806, arp)
+
+
+class TestDhcpDecode(unittest.TestCase):
+    """Test class for DHCP and ARP packet decoding"""
+
+    def test_dhcp_ack(self):
+        """Test decoding of a DHCP ACK with an assigned address"""
+        event = decode_packet(_dhcp_frame(5, your_ip='10.20.0.5'))
+        self.assertEqual(event, DhcpEvent('dhcp', '9a:02:57:1e:8f:01', '10.20.0.5', 'ACK'))
+
+    def test_dhcp_discover(self):
+        """Test decoding of a DHCP packet without an assigned address"""
+        event = decode_packet(_dhcp_frame(1, sport=68, dport=67))
+        self.assertEqual(event, DhcpEvent('dhcp', '9a:02:57:1e:8f:01', None, 'Discover'))
+
+    def test_arp(self):
+        """Test decoding of broadcast requests and replies"""
+        request = decode_packet(_arp_frame(BROADCAST_MAC, 1, '10.20.0.1'))
+        self.assertEqual(request, DhcpEvent('arp', '02:42:ac:11:00:02', '10.20.0.1', None))
+        reply = decode_packet(_arp_frame(DEVICE_MAC, 2, '10.20.0.1'))
+        self.assertEqual(reply, DhcpEvent('arp', '02:42:ac:11:00:02', '10.20.0.1', None))
+        self.assertIsNone(decode_packet(_arp_frame(DEVICE_MAC, 1, '10.20.0.1')))
+
+    def test_unrelated(self):
+        """Test that other and truncated traffic is ignored"""
+        self.assertIsNone(decode_packet(_dhcp_frame(5, sport=53, dport=53)))
+        self.assertIsNone(decode_packet(_dhcp_frame(5)[:60]))
+        self.assertIsNone(decode_packet(_ether(BROADCAST_MAC, GATEWAY_MAC, 0x86dd, b'')))
+
+
+if __name__ == '__main__':
+    unittest.main()
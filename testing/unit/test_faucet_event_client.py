@@ -0,0 +1,96 @@
+"""Unit tests for faucet_event_client"""
+
+import json
+import os
+import socket
+import time
+import unittest
+
+from python_lib.faucet_event_client import FaucetEventClient
+from wrappers import DisconnectedException
+
+
+class TestFaucetEventClient(unittest.TestCase):
+    """Test event parsing and queueing of the faucet event client"""
+
+    def setUp(self):
+        os.environ.setdefault('FAUCET_EVENT_SOCK', '/dev/null')
+        self._connect({'port_debounce_sec': 0})
+
+    def tearDown(self):
+        self._server.close()
+        if self.client.sock:
+            self.client.close()
+
+    def _connect(self, config):
+        self.client = FaucetEventClient(config)
+        self.client.sock, self._server = socket.socketpair()
+
+    def _send(self, *events):
+        self._server.sendall(b''.join(json.dumps(event).encode() + b'\n' for event in events))
+
+    def _drain(self):
+        events = []
+        event = self.client.next_event()
+        while event:
+            events.append(event)
+            event = self.client.next_event()
+        return events
+
+    def test_partial_events(self):
+        """Events split across reads are only returned once complete"""
+        data = json.dumps({'dp_id': 1, 'L2_LEARN': {'port_no': 2, 'eth_src': 'x',
+                                                    'vid': 1001}}).encode() + b'\n'
+        self._server.sendall(data[:10])
+        self.assertIsNone(self.client.next_event())
+        self._server.sendall(data[10:] + b'{"dp_id": 1, "CONFIG')
+        self.assertEqual(self.client.as_port_learn(self.client.next_event()),
+                         (1, 2, 'x', 1001))
+        self.assertIsNone(self.client.next_event())
+        self._server.sendall(b'_CHANGE": {"restart_type": "warm"}}\n')
+        self.assertEqual(self.client.as_config_change(self.client.next_event()), (1, 'warm'))
+
+    def test_ports_status(self):
+        """A ports status burst is expanded in place, ahead of later events"""
+        num_ports = 500
+        status = {port: port % 2 == 0 for port in range(1, num_ports + 1)}
+        self._send({'dp_id': 1, 'PORTS_STATUS': status},
+                   {'dp_id': 1, 'CONFIG_CHANGE': {'restart_type': 'cold'}})
+        events = self._drain()
+        self.assertEqual(len(events), num_ports + 1)
+        states = [self.client.as_port_state(event) for event in events[:num_ports]]
+        self.assertEqual(states, [(1, port, status[port]) for port in status])
+        self.assertEqual(self.client.as_config_change(events[-1]), (1, 'cold'))
+
+    def test_port_debounce(self):
+        """Inactive ports are reported after the debounce delay, unless they come back"""
+        self.tearDown()
+        self._connect({'port_debounce_sec': 1})
+        for port in range(1, 49):
+            self._send({'dp_id': 1, 'PORT_CHANGE': {'port_no': port, 'status': False,
+                                                    'reason': 'MODIFY'}})
+        self._send({'dp_id': 1, 'PORT_CHANGE': {'port_no': 1, 'status': True,
+                                                'reason': 'MODIFY'}})
+        events = self._drain()
+        self.assertEqual([self.client.as_port_state(event) for event in events], [(1, 1, True)])
+        stats = self.client.get_debounce_stats()
+        self.assertEqual(stats['pending'], 47)
+        self.assertEqual(stats['cancelled'], 1)
+        self.assertLessEqual(stats['next_sec'], 1)
+
+        time.sleep(1.1)
+        events = self._drain()
+        self.assertEqual([self.client.as_port_state(event) for event in events],
+                         [(1, port, False) for port in range(2, 49)])
+        self.assertEqual(self.client.get_debounce_stats(),
+                         {'pending': 0, 'next_sec': None, 'fired': 47, 'cancelled': 1})
+
+    def test_disconnect(self):
+        """A closed socket raises a disconnected exception"""
+        self._server.shutdown(socket.SHUT_WR)
+        with self.assertRaises(DisconnectedException):
+            self.client.next_event()
+
+
+if __name__ == '__main__':
+    unittest.main()
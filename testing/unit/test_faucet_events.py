@@ -0,0 +1,49 @@
+"""Unit tests for the faucet_events recorder and load generator"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import faucet_events
+
+
+class TestFaucetEvents(unittest.TestCase):
+    """Test synthesized recordings and their replay"""
+
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        self._recording = os.path.join(self._tmpdir, 'events.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def test_generate(self):
+        """A synthesized workload is written in time order with the expected events"""
+        faucet_events.generate(self._recording, faucet_events.Workload(
+            2, 4, 2.0, 1.5, flap_rate=0.5, hosts=2))
+        header, events = faucet_events.read_recording(self._recording)
+        self.assertIn('2x4', header['source'])
+        events = list(events)
+        offsets = [offset for offset, _ in events]
+        self.assertEqual(offsets, sorted(offsets))
+        self.assertTrue(all(offset < 1.5 for offset in offsets))
+        count = {}
+        for _, event in events:
+            kind = event.split(b'"')[3].decode()
+            count[kind] = count.get(kind, 0) + 1
+        # 3 learns per port in 1.5s, but with staggering only 6 of the 8 ports get to
+        # flap (down and up) within their first 2s interval.
+        self.assertEqual(count, {'PORTS_STATUS': 2, 'L2_LEARN': 24, 'PORT_CHANGE': 12})
+
+    def test_bench(self):
+        """Benchmarking replays the whole recording through the event client"""
+        faucet_events.generate(self._recording, faucet_events.Workload(2, 4, 2.0, 1.5))
+        results = faucet_events.bench(self._recording, speed=10)
+        # Each ports status is expanded into a port change per port.
+        self.assertEqual(results['events'], 2 * 4 + 24)
+        self.assertIn('latency_ms', results)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""Unit tests for gateway_pool"""
+
+import queue
+import threading
+import unittest
+
+from gateway_pool import GatewayInitializer, GatewayPool
+
+
+class FakeGateway:
+    """Fake gateway that tracks how many initializations overlap"""
+
+    lock = threading.Lock()
+    active = 0
+    max_active = 0
+
+    def __init__(self, name, fail=False):
+        self.name = name
+        self.fail = fail
+        self.monitors_started = False
+
+    def initialize_hosts(self):
+        """Pretend to bring up hosts"""
+        with self.lock:
+            FakeGateway.active += 1
+            FakeGateway.max_active = max(FakeGateway.max_active, FakeGateway.active)
+        threading.Event().wait(0.05)
+        with self.lock:
+            FakeGateway.active -= 1
+        if self.fail:
+            raise Exception('warmup ping failure')
+
+    def start_monitors(self):
+        """Main thread part of initialization"""
+        assert threading.current_thread() is threading.main_thread()
+        self.monitors_started = True
+
+    def __repr__(self):
+        return self.name
+
+
+class TestGatewayInitializer(unittest.TestCase):
+    """Test class for GatewayInitializer"""
+
+    def setUp(self):
+        self.notifications = queue.Queue()
+        self.initializer = GatewayInitializer(2, self.notifications.put)
+
+    def tearDown(self):
+        self.initializer.shutdown()
+
+    def _run_notifications(self, count):
+        for _ in range(count):
+            self.notifications.get(timeout=5)()
+
+    def test_background_init(self):
+        """Test gateways are initialized concurrently, up to the limit"""
+        results = []
+        gateways = [FakeGateway('gw%02d' % index) for index in range(4)]
+        for gateway in gateways:
+            self.initializer.start(gateway, lambda gw, e: results.append((gw, e)))
+        self.initializer.when_ready(gateways[0], lambda gw, e: results.append(('waiter', e)))
+        self.assertTrue(self.initializer.is_pending(gateways[0]))
+        self._run_notifications(len(gateways))
+        self.assertEqual(FakeGateway.max_active, 2)
+        self.assertEqual(len(results), 5)
+        self.assertIn(('waiter', None), results)
+        self.assertTrue(all(gateway.monitors_started for gateway in gateways))
+        self.assertFalse(self.initializer.is_pending(gateways[0]))
+
+        ready = []
+        self.initializer.when_ready(gateways[0], lambda gw, e: ready.append(gw))
+        self.assertEqual(ready, [gateways[0]])
+
+    def test_init_failure(self):
+        """Test initialization errors are passed to callbacks"""
+        errors = []
+        gateway = FakeGateway('gw01', fail=True)
+        self.initializer.start(gateway, lambda gw, e: errors.append(str(e)))
+        self._run_notifications(1)
+        self.assertEqual(errors, ['warmup ping failure'])
+        self.assertFalse(gateway.monitors_started)
+
+    def test_shutdown(self):
+        """Test queued initializations are cancelled on shutdown"""
+        errors = []
+        self.initializer.shutdown()
+        self.initializer = GatewayInitializer(1, self.notifications.put)
+        gateways = [FakeGateway('gw%02d' % index) for index in range(3)]
+        for gateway in gateways:
+            self.initializer.start(gateway, lambda gw, e: errors.append(type(e).__name__))
+        while not FakeGateway.active:
+            threading.Event().wait(0.001)
+        self.initializer.shutdown()
+        self._run_notifications(len(gateways))
+        self.assertEqual(errors.count('CancelledError'), 2)
+        self.assertTrue(gateways[0].monitors_started)
+
+
+class TestGatewayPool(unittest.TestCase):
+    """Test class for GatewayPool"""
+
+    def test_pool(self):
+        """Test gateways are handed out oldest first, with hit counters"""
+        pool = GatewayPool(2)
+        first, second = FakeGateway('gw01'), FakeGateway('gw02')
+        self.assertTrue(pool.needs_fill())
+        pool.add(first)
+        pool.add(second, recycled=True)
+        self.assertFalse(pool.needs_fill())
+        self.assertIs(pool.take(), first)
+        pool.discard(second)
+        self.assertIsNone(pool.take())
+        self.assertEqual(pool.get_stats(), {
+            'size': 2, 'idle': 0, 'hits': 1, 'misses': 1, 'recycled': 1})
+        pool.add(first)
+        self.assertEqual(pool.drain(), [first])
+        self.assertFalse(pool)
+
+
+if __name__ == '__main__':
+    unittest.main()
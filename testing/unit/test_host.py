@@ -0,0 +1,153 @@
+"""Unit tests for parallel test modules in ConnectedHost"""
+
+from datetime import datetime, timedelta
+import unittest
+from unittest.mock import ANY, MagicMock
+
+from host import ConnectedHost, MODE, _STATE
+
+
+class FakeGateway:
+    """Fake gateway with a fixed number of test ports"""
+
+    def __init__(self, num_ports):
+        self._num_ports = num_ports
+        self.test_ports = set()
+
+    def allocate_test_port(self):
+        """Allocate the lowest free test port"""
+        test_port = min(set(range(1, self._num_ports + 1)) - self.test_ports)
+        self.test_ports.add(test_port)
+        return test_port
+
+    def free_test_ports(self):
+        """Return the number of unallocated test ports"""
+        return self._num_ports - len(self.test_ports)
+
+    def release_test_port(self, test_port):
+        """Release an allocated test port"""
+        assert test_port in self.test_ports, 'test port not allocated'
+        self.test_ports.remove(test_port)
+
+
+class FakeModule:
+    """Fake test module that completes when its callback is invoked"""
+
+    def __init__(self, test_name):
+        self.host_name = test_name
+        self.port = None
+        self.start_time = None
+        self.callback = None
+        self.terminated = False
+
+    def start(self, port, _params, callback, _finish_hook):
+        """Start the module on the given test port"""
+        self.port = port
+        self.callback = callback
+        self.start_time = datetime.now()
+
+    def heartbeat(self):
+        """Module heartbeat"""
+
+    def terminate(self):
+        """Terminate the module"""
+        self.terminated = True
+
+
+# pylint: disable=protected-access
+class TestHostParallel(unittest.TestCase):
+    """Test scheduling of parallel-safe test modules next to sequential ones"""
+
+    def setUp(self):
+        self.modules = {}
+        self.record_result = MagicMock()
+        self.host = None
+
+    def _make_host(self, tests, parallel, num_ports=3):
+        # Skip the constructor, which loads configs and sets up device directories.
+        host = ConnectedHost.__new__(ConnectedHost)
+        host.logger = MagicMock()
+        host.runner = MagicMock()
+        host.gateway = FakeGateway(num_ports)
+        host.config = {'test_metadata': {}}
+        host._loaded_config = {'modules': {
+            test: {'parallel': test in parallel, 'timeout_sec': 60} for test in tests}}
+        host._default_timeout_sec = None
+        host._no_test = False
+        host.scan_base = 'scans'
+        host.state = _STATE.NEXT
+        host.test_name = None
+        host.test_host = None
+        host.test_port = None
+        host.remaining_tests = list(tests)
+        host._parallel_tests = {}
+        host._new_test = lambda test, root_name=None: self.modules.setdefault(
+            test, FakeModule(test))
+        for method in ('_write_module_config', '_host_tmp_path', '_accumulate_result',
+                       '_get_module_params', '_monitor_scan', '_monitor_cleanup'):
+            setattr(host, method, MagicMock())
+        host._record_result = self.record_result
+        host._collect_module_files = MagicMock(return_value={})
+        self.host = host
+
+    def tearDown(self):
+        if self.host:
+            self.host.runner.target_set_error.assert_not_called()
+
+    def test_parallel_alongside_sequential(self):
+        """A parallel test starts while the sequential test ahead of it is running"""
+        self._make_host(['seq1', 'par', 'seq2'], parallel=['par'])
+        self.host._run_next_test()
+        self.assertEqual(self.host.test_name, 'seq1')
+        self.assertEqual(self.modules['seq1'].port, 1)
+        self.assertEqual(self.modules['par'].port, 2)
+        self.assertIn('par', self.host._parallel_tests)
+        self.assertEqual(self.host.remaining_tests, ['seq2'])
+
+    def test_test_port_kept_free(self):
+        """Parallel tests are deferred rather than take the last free test port"""
+        self._make_host(['seq1', 'par1', 'par2', 'seq2'], parallel=['par1', 'par2'])
+        self.host._run_next_test()
+        self.assertEqual(self.host.gateway.free_test_ports(), 1)
+        self.assertNotIn('par2', self.modules)
+        self.assertEqual(self.host.remaining_tests, ['par2', 'seq2'])
+
+        self.modules['seq1'].callback(return_code=0)
+        self.assertEqual(self.host.test_name, 'seq2')
+        self.assertIn('par2', self.host._parallel_tests)
+        self.assertEqual(self.host.remaining_tests, [])
+
+    def test_wait_for_parallel(self):
+        """The device is not done until outstanding parallel tests call back"""
+        self._make_host(['par', 'seq'], parallel=['par'])
+        self.host._run_next_test()
+        self.assertEqual(self.host.test_name, 'seq')
+
+        self.modules['seq'].callback(return_code=0)
+        self.assertEqual(self.host.state, _STATE.NEXT)
+        self.assertIn('par', self.host._parallel_tests)
+
+        self.modules['par'].callback(return_code=0)
+        self.assertEqual(self.host.state, _STATE.DONE)
+        self.assertEqual(self.host.gateway.test_ports, set())
+        self.record_result.assert_any_call('par', started=ANY, state=MODE.DONE,
+                                           code=0, exception=None)
+
+    def test_parallel_timeout(self):
+        """A timed out parallel test is terminated and releases its test port"""
+        self._make_host(['par', 'seq'], parallel=['par'])
+        self.host._run_next_test()
+        self.assertEqual(self.host.gateway.test_ports, {1, 2})
+
+        self.modules['par'].start_time = datetime.now() - timedelta(seconds=61)
+        self.host._parallel_heartbeat()
+        self.assertTrue(self.modules['par'].terminated)
+        self.assertNotIn('par', self.host._parallel_tests)
+        self.assertEqual(self.host.gateway.test_ports, {self.modules['seq'].port})
+        self.record_result.assert_called_with(
+            'par', started=ANY, state=MODE.MERR, code=None,
+            exception=ConnectedHost._TIMEOUT_EXCEPTION)
+
+
+if __name__ == '__main__':
+    unittest.main()
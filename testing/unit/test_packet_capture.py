@@ -0,0 +1,108 @@
+"""Unit tests for packet_capture"""
+
+import functools
+import os
+import socket
+import struct
+import tempfile
+import time
+import unittest
+
+from packet_capture import CapturedPacket, PacketCapture, PcapWriter
+
+FRAME = bytes.fromhex('ffffffffffff020000000001') + b'\x88\xb5' + b'payload' * 8
+
+
+class TestPacketCapture(unittest.TestCase):
+    """Test class for in-process packet capture"""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        self.pcap_file = os.path.join(self._temp_dir.name, 'test.pcap')
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _read_pcap(self, pcap_file=None):
+        with open(pcap_file or self.pcap_file, 'rb') as stream:
+            data = stream.read()
+        magic, _, _, _, _, _, linktype = struct.unpack_from('=IHHiIII', data)
+        self.assertEqual(magic, 0xa1b2c3d4)
+        self.assertEqual(linktype, 1)
+        offset, frames = 24, []
+        while offset < len(data):
+            _, _, incl_len, _ = struct.unpack_from('=IIII', data, offset)
+            frames.append(data[offset + 16:offset + 16 + incl_len])
+            offset += 16 + incl_len
+        return frames
+
+    def test_pcap_writer(self):
+        """Test pcap file output"""
+        writer = PcapWriter(self.pcap_file)
+        writer.write(time.time(), FRAME)
+        writer.write(time.time(), memoryview(FRAME)[:20], len(FRAME))
+        writer.close()
+        self.assertEqual(self._read_pcap(), [FRAME, FRAME[:20]])
+
+    def test_captured_packet(self):
+        """Test ethernet field decoding"""
+        packet = CapturedPacket(0, 0, FRAME)
+        self.assertEqual(packet.eth_dst, 'ff:ff:ff:ff:ff:ff')
+        self.assertEqual(packet.eth_src, '02:00:00:00:00:01')
+        self.assertEqual(packet.ethertype, 0x88b5)
+
+    @staticmethod
+    def _on_packet(packets, packet):
+        if packet.ethertype == 0x88b5:
+            packets.append(packet)
+
+    def test_loopback_capture(self):
+        """Test ring and recv capture on the loopback interface"""
+        for use_ring in (True, False):
+            packets = []
+            try:
+                capture = PacketCapture('lo', pcap_out=self.pcap_file, direction='out',
+                                        callback=functools.partial(self._on_packet, packets),
+                                        use_ring=use_ring)
+                sender = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+            except PermissionError:
+                self.skipTest('raw sockets not permitted')
+            with sender:
+                sender.bind(('lo', 0))
+                for _ in range(3):
+                    sender.send(FRAME)
+            deadline = time.time() + 2
+            while len(packets) < 3 and time.time() < deadline:
+                capture.process()
+                time.sleep(0.01)
+            capture.terminate()
+            self.assertTrue(capture.closed)
+            self.assertEqual([packet.data for packet in packets], [FRAME] * 3)
+            self.assertEqual(self._read_pcap().count(FRAME), 3)
+
+    def test_rotate_segments(self):
+        """Test splitting one capture into per-phase pcap files"""
+        second_file = os.path.join(self._temp_dir.name, 'second.pcap')
+        try:
+            capture = PacketCapture('lo', pcap_out=self.pcap_file, direction='out')
+            sender = socket.socket(socket.AF_PACKET, socket.SOCK_RAW)
+        except PermissionError:
+            self.skipTest('raw sockets not permitted')
+        with sender:
+            sender.bind(('lo', 0))
+            sender.send(FRAME)
+            sender.send(FRAME)
+            capture.rotate(second_file, timeout=60)
+            sender.send(FRAME)
+        deadline = time.time() + 1
+        while time.time() < deadline:
+            capture.process()
+            time.sleep(0.01)
+        self.assertFalse(capture.expired())
+        capture.terminate()
+        self.assertEqual(self._read_pcap().count(FRAME), 2)
+        self.assertEqual(self._read_pcap(second_file).count(FRAME), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
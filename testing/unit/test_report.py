@@ -1,11 +1,63 @@
 """Unit tests for report"""
 
+from concurrent import futures
+import os
+import shutil
+import tempfile
+import threading
 import unittest
+from unittest.mock import MagicMock, patch
+
 from daq.report import MdTable
+import host
+import report
+import report_renderer
+
+
+class PendingRenderer:
+    """Renderer stub that leaves pdf futures pending until completed by the test"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, _md_path, pdf_path, _copy_paths=()):
+        """Return a pending future for the pdf path"""
+        future = futures.Future()
+        self.futures.append((future, pdf_path))
+        return future
+
+
+class ThreadRenderer:
+    """Renderer stub that runs render_pdf on threads instead of worker processes"""
+
+    def __init__(self):
+        self._executor = futures.ThreadPoolExecutor(max_workers=2)
+
+    def submit(self, md_path, pdf_path, copy_paths=()):
+        """Start rendering a pdf report on a thread"""
+        return self._executor.submit(report_renderer.render_pdf, md_path, pdf_path, copy_paths)
+
+    def shutdown(self):
+        """Wait for renders to finish"""
+        self._executor.shutdown(wait=True)
+
 
 class TestReport(unittest.TestCase):
     """Test class for Report"""
 
+    def setUp(self):
+        self._tmpdir = tempfile.mkdtemp()
+        patcher = patch.object(report, 'REPORT_BASE_DIR', self._tmpdir)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        shutil.rmtree(self._tmpdir)
+
+    def _generator(self, target_mac, renderer):
+        return report.ReportGenerator({'site_path': self._tmpdir}, target_mac, {},
+                                      MagicMock(), None, renderer=renderer)
+
     def test_render(self):
         """Test md table render"""
         table = MdTable(['a', 'b', 'c'])
@@ -18,6 +70,58 @@ class TestReport(unittest.TestCase):
 """
         self.assertEqual(expected, table.render())
 
+    # pylint: disable=protected-access
+    def test_pending_render(self):
+        """The host records terminate only once the pdf render completes"""
+        renderer = PendingRenderer()
+        callbacks = []
+        connected_host = host.ConnectedHost.__new__(host.ConnectedHost)
+        connected_host.logger = MagicMock()
+        connected_host.runner = MagicMock()
+        connected_host.runner.queue_callback = callbacks.append
+        connected_host.record_result = MagicMock()
+        connected_host._upload_file = lambda path: path
+        connected_host._trigger_path = None
+        connected_host._report = self._generator('9a:02:57:1e:8f:01', renderer)
+
+        connected_host._finalize_report()
+        self.assertEqual(len(renderer.futures), 1)
+        pdf_future, pdf_path = renderer.futures[0]
+        self.assertFalse(pdf_future.done())
+        connected_host.record_result.assert_not_called()
+
+        pdf_future.set_result(pdf_path)
+        for callback in callbacks:
+            callback()
+        connected_host.record_result.assert_called_once()
+        args, kwargs = connected_host.record_result.call_args
+        self.assertEqual(args, ('terminate',))
+        self.assertEqual(kwargs['report_path.pdf'], pdf_path)
+
+    def test_concurrent_render(self):
+        """Concurrent pdf renders use distinct intermediate html files"""
+        html_paths = []
+        both_converting = threading.Barrier(2, timeout=10)
+
+        def convert_file(_md_path, _to, outputfile, **_kwargs):
+            html_paths.append(outputfile)
+            both_converting.wait()
+
+        renderer = ThreadRenderer()
+        with patch.object(report_renderer, 'pypandoc') as pypandoc, \
+                patch.object(report_renderer, 'weasyprint'), \
+                patch.object(report_renderer, '_stylesheet'):
+            pypandoc.convert_file.side_effect = convert_file
+            generators = [self._generator('9a:02:57:1e:8f:%02x' % num, renderer)
+                          for num in range(2)]
+            pdf_futures = [generator.finalize()[0]['report_path.pdf']
+                           for generator in generators]
+            renderer.shutdown()
+        for pdf_future in pdf_futures:
+            pdf_future.result()
+        self.assertEqual(len(set(html_paths)), 2)
+        self.assertFalse(any(map(os.path.exists, html_paths)))
+
 
 if __name__ == '__main__':
     unittest.main()
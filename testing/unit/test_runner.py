@@ -10,7 +10,7 @@ from unittest.mock import MagicMock, mock_open, patch
 import network
 
 from daq.host import ConnectedHost
-from daq.runner import DAQRunner, configurator
+from daq.runner import DAQRunner, PortInfo, configurator
 from daq.proto.session_server_pb2 import SessionParams
 
 LOGGER = logging.getLogger()
@@ -95,6 +95,38 @@ class TestRunner(unittest.TestCase):
         host.get_port_flap_timeout.assert_called_with(host.test_name)
         self.runner.target_set_error.assert_called()
 
+    def test_device_indexes(self):
+        """Test device lookups track attribute changes and removal"""
+        devices = self.runner._devices
+        device1 = devices.new_device("0000000001", None)
+        device2 = devices.new_device("0000000002", port_info=device1.port)
+        gateway = object()
+        device1.gateway = gateway
+        device2.gateway = gateway
+        device2.group = 'group'
+        device2.host = True
+
+        self.assertEqual(devices.get_by_port_info(device1.port), device1)
+        self.assertEqual(devices.get_by_gateway(gateway), [device1, device2])
+        self.assertEqual(devices.get_by_group('group'), [device2])
+        self.assertEqual(devices.get_triggered_devices(), [device2])
+
+        device1.gateway = None
+        device2.host = None
+        self.assertEqual(devices.get_by_gateway(gateway), [device2])
+        self.assertEqual(devices.get_triggered_devices(), [])
+
+        devices.remove(device1)
+        self.assertEqual(devices.get_by_port_info(device2.port), device2)
+        old_port = device2.port
+        device2.port = PortInfo()
+        self.assertEqual(devices.get_by_port_info(device2.port), device2)
+        self.assertIsNone(devices.get_by_port_info(old_port))
+        devices.remove(device2)
+        self.assertEqual(devices.get_by_gateway(gateway), [])
+        self.assertEqual(devices.get_by_group('group'), [])
+        self.assertIsNone(devices.get_by_port_info(device2.port))
+
     def test_target_set_queue_capacity(self):
         """Test the target set running queue"""
         self.runner._system_active = True
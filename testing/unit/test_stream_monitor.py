@@ -0,0 +1,149 @@
+"""Unit tests for stream_monitor"""
+
+import asyncio
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from async_monitor import AsyncStreamMonitor, run_command
+from stream_monitor import StreamMonitor
+
+
+class TestStreamMonitor(unittest.TestCase):
+    """Test class for StreamMonitor"""
+
+    def setUp(self):
+        self.monitor = StreamMonitor(timeout_sec=1)
+        self.pipes = []
+
+    def tearDown(self):
+        for read_fd, write_fd in self.pipes:
+            for fd in (read_fd, write_fd):
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+
+    def _pipe(self):
+        pipe = os.pipe()
+        self.pipes.append(pipe)
+        return pipe
+
+    def test_priority_order(self):
+        """Test that higher priority fds are serviced first"""
+        order = []
+        low_read, low_write = self._pipe()
+        high_read, high_write = self._pipe()
+
+        def make_callback(name, fd):
+            def callback():
+                os.read(fd, 1024)
+                order.append(name)
+            return callback
+
+        self.monitor.monitor('low', low_read, make_callback('low', low_read), priority=1)
+        self.monitor.monitor('high', high_read, make_callback('high', high_read), priority=10)
+        os.write(low_write, b'x')
+        os.write(high_write, b'x')
+        self.assertTrue(self.monitor.event_loop())
+        self.assertEqual(order, ['high', 'low'])
+        self.assertEqual(self.monitor.get_stats()['callbacks'], 2)
+
+    def test_hangup_and_forget(self):
+        """Test hangup handling removes the monitor"""
+        hangups = []
+        read_fd, write_fd = self._pipe()
+        stream = os.fdopen(read_fd, 'rb', buffering=0)
+        self.monitor.monitor('hup', stream, lambda: stream.read(1024),
+                             hangup=lambda: hangups.append(True))
+        self.assertEqual(self.monitor.log_monitors(), 1)
+        os.close(write_fd)
+        self.assertFalse(self.monitor.event_loop())
+        self.assertEqual(hangups, [True])
+        self.assertEqual(self.monitor.log_monitors(), 0)
+        self.assertFalse(self.monitor.fd_priority)
+
+    def test_stats_reset(self):
+        """Test loop counters and reset"""
+        read_fd, write_fd = self._pipe()
+        self.monitor.monitor('data', read_fd, lambda: os.read(read_fd, 1024))
+        os.write(write_fd, b'x')
+        self.monitor.event_loop()
+        stats = self.monitor.get_stats(reset=True)
+        self.assertEqual(stats['loops'], 1)
+        self.assertEqual(stats['monitors'], 1)
+        self.assertEqual(self.monitor.get_stats()['loops'], 0)
+
+    def test_request_wakeup(self):
+        """Test that a requested wakeup shortens the poll timeout"""
+        read_fd, _ = self._pipe()
+        monitor = StreamMonitor(timeout_sec=20)
+        monitor.monitor('idle', read_fd, lambda: os.read(read_fd, 1024))
+        monitor.request_wakeup(0.05)
+        monitor.request_wakeup(10)
+        start = time.monotonic()
+        self.assertTrue(monitor.event_loop())
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_wakeup(self):
+        """Test that another thread can interrupt a blocking poll"""
+        read_fd, _ = self._pipe()
+        hooks = []
+        monitor = StreamMonitor(timeout_sec=20, loop_hook=lambda: hooks.append(True))
+        monitor.monitor('idle', read_fd, lambda: os.read(read_fd, 1024))
+        timer = threading.Timer(0.05, monitor.wakeup)
+        timer.start()
+        start = time.monotonic()
+        self.assertTrue(monitor.event_loop())
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(len(hooks), 1)
+        self.assertEqual(monitor.get_stats()['callbacks'], 0)
+        timer.join()
+
+    def test_copy_to(self):
+        """Test raw passthrough copy of a stream into a text log"""
+        read_fd, write_fd = self._pipe()
+        payload = 'line \u00e9\n'.encode('utf-8') * 20000
+        with tempfile.NamedTemporaryFile('w') as log:
+            self.monitor.monitor('copy', read_fd, copy_to=log)
+            for offset in range(0, len(payload), 2**15 - 1):
+                os.write(write_fd, payload[offset:offset + 2**15 - 1])
+                self.monitor.event_loop()
+            self.monitor.forget(read_fd)
+            with open(log.name, 'rb') as result:
+                self.assertEqual(result.read(), payload)
+
+
+class TestAsyncStreamMonitor(unittest.TestCase):
+    """Test class for AsyncStreamMonitor"""
+
+    def test_callbacks_and_timers(self):
+        """Test fd callbacks, timers and background tasks run until streams are done"""
+        monitor = AsyncStreamMonitor(timeout_sec=1)
+        read_fd, write_fd = os.pipe()
+        stream = os.fdopen(read_fd, 'rb', buffering=0)
+        received = []
+        ticks = []
+        results = []
+
+        async def shell_out():
+            results.append(await run_command('echo', 'hello'))
+            await asyncio.sleep(0.05)
+            os.write(write_fd, b'data')
+            os.close(write_fd)
+
+        monitor.monitor('data', stream, lambda: received.append(stream.read(1024)))
+        monitor.add_timer('tick', 0.01, lambda: ticks.append(True))
+        monitor.spawn(shell_out(), 'shell')
+        monitor.run()
+
+        self.assertEqual(results, [(0, 'hello\n', '')])
+        self.assertEqual(received, [b'data'])
+        self.assertTrue(ticks)
+        self.assertEqual(monitor.log_monitors(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
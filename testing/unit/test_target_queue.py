@@ -0,0 +1,89 @@
+"""Unit tests for target_queue"""
+
+import unittest
+
+from target_queue import TargetSetQueue
+
+
+class FakePort:
+    """Fake device port info"""
+
+    def __init__(self, port_no):
+        self.port_no = port_no
+
+
+class FakeDevice:
+    """Fake device for queueing"""
+
+    def __init__(self, mac, port_no=None, group=None):
+        self.mac = mac
+        self.port = FakePort(port_no)
+        self.group = group
+
+    def __repr__(self):
+        return self.mac
+
+
+class TestTargetSetQueue(unittest.TestCase):
+    """Test class for TargetSetQueue"""
+
+    def _admit_all(self, queue):
+        admitted = []
+        queue.admit(lambda device: True, admitted.append)
+        return admitted
+
+    def test_first_seen_and_capacity(self):
+        """Test admission order, deferral and removal"""
+        queue = TargetSetQueue()
+        devices = [FakeDevice('mac%d' % num) for num in range(4)]
+        for device in devices:
+            queue.push(device)
+        self.assertIn(devices[2], queue)
+        self.assertTrue(queue.remove(devices[2]))
+        self.assertNotIn(devices[2], queue)
+        self.assertFalse(queue.remove(devices[2]))
+
+        admitted = []
+        queue.admit(lambda device: device is not devices[0], admitted.append,
+                    is_full=lambda: len(admitted) >= 1)
+        self.assertEqual(admitted, [devices[1]])
+        self.assertEqual(len(queue), 2)
+        self.assertEqual(self._admit_all(queue), [devices[0], devices[3]])
+
+        stats = queue.get_stats()
+        self.assertEqual(stats['depth'], 0)
+        self.assertEqual(stats['admitted'], 3)
+
+    def test_priorities(self):
+        """Test port, group and retry ordering"""
+        first = FakeDevice('first', port_no=3, group='b')
+        second = FakeDevice('second', port_no=1, group='a')
+        third = FakeDevice('third', port_no=2, group='b')
+        expected = {
+            'port': [second, third, first],
+            'group': [second, first, third],
+            'retry': [second, third, first]
+        }
+        for priority, order in expected.items():
+            queue = TargetSetQueue(priority)
+            if priority == 'retry':
+                queue.record_activation(first)
+            for device in (first, second, third):
+                queue.push(device)
+            self.assertEqual(self._admit_all(queue), order, priority)
+
+    def test_activation_history(self):
+        """Test that retry counts are only kept for recently activated devices"""
+        queue = TargetSetQueue('retry', max_history=2)
+        devices = [FakeDevice('mac%d' % num) for num in range(3)]
+        queue.record_activation(devices[0])
+        queue.record_activation(devices[1])
+        queue.record_activation(devices[0])
+        queue.record_activation(devices[2])
+        for device in devices:
+            queue.push(device)
+        self.assertEqual(self._admit_all(queue), [devices[1], devices[2], devices[0]])
+
+
+if __name__ == '__main__':
+    unittest.main()
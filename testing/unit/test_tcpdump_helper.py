@@ -0,0 +1,75 @@
+"""Unit tests for tcpdump_helper line reading"""
+
+import subprocess
+import sys
+import time
+import unittest
+
+from tcpdump_helper import TcpdumpHelper
+
+# Writes a multi-byte character split across two writes, then a burst of lines.
+_OUTPUT_SCRIPT = '''
+import os, sys, time
+out = sys.stdout.buffer
+out.write(b'tcpdump: verbose output suppressed\\nlistening on eth0, link-type EN10MB\\n')
+out.write('caf\\u00e9 one\\n'.encode('utf-8')[:4])
+out.flush()
+time.sleep(0.1)
+out.write('caf\\u00e9 one\\n'.encode('utf-8')[4:] + b'two\\nthree\\n' + b'x' * 100000 + b'\\ntail')
+'''
+
+_FAILED_SCRIPT = '''
+import sys
+sys.stdout.write('tcpdump: eth0: No such device exists\\n')
+'''
+
+
+class FakeHost:
+    """Fake mininet host that runs a script instead of tcpdump"""
+
+    def __init__(self, script=_OUTPUT_SCRIPT):
+        self._script = script
+
+    def popen(self, _cmd, **kwargs):
+        """Start the output script with the given pipe arguments"""
+        return subprocess.Popen([sys.executable, '-c', self._script], **kwargs)
+
+
+class TestTcpdumpHelper(unittest.TestCase):
+    """Test class for TcpdumpHelper"""
+
+    def test_blocking_lines(self):
+        """Test blocking line reads across chunk and character boundaries"""
+        helper = TcpdumpHelper(FakeHost(), '', intf_name='eth0', timeout=None)
+        lines = [helper.next_line() for _ in range(5)]
+        helper.pipe.wait()
+        self.assertEqual(lines[:3], ['café one\n', 'two\n', 'three\n'])
+        self.assertEqual(len(lines[3]), 100001)
+        self.assertEqual(lines[4], 'tail')
+        self.assertEqual(helper.next_line(), '')
+
+    def test_next_lines(self):
+        """Test non-blocking batch reads"""
+        helper = TcpdumpHelper(FakeHost(), '', intf_name='eth0', timeout=None, blocking=False)
+        lines = []
+        deadline = time.time() + 5
+        while (not lines or lines[-1] != 'tail') and time.time() < deadline:
+            lines.extend(helper.next_lines())
+            time.sleep(0.01)
+        helper.pipe.wait()
+        self.assertTrue(helper.started)
+        self.assertEqual(lines[:3], ['café one\n', 'two\n', 'three\n'])
+        self.assertEqual(lines[3:], ['x' * 100000 + '\n', 'tail'])
+
+    def test_next_lines_not_started(self):
+        """Test that batch reads report a tcpdump that exits without starting"""
+        helper = TcpdumpHelper(FakeHost(_FAILED_SCRIPT), '', intf_name='eth0', timeout=None,
+                               blocking=False)
+        helper.pipe.wait()
+        with self.assertRaisesRegex(AssertionError, 'No such device'):
+            for _ in range(100):
+                helper.next_lines()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+"""Unit tests for topology"""
+
+import os
+import tempfile
+import unittest
+
+from topology import FaucetTopology
+
+
+class FakeSwitch:
+    """Fake pri switch"""
+    name = 'pri'
+
+
+class FakeGateway:
+    """Fake gateway for a port set"""
+
+    def __init__(self, port_set):
+        self.port_set = port_set
+
+    def get_all_gw_ports(self):
+        """Return gateway ports"""
+        return []
+
+    def get_possible_test_ports(self):
+        """Return test ports"""
+        return []
+
+
+class FakePort:
+    """Fake device port info"""
+
+    def __init__(self, port_no):
+        self.port_no = port_no
+        self.vxlan = None
+
+
+class FakeDevice:
+    """Fake device for directing traffic"""
+
+    def __init__(self, mac, port_no):
+        self.mac = mac
+        self.vlan = None
+        self.port = FakePort(port_no)
+        self.gateway = FakeGateway(port_no)
+
+    def is_local(self):
+        """Device is on a local port"""
+        return True
+
+
+# pylint: disable=protected-access
+class TestTopology(unittest.TestCase):
+    """Test class for FaucetTopology acl generation"""
+
+    def setUp(self):
+        self._temp_dir = tempfile.TemporaryDirectory()
+        FaucetTopology.INST_FILE_PREFIX = self._temp_dir.name
+        config = {'switch_setup': {'uplink_port': 5, 'of_dpid': '2'}}
+        self.topology = FaucetTopology(config)
+        self.topology.initialize(FakeSwitch())
+        self.topology.flush_acls()
+
+    def tearDown(self):
+        self._temp_dir.cleanup()
+
+    def _port_file(self, port):
+        return os.path.join(self._temp_dir.name,
+                            FaucetTopology.PORT_ACL_FILE_FORMAT % ('sec', port))
+
+    def test_incremental_port_acls(self):
+        """Test that only changed port acls are rewritten"""
+        for port in range(1, 5):
+            self.assertTrue(os.path.exists(self._port_file(port)))
+            os.remove(self._port_file(port))
+        main_file = os.path.join(self._temp_dir.name, FaucetTopology.DP_ACL_FILE_FORMAT)
+        os.remove(main_file)
+
+        device = FakeDevice('9a:02:57:1e:8f:01', 2)
+        target = {'port': 2, 'port_set': 2, 'mac': device.mac}
+        self.topology.direct_port_traffic(device, 2, target)
+        self.assertEqual(sorted(self.topology.flush_acls()), [main_file, self._port_file(2)])
+        self.assertTrue(os.path.exists(self._port_file(2)))
+        self.assertTrue(os.path.exists(main_file))
+        for port in (1, 3, 4):
+            self.assertFalse(os.path.exists(self._port_file(port)))
+
+        os.remove(main_file)
+        self.topology.direct_port_traffic(device, 2, target)
+        self.assertFalse(self.topology.flush_acls())
+        self.assertFalse(os.path.exists(main_file))
+
+    def test_coalesced_acl_writes(self):
+        """Test that staged acl changes are coalesced until flushed"""
+        device = FakeDevice('9a:02:57:1e:8f:01', 3)
+        target = {'port': 3, 'port_set': 3, 'mac': device.mac}
+        with open(self._port_file(3)) as input_stream:
+            original = input_stream.read()
+
+        self.topology.direct_port_traffic(device, 3, target)
+        with open(self._port_file(3)) as input_stream:
+            self.assertEqual(input_stream.read(), original)
+
+        # Reverting before the flush cancels the staged write.
+        self.topology.direct_port_traffic(device, 3, None)
+        self.assertNotIn(self._port_file(3), self.topology.flush_acls())
+
+        self.topology.direct_port_traffic(device, 3, target)
+        self.assertIn(self._port_file(3), self.topology.flush_acls())
+        with open(self._port_file(3)) as input_stream:
+            self.assertNotEqual(input_stream.read(), original)
+        self.assertFalse([name for name in os.listdir(os.path.dirname(self._port_file(3)))
+                          if name.endswith('.tmp')])
+
+    def test_template_cache(self):
+        """Test acl templates are cached until the file changes"""
+        template_file = os.path.join(self._temp_dir.name, 'template_%s_acl.yaml')
+        self.topology.TEMPLATE_FILE_FORMAT = template_file
+        self.topology._device_specs = {'macAddrs': {}}
+        with open(template_file % 'lamp', 'w') as output_stream:
+            output_stream.write('acls:\n  "@from:template_lamp_acl":\n'
+                                '  - rule: {dl_src: "@mac:lamp", actions: {allow: 1}}\n')
+        template = self.topology._get_acl_template('lamp')
+        self.assertIs(self.topology._get_acl_template('lamp'), template)
+        self.assertTrue(template.from_rules[0].mac_src)
+        self.assertIsNone(template.to_keys)
+
+        with open(template_file % 'lamp', 'a') as output_stream:
+            output_stream.write('  - rule: {dl_type: "0x0800", actions: {allow: 0}}\n')
+        template = self.topology._get_acl_template('lamp')
+        self.assertEqual(len(template.from_rules), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
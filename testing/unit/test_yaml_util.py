@@ -0,0 +1,36 @@
+"""Unit tests for yaml_util"""
+
+import unittest
+
+import yaml
+
+import yaml_util
+
+
+class TestYamlUtil(unittest.TestCase):
+    """Test class for yaml_util"""
+
+    _DATA = {
+        'acls': {
+            'port_1': [{'rule': {'dl_src': '9a:02:57:1e:8f:01', 'vlan_vid': '0x0000/0x1000',
+                                 'actions': {'allow': True, 'output': {'ports': [1, 2]}}}},
+                       {'rule': {'dl_type': '0x800', 'nw_proto': 17, 'actions': {'allow': 1}}}]
+        },
+        'name': 'café',
+        'empty': None
+    }
+
+    def test_dump_matches_pure_python(self):
+        """Test that emitted yaml is identical to yaml.safe_dump"""
+        self.assertEqual(yaml_util.safe_dump(self._DATA), yaml.safe_dump(self._DATA))
+        self.assertEqual(yaml_util.safe_dump(self._DATA, default_flow_style=False),
+                         yaml.safe_dump(self._DATA, default_flow_style=False))
+
+    def test_round_trip(self):
+        """Test that load reverses dump"""
+        self.assertEqual(yaml_util.safe_load(yaml_util.safe_dump(self._DATA)), self._DATA)
+        self.assertIsNone(yaml_util.safe_load(''))
+
+
+if __name__ == '__main__':
+    unittest.main()